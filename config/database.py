@@ -1,4 +1,6 @@
 import os
+import threading
+
 import psycopg2
 from dotenv import load_dotenv
 
@@ -11,8 +13,47 @@ DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
 DB_HOST = os.getenv("POSTGRES_HOST", "localhost")
 DB_PORT = os.getenv("POSTGRES_PORT", "5432")
 
-def get_db_connection():
-    """Retorna una conexión a PostgreSQL"""
+# Réplica de lectura (opcional): sin POSTGRES_REPLICA_HOST todo va al primario.
+# Las tools seguras y /history leen de ella (get_read_connection); las
+# sensibles, las escrituras y el checkpointer siguen en el primario.
+DB_REPLICA_HOST = os.getenv("POSTGRES_REPLICA_HOST")
+DB_REPLICA_PORT = os.getenv("POSTGRES_REPLICA_PORT", DB_PORT)
+
+# Ejecuciones del grafo en paralelo (concurrent_updates del bot)
+GRAPH_CONCURRENCY = int(os.getenv("GRAPH_CONCURRENCY", "8"))
+
+# Tareas que ejecutan acciones de la outbox (handlers/outbox_worker.py)
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))
+
+# Configuración común de los dos pools: psycopg2 (negocio) y psycopg3 (checkpointer).
+# Cada ejecución del grafo usa a la vez hasta DB_CONNECTIONS_PER_RUN conexiones de
+# cada pool (tools en paralelo del ToolNode / escritura async del checkpoint); a
+# las GRAPH_CONCURRENCY del bot se suma la de la entrega de la outbox, y cada
+# worker de la outbox ocupa una más. Los locks de thread (graph/thread_lock.py)
+# usan conexiones propias fuera de los pools: hasta GRAPH_CONCURRENCY + 1.
+DB_POOL_ENABLED = os.getenv("DB_POOL_ENABLED", "true").lower() != "false"
+DB_CONNECTIONS_PER_RUN = int(os.getenv("DB_CONNECTIONS_PER_RUN", "2"))
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv(
+    "DB_POOL_MAX_SIZE", str((GRAPH_CONCURRENCY + 1) * DB_CONNECTIONS_PER_RUN + OUTBOX_WORKERS + 2)
+))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "3600"))
+# Las conexiones de negocio ociosas más de esto se comprueban (SELECT 1) al prestarlas
+DB_POOL_CHECK_AFTER = float(os.getenv("DB_POOL_CHECK_AFTER", "5"))
+# Sentencias preparadas del checkpointer: 0 = preparar desde la primera
+# ejecución, "none" = desactivadas (necesario detrás de pgbouncer en modo transaction)
+_prepare = os.getenv("DB_PREPARE_THRESHOLD", "0")
+DB_PREPARE_THRESHOLD = None if _prepare.lower() == "none" else int(_prepare)
+
+_business_pool = None
+_replica_pool = None
+_pool_lock = threading.Lock()
+
+
+def connect_dedicated():
+    """Conexión propia, fuera del pool (LISTEN, procesos largos)"""
     return psycopg2.connect(
         dbname=DB_NAME,
         user=DB_USER,
@@ -21,6 +62,99 @@ def get_db_connection():
         port=DB_PORT
     )
 
+
+def connect_replica():
+    """Conexión propia a la réplica de lectura"""
+    return psycopg2.connect(
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_REPLICA_HOST,
+        port=DB_REPLICA_PORT
+    )
+
+
+def _new_pool(connect):
+    from .pool import BusinessConnectionPool
+
+    return BusinessConnectionPool(
+        connect,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        timeout=DB_POOL_TIMEOUT,
+        max_idle=DB_POOL_MAX_IDLE,
+        max_lifetime=DB_POOL_MAX_LIFETIME,
+        check_after=DB_POOL_CHECK_AFTER,
+    )
+
+
+def get_business_pool():
+    """Pool psycopg2 del proceso (se crea con la primera conexión)"""
+    global _business_pool
+    if _business_pool is None:
+        with _pool_lock:
+            if _business_pool is None:
+                _business_pool = _new_pool(connect_dedicated)
+    return _business_pool
+
+
+def get_replica_pool():
+    """Pool psycopg2 de la réplica (mismo tamaño que el del primario)"""
+    global _replica_pool
+    if _replica_pool is None:
+        with _pool_lock:
+            if _replica_pool is None:
+                _replica_pool = _new_pool(connect_replica)
+    return _replica_pool
+
+
+def get_db_connection():
+    """Retorna una conexión a PostgreSQL (del pool; close() la devuelve)"""
+    if not DB_POOL_ENABLED:
+        return connect_dedicated()
+    return get_business_pool().acquire()
+
+
+def get_read_connection():
+    """
+    Conexión para lecturas que toleran réplica (tools seguras, /history).
+    Va al primario si no hay réplica, si no responde o si aún no ha
+    reproducido las últimas escrituras conocidas (ver config/replica.py).
+    """
+    if not DB_REPLICA_HOST:
+        return get_db_connection()
+    from .replica import route_read
+
+    return route_read()
+
+
 def get_connection_string():
     """Retorna el connection string para LangGraph"""
-    return f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
\ No newline at end of file
+    return f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+
+def get_checkpointer_pool():
+    """
+    Pool psycopg3 para el PostgresSaver, con la misma configuración que el de
+    negocio. check_connection descarta al prestarla una conexión caída y el
+    pool reconecta en segundo plano.
+    """
+    from psycopg.rows import dict_row
+    from psycopg_pool import ConnectionPool
+
+    return ConnectionPool(
+        get_connection_string(),
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        timeout=DB_POOL_TIMEOUT,
+        max_idle=DB_POOL_MAX_IDLE,
+        max_lifetime=DB_POOL_MAX_LIFETIME,
+        kwargs={
+            "autocommit": True,
+            "prepare_threshold": DB_PREPARE_THRESHOLD,
+            "row_factory": dict_row,
+        },
+        check=ConnectionPool.check_connection,
+        name="checkpointer",
+        open=True,
+    )
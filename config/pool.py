@@ -0,0 +1,165 @@
+"""
+Pool de conexiones psycopg2 para la base de negocio.
+
+get_db_connection() presta una conexión del pool envuelta en
+PooledConnection: el código sigue haciendo `conn = get_db_connection()` ...
+`conn.close()` y close() la devuelve al pool en lugar de cerrarla.
+
+- Bloquea hasta `timeout` segundos si están todas prestadas (el
+  ThreadedConnectionPool de psycopg2 lanza un error en ese caso).
+- Al devolverla deshace la transacción abierta y restaura autocommit; si la
+  conexión se rompió (servidor reiniciado, red), se descarta y la siguiente
+  petición abre otra.
+- Al prestarla, si lleva más de `check_after` segundos ociosa, la comprueba
+  con un SELECT 1; las que superan `max_idle` o `max_lifetime` se cierran.
+"""
+import logging
+import threading
+import time
+from typing import Callable
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+logger = logging.getLogger(__name__)
+
+
+class PooledConnection:
+    """Conexión prestada por el pool; close() la devuelve"""
+
+    __slots__ = ("_conn", "_pool")
+
+    def __init__(self, conn, pool: "BusinessConnectionPool"):
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_pool", pool)
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("connection already closed")
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def close(self):
+        conn = self._conn
+        if conn is not None:
+            object.__setattr__(self, "_conn", None)
+            self._pool.release(conn)
+
+    def __del__(self):
+        # Una conexión que no se cerró (p. ej. por una excepción) vuelve al
+        # pool al recogerse, igual que antes psycopg2 la cerraba
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    @property
+    def closed(self) -> int:
+        return 1 if self._conn is None else self._conn.closed
+
+
+class BusinessConnectionPool:
+    def __init__(self, connect: Callable, min_size: int, max_size: int, timeout: float,
+                 max_idle: float, max_lifetime: float, check_after: float = 5.0):
+        self._connect = connect
+        self.min_size, self.max_size = min_size, max_size
+        self.timeout, self.max_idle, self.max_lifetime = timeout, max_idle, max_lifetime
+        self.check_after = check_after
+        self._cond = threading.Condition()
+        self._idle: list[tuple] = []  # (conn, abierta_en, ociosa_desde)
+        self._opened_at: dict[int, float] = {}
+        self._size = 0
+        self.stats = {"connections_opened": 0, "connections_discarded": 0, "waits": 0}
+
+    def _discard(self, conn):
+        self._opened_at.pop(id(conn), None)
+        self._size -= 1
+        self.stats["connections_discarded"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, conn, opened_at: float, idle_since: float) -> bool:
+        now = time.monotonic()
+        if conn.closed or now - opened_at > self.max_lifetime:
+            return True
+        return now - idle_since > self.max_idle and self._size > self.min_size
+
+    @staticmethod
+    def _alive(conn) -> bool:
+        try:
+            conn.cursor().execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def acquire(self) -> PooledConnection:
+        deadline = time.monotonic() + self.timeout
+        while True:
+            candidate = None
+            with self._cond:
+                while self._idle and candidate is None:
+                    conn, opened_at, idle_since = self._idle.pop()
+                    if self._expired(conn, opened_at, idle_since):
+                        self._discard(conn)
+                    else:
+                        candidate = conn, idle_since
+                if candidate is None:
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolError(f"Sin conexiones libres tras {self.timeout:g} s (máximo {self.max_size})")
+                    self.stats["waits"] += 1
+                    self._cond.wait(remaining)
+                    continue
+            # La comprobación va fuera del lock: es un round trip al servidor
+            conn, idle_since = candidate
+            if time.monotonic() - idle_since <= self.check_after or self._alive(conn):
+                return PooledConnection(conn, self)
+            with self._cond:
+                self._discard(conn)
+
+        # Conectar fuera del lock: no bloquea a quien devuelve conexiones
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._opened_at[id(conn)] = time.monotonic()
+            self.stats["connections_opened"] += 1
+        return PooledConnection(conn, self)
+
+    def release(self, conn):
+        try:
+            if not conn.closed:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+        except psycopg2.Error:
+            logger.warning("Conexión rota devuelta al pool, se descarta")
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+        with self._cond:
+            if conn.closed:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, self._opened_at.get(id(conn), time.monotonic()), time.monotonic()))
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            while self._idle:
+                self._discard(self._idle.pop()[0])
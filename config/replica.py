@@ -0,0 +1,134 @@
+"""
+Enrutado de lecturas a la réplica con read-your-writes por LSN.
+
+El proceso guarda un "fence": la posición de WAL más alta del primario que
+sabe escrita (sus propias acciones sensibles y las notificaciones de los
+demás procesos). Una lectura usa la réplica solo si esta ya ha reproducido
+hasta el fence; si va por detrás, o no responde, la lectura va al primario.
+
+- mark_primary_write(): tras una escritura confirmada, avanza el fence con
+  pg_current_wal_lsn() y lo publica en el canal READ_FENCE_CHANNEL. Las
+  tools sensibles lo llaman en cuanto confirman (tools/base.py:
+  fence_primary_write), así las lecturas del mismo turno ya ven el cambio.
+- El listener de tools/cache.py recibe esos avisos y las invalidaciones de
+  caché de los demás procesos y avanza el fence del proceso, así una
+  búsqueda no vuelve a cachear datos viejos de la réplica.
+- La última posición reproducida vista se recuerda: mientras cubra el fence
+  no hace falta preguntar a la réplica en cada lectura.
+"""
+import logging
+import threading
+
+import psycopg2
+from psycopg2.pool import PoolError
+
+from .database import (
+    DB_POOL_ENABLED,
+    DB_REPLICA_HOST,
+    connect_replica,
+    get_db_connection,
+    get_replica_pool,
+)
+
+logger = logging.getLogger(__name__)
+
+READ_FENCE_CHANNEL = "read_fence"
+
+_lock = threading.Lock()
+_fence = 0  # WAL del primario que las lecturas deben ver
+_replayed = 0  # WAL reproducido por la réplica (última vez que se preguntó)
+_stats = {"replica": 0, "primary_lagging": 0, "primary_unavailable": 0, "replay_checks": 0}
+
+
+def parse_lsn(text: str) -> int:
+    """'16/B374D848' -> entero comparable"""
+    high, low = text.split("/")
+    return (int(high, 16) << 32) | int(low, 16)
+
+
+def advance_read_fence(lsn: int | str):
+    """Las lecturas posteriores deben ver el primario al menos hasta `lsn`"""
+    global _fence
+    if isinstance(lsn, str):
+        lsn = parse_lsn(lsn)
+    with _lock:
+        _fence = max(_fence, lsn)
+
+
+def mark_primary_write(conn=None):
+    """
+    Registra que el proceso acaba de escribir en el primario (llamar tras
+    el commit): avanza el fence y avisa a los demás procesos. Con `conn`
+    se reutiliza la conexión que hizo la escritura, ya confirmada.
+    """
+    if not DB_REPLICA_HOST:
+        return
+    own = conn is None
+    if own:
+        conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT lsn::text, pg_notify(%s, lsn::text) FROM pg_current_wal_lsn() AS lsn",
+            (READ_FENCE_CHANNEL,),
+        )
+        lsn = cursor.fetchone()[0]
+        conn.commit()
+    finally:
+        if own:
+            conn.close()
+    advance_read_fence(lsn)
+
+
+def _replica_connection():
+    if DB_POOL_ENABLED:
+        return get_replica_pool().acquire()
+    return connect_replica()
+
+
+def route_read():
+    """Conexión de la réplica si está al día con el fence; si no, del primario"""
+    global _replayed
+    try:
+        conn = _replica_connection()
+    except (psycopg2.Error, PoolError):
+        logger.warning("Réplica no disponible, leyendo del primario", exc_info=True)
+        with _lock:
+            _stats["primary_unavailable"] += 1
+        return get_db_connection()
+
+    with _lock:
+        fence, replayed = _fence, _replayed
+    if fence > replayed:
+        try:
+            cursor = conn.cursor()
+            # Fuera de recuperación (réplica promovida o mismo servidor) no hay retraso
+            cursor.execute("SELECT COALESCE(pg_last_wal_replay_lsn(), pg_current_wal_lsn())::text")
+            replayed = parse_lsn(cursor.fetchone()[0])
+            cursor.close()
+            conn.rollback()
+        except psycopg2.Error:
+            conn.close()
+            with _lock:
+                _stats["primary_unavailable"] += 1
+            return get_db_connection()
+        with _lock:
+            _replayed = max(_replayed, replayed)
+            _stats["replay_checks"] += 1
+        if replayed < fence:
+            conn.close()
+            with _lock:
+                _stats["primary_lagging"] += 1
+            return get_db_connection()
+
+    with _lock:
+        _stats["replica"] += 1
+    return conn
+
+
+def read_routing_stats() -> dict:
+    """Lecturas servidas por la réplica y desviadas al primario (por retraso o caída)"""
+    with _lock:
+        stats = dict(_stats)
+        stats["fence_ahead_bytes"] = max(0, _fence - _replayed)
+    return stats
@@ -0,0 +1,90 @@
+"""
+Tablas auxiliares del bot (memoria de LangGraph y coordinación entre réplicas).
+
+Solo SQL, sin dependencias: scripts.setup_langgraph_memory las crea sin
+importar el grafo (que construye los clientes LLM, el pool del checkpointer
+y el serializador). Cada módulo importa aquí la suya.
+"""
+
+# Almacén en frío de los threads archivados (graph/checkpoint_archive.py)
+ARCHIVE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS checkpoint_archive (
+        thread_id TEXT PRIMARY KEY,
+        archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        raw_bytes BIGINT NOT NULL,
+        payload BYTEA NOT NULL
+    )
+"""
+
+# Diccionarios zstd del serializador de checkpoints (graph/checkpoint_serde.py)
+DICTIONARY_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS checkpoint_dictionaries (
+        dict_id BIGINT PRIMARY KEY,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        samples INT NOT NULL,
+        data BYTEA NOT NULL
+    )
+"""
+
+# Dueños de los locks por thread (graph/thread_lock.py)
+HOLDERS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS thread_lock_holders (
+        thread_id TEXT PRIMARY KEY,
+        backend_pid INT NOT NULL,
+        holder TEXT NOT NULL,
+        acquired_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        heartbeat_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# Cola de acciones sensibles aprobadas (graph/outbox.py)
+OUTBOX_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS action_outbox (
+        id BIGSERIAL PRIMARY KEY,
+        idempotency_key TEXT NOT NULL UNIQUE,
+        thread_id TEXT NOT NULL,
+        batch_id TEXT NOT NULL,
+        node TEXT NOT NULL,
+        chat_id BIGINT,
+        tool_name TEXT NOT NULL,
+        tool_call_id TEXT NOT NULL,
+        args JSONB NOT NULL,
+        configurable JSONB NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending'
+            CHECK (status IN ('pending', 'running', 'done', 'failed')),
+        attempts INT NOT NULL DEFAULT 0,
+        available_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        locked_by TEXT,
+        locked_at TIMESTAMP,
+        result TEXT,
+        error TEXT,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP,
+        delivered_at TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_action_outbox_claim
+        ON action_outbox (id) WHERE status IN ('pending', 'running');
+    CREATE INDEX IF NOT EXISTS idx_action_outbox_undelivered
+        ON action_outbox (thread_id, batch_id) WHERE delivered_at IS NULL;
+    -- Mensajes del usuario recibidos mientras el thread espera a la outbox
+    CREATE TABLE IF NOT EXISTS parked_messages (
+        id BIGSERIAL PRIMARY KEY,
+        thread_id TEXT NOT NULL,
+        content TEXT NOT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_parked_messages_thread ON parked_messages (thread_id, id);
+"""
+
+# Updates de Telegram ya procesados (handlers/dedup.py)
+DEDUP_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS processed_updates (
+        dedup_key TEXT PRIMARY KEY,
+        status TEXT NOT NULL DEFAULT 'processing',
+        holder TEXT NOT NULL,
+        claimed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMP NOT NULL,
+        finished_at TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS processed_updates_expires_idx ON processed_updates (expires_at);
+"""
@@ -1,4 +1,16 @@
-"""Exporta el grafo compilado"""
-from .travel_graph import graph
+"""
+Exporta el grafo compilado.
 
-__all__ = ["graph"]
\ No newline at end of file
+Se importa bajo demanda: los módulos del paquete (checkpoint_serde,
+thread_lock, outbox...) se pueden usar desde scripts sin construir el grafo
+ni sus modelos y pools.
+"""
+
+__all__ = ["graph"]
+
+
+def __getattr__(name):
+    if name == "graph":
+        from .travel_graph import graph
+        return graph
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -3,7 +3,9 @@ from langchain_core.prompts import ChatPromptTemplate
 from tools import car_rental_safe_tools, car_rental_sensitive_tools
 from graph.state import CompleteOrEscalate, State
 from graph.nodes import _process_messages_for_llm
-from .primary import llm
+from graph.models import tiered_llm
+
+llm = tiered_llm("car_rental_assistant")
 
 
 car_rental_prompt = ChatPromptTemplate.from_messages([
@@ -3,7 +3,9 @@ from langchain_core.prompts import ChatPromptTemplate
 from tools import excursion_safe_tools, excursion_sensitive_tools
 from graph.state import CompleteOrEscalate, State
 from graph.nodes import _process_messages_for_llm
-from .primary import llm
+from graph.models import tiered_llm
+
+llm = tiered_llm("excursion_assistant")
 
 
 excursion_prompt = ChatPromptTemplate.from_messages([
@@ -12,7 +14,8 @@ excursion_prompt = ChatPromptTemplate.from_messages([
         """Eres un asistente especializado en recomendar y reservar excursiones 🌍.
 
 Tu trabajo es ayudar al usuario a:
-- Buscar recomendaciones de viajes y tours según ubicación
+- Buscar recomendaciones de viajes y tours según ubicación e intereses
+  (pasa lo que busca el usuario, p. ej. "algo cultural con museos", en `keywords`)
 - Reservar excursiones y actividades
 - Cancelar reservas de excursiones
 - Proporcionar información sobre tours disponibles
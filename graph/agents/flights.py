@@ -3,7 +3,9 @@ from langchain_core.prompts import ChatPromptTemplate
 from tools import flight_safe_tools, flight_sensitive_tools
 from graph.state import CompleteOrEscalate, State
 from graph.nodes import _process_messages_for_llm
-from .primary import llm  # Reutilizar el mismo LLM
+from graph.models import tiered_llm
+
+llm = tiered_llm("flight_assistant")
 
 
 flight_booking_prompt = ChatPromptTemplate.from_messages([
@@ -16,6 +18,14 @@ Para registrar un nuevo vuelo, DEBES obtener primero del usuario:
 - Nombre completo
 - Dirección de correo electrónico
 
+Si son varios pasajeros viajando juntos, pide nombre y email de cada uno y
+regístralos con una sola llamada a register_group_flight (misma reserva y
+asientos juntos) en lugar de llamar varias veces a register_new_flight.
+
+Si search_flights no encuentra vuelos directos entre dos aeropuertos, usa
+search_connecting_flights para ofrecer itinerarios con 1 o 2 escalas en lugar
+de repetir la búsqueda.
+
 Utiliza las herramientas disponibles para completar la tarea. 
 Si la tarea se completa, usa la herramienta CompleteOrEscalate."""
     ),
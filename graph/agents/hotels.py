@@ -3,7 +3,9 @@ from langchain_core.prompts import ChatPromptTemplate
 from tools import hotel_safe_tools, hotel_sensitive_tools
 from graph.state import CompleteOrEscalate, State
 from graph.nodes import _process_messages_for_llm
-from .primary import llm
+from graph.models import tiered_llm
+
+llm = tiered_llm("hotel_assistant")
 
 
 hotel_booking_prompt = ChatPromptTemplate.from_messages([
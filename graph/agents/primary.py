@@ -1,8 +1,6 @@
 """Asistente principal - punto de entrada"""
 from datetime import datetime
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-import os
 
 from tools import primary_assistant_tools
 from graph.state import (
@@ -13,15 +11,11 @@ from graph.state import (
     State
 )
 from graph.nodes import _process_messages_for_llm
+from graph.models import tiered_llm
 
 
-# LLM
-llm = ChatOpenAI(
-    model="deepseek-chat",
-    api_key=os.getenv("DEEPSEEK_API_KEY"),
-    base_url="https://api.deepseek.com",
-    temperature=0,
-)
+# LLM: nivel rápido con escalado (graph/models.py)
+llm = tiered_llm("primary_assistant")
 
 
 # Prompt del asistente principal
@@ -39,6 +33,10 @@ para decidir cómo responder o qué herramienta (agente) usar.
    - 🚗 ALQUILER DE COCHE → precios, modelos, devoluciones, seguros.
    - 🌍 EXCURSIONES / TOURS → actividades, fechas, reservas.
 2. **Selecciona internamente la herramienta o agente adecuado** según la categoría.
+   Si la solicitud abarca varias categorías (p. ej. vuelo + hotel), delega en
+   todos los agentes necesarios **en el mismo mensaje**, con una llamada por
+   agente: trabajan en paralelo y recibirás el resultado de cada uno para
+   redactar una sola respuesta.
 3. **Si la consulta no está relacionada con viajes**, responde de forma breve y amable indicando que solo puedes ayudar con temas de viajes.
 
 📱 **Estilo de respuesta:**
@@ -53,6 +51,17 @@ La fecha y hora actual es: {time}
 ])
 
 
+# Tools y delegaciones se enlazan una sola vez
+primary_llm = llm.bind_tools(
+    primary_assistant_tools + [
+        ToFlightBookingAssistant,
+        ToHotelBookingAssistant,
+        ToCarRentalAssistant,
+        ToExcursionAssistant,
+    ]
+)
+
+
 def primary_assistant_node(state: State):
     """Nodo del asistente principal"""
     temp_state = state.copy()
@@ -62,14 +71,7 @@ def primary_assistant_node(state: State):
     current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     dynamic_prompt = primary_assistant_prompt.partial(time=current_time)
     
-    runnable = dynamic_prompt | llm.bind_tools(
-        primary_assistant_tools + [
-            ToFlightBookingAssistant,
-            ToHotelBookingAssistant,
-            ToCarRentalAssistant,
-            ToExcursionAssistant,
-        ]
-    )
+    runnable = dynamic_prompt | primary_llm
     
     result = runnable.invoke(temp_state)
     return {"messages": [result]}
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""
+Almacenamiento en frío de los checkpoints de conversaciones archivadas.
+
+Cuando /reset archiva una conversación, sus filas de checkpoints,
+checkpoint_blobs y checkpoint_writes se copian (COPY binario, con la lista de
+columnas para sobrevivir a migraciones del checkpointer), se comprimen con
+zstd en un único blob de checkpoint_archive y se borran de las tablas
+calientes en la misma transacción. Si el usuario vuelve a abrir esa
+conversación desde /history, se rehidrata con COPY FROM y vuelve a quedar
+disponible para graph.get_state.
+
+Las conversaciones archivadas antes de existir este módulo (o cuyo archivado
+falló) se mueven con `python -m scripts.archive_threads`.
+"""
+import io
+import logging
+import os
+from datetime import timedelta
+from typing import Optional
+
+import msgpack
+import zstandard
+
+from config.database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# Tablas del PostgresSaver, todas con thread_id
+CHECKPOINT_TABLES = ("checkpoints", "checkpoint_blobs", "checkpoint_writes")
+ZSTD_LEVEL = int(os.getenv("CHECKPOINT_ARCHIVE_ZSTD_LEVEL", "10"))
+
+
+def _columns(cursor, table: str) -> list[str]:
+    cursor.execute(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = %s ORDER BY ordinal_position",
+        (table,),
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _lock_thread(cursor, thread_id: str):
+    """Serializa archivado y rehidratación de un mismo thread"""
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext('checkpoint_archive:' || %s))", (thread_id,))
+
+
+def archive_thread(thread_id: str) -> Optional[dict]:
+    """
+    Mueve los checkpoints de `thread_id` a checkpoint_archive.
+
+    Returns:
+        {"raw_bytes", "compressed_bytes", "rows"} o None si no había checkpoints
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        _lock_thread(cursor, thread_id)
+        tables, rows = {}, 0
+        for table in CHECKPOINT_TABLES:
+            cursor.execute(f"SELECT count(*) FROM {table} WHERE thread_id = %s", (thread_id,))
+            count = cursor.fetchone()[0]
+            if not count:
+                continue
+            columns = _columns(cursor, table)
+            buffer = io.BytesIO()
+            column_list = ", ".join(columns)
+            cursor.copy_expert(
+                cursor.mogrify(
+                    f"COPY (SELECT {column_list} FROM {table} WHERE thread_id = %s) TO STDOUT (FORMAT binary)",
+                    (thread_id,),
+                ).decode(),
+                buffer,
+            )
+            tables[table] = {"columns": columns, "data": buffer.getvalue()}
+            rows += count
+        if not tables:
+            conn.rollback()
+            return None
+
+        raw = msgpack.packb(tables, use_bin_type=True)
+        payload = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+        cursor.execute(
+            """
+            INSERT INTO checkpoint_archive (thread_id, raw_bytes, payload) VALUES (%s, %s, %s)
+            ON CONFLICT (thread_id) DO UPDATE
+            SET archived_at = CURRENT_TIMESTAMP, raw_bytes = EXCLUDED.raw_bytes, payload = EXCLUDED.payload
+            """,
+            (thread_id, len(raw), payload),
+        )
+        for table in tables:
+            cursor.execute(f"DELETE FROM {table} WHERE thread_id = %s", (thread_id,))
+        conn.commit()
+        return {"raw_bytes": len(raw), "compressed_bytes": len(payload), "rows": rows}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def rehydrate_thread(thread_id: str) -> bool:
+    """
+    Devuelve a las tablas calientes los checkpoints archivados de `thread_id`.
+    Devuelve False si el thread no estaba en frío.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        _lock_thread(cursor, thread_id)
+        cursor.execute("SELECT payload FROM checkpoint_archive WHERE thread_id = %s", (thread_id,))
+        row = cursor.fetchone()
+        if row is None:
+            conn.rollback()
+            return False
+
+        tables = msgpack.unpackb(zstandard.ZstdDecompressor().decompress(bytes(row[0])), raw=False)
+        for table, content in tables.items():
+            # Columnas añadidas por migraciones posteriores al archivado: toman su default
+            current = set(_columns(cursor, table))
+            if not set(content["columns"]) <= current:
+                raise RuntimeError(f"El esquema de {table} ya no tiene las columnas archivadas")
+            cursor.copy_expert(
+                f"COPY {table} ({', '.join(content['columns'])}) FROM STDIN (FORMAT binary)",
+                io.BytesIO(content["data"]),
+            )
+        cursor.execute("DELETE FROM checkpoint_archive WHERE thread_id = %s", (thread_id,))
+        conn.commit()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def is_archived(thread_id: str) -> bool:
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM checkpoint_archive WHERE thread_id = %s", (thread_id,))
+    archived = cursor.fetchone() is not None
+    conn.close()
+    return archived
+
+
+def archive_inactive_threads(grace: timedelta = timedelta(0), limit: int = 1000) -> list[tuple[str, dict]]:
+    """
+    Archiva las conversaciones inactivas (terminadas hace más de `grace`) que
+    aún tienen checkpoints en las tablas calientes.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT c.thread_id FROM conversations c
+        WHERE NOT c.is_active AND c.ended_at < CURRENT_TIMESTAMP - %s
+          AND EXISTS (SELECT 1 FROM checkpoints cp WHERE cp.thread_id = c.thread_id)
+        ORDER BY c.ended_at
+        LIMIT %s
+        """,
+        (grace, limit),
+    )
+    thread_ids = [row[0] for row in cursor.fetchall()]
+    conn.close()
+
+    archived = []
+    for thread_id in thread_ids:
+        try:
+            stats = archive_thread(thread_id)
+        except Exception:
+            logger.exception("No se pudo archivar el thread %s", thread_id)
+            continue
+        if stats:
+            archived.append((thread_id, stats))
+    return archived
@@ -0,0 +1,118 @@
+"""
+Serializador compacto de checkpoints para el PostgresSaver.
+
+Los valores se serializan exactamente como con el serializador por defecto
+de LangGraph (msgpack) y los bytes resultantes se comprimen con zstd usando
+un diccionario entrenado con nuestros propios checkpoints
+(`python -m scripts.train_checkpoint_dictionary`). La lista de mensajes y el
+user_info repiten en cada superstep los mismos nombres de campo, ids de clase
+de LangChain y columnas de las tablas compactas: el diccionario ya los
+contiene y cada blob solo paga lo que cambia.
+
+Compatibilidad: los valores comprimidos se guardan con el tipo
+"msgpack+zstd"; cualquier otro tipo (checkpoints anteriores, valores
+pequeños) se delega sin cambios al serializador por defecto. Cada frame zstd
+lleva el dict_id de su diccionario y todos los diccionarios entrenados se
+conservan en checkpoint_dictionaries, así que un diccionario nuevo solo
+afecta a lo que se escriba a partir de ese momento.
+
+⚠️ Volver a CHECKPOINT_SERIALIZER=default deja ilegibles los blobs
+"msgpack+zstd" ya escritos: el serializador por defecto no los conoce.
+"""
+import logging
+import os
+import threading
+from typing import Any, Optional, Sequence
+
+import psycopg2
+import zstandard
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from config.database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+COMPRESSED_SUFFIX = "+zstd"
+# Por debajo de esto el frame zstd no compensa (versiones, flags, strings cortos)
+MIN_COMPRESS_BYTES = int(os.getenv("CHECKPOINT_MIN_COMPRESS_BYTES", "64"))
+ZSTD_LEVEL = int(os.getenv("CHECKPOINT_ZSTD_LEVEL", "3"))
+
+
+class CompactSerializer(JsonPlusSerializer):
+    """
+    JsonPlusSerializer + zstd con diccionario. Hereda de JsonPlusSerializer
+    para que el checkpointer siga aplicando la allowlist de msgpack.
+    """
+
+    def __init__(self, dictionaries: Sequence[bytes] = (), level: int = ZSTD_LEVEL, **kwargs):
+        super().__init__(**kwargs)
+        self.level = level
+        # dict_id -> diccionario; el último de la secuencia es el que comprime
+        self.dictionaries: dict[int, zstandard.ZstdCompressionDict] = {}
+        self.dictionary: Optional[zstandard.ZstdCompressionDict] = None
+        for data in dictionaries:
+            self.dictionary = zstandard.ZstdCompressionDict(data)
+            self.dictionaries[self.dictionary.dict_id()] = self.dictionary
+        if self.dictionary is not None:
+            # Una sola vez: sin esto zstd vuelve a cargar el diccionario en cada compress()
+            self.dictionary.precompute_compress(level=level)
+        # Los (de)compresores de zstandard no se pueden compartir entre hilos
+        self._local = threading.local()
+
+    @classmethod
+    def from_database(cls, **kwargs) -> "CompactSerializer":
+        """Serializador con todos los diccionarios de checkpoint_dictionaries"""
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT data FROM checkpoint_dictionaries ORDER BY created_at, dict_id")
+            dictionaries = [bytes(row[0]) for row in cursor.fetchall()]
+        except psycopg2.errors.UndefinedTable:
+            dictionaries = []
+        finally:
+            conn.close()
+        if not dictionaries:
+            logger.warning("Sin diccionario de checkpoints: se comprime con zstd sin diccionario")
+        return cls(dictionaries, **kwargs)
+
+    def _compressor(self) -> zstandard.ZstdCompressor:
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            compressor = zstandard.ZstdCompressor(level=self.level, dict_data=self.dictionary)
+            self._local.compressor = compressor
+        return compressor
+
+    def _decompressor(self, dict_id: int) -> zstandard.ZstdDecompressor:
+        decompressors = getattr(self._local, "decompressors", None)
+        if decompressors is None:
+            decompressors = self._local.decompressors = {}
+        if dict_id not in decompressors:
+            if dict_id and dict_id not in self.dictionaries:
+                raise ValueError(f"Checkpoint comprimido con un diccionario desconocido ({dict_id})")
+            decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=self.dictionaries.get(dict_id))
+        return decompressors[dict_id]
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        typ, data = super().dumps_typed(obj)
+        if typ != "msgpack" or len(data) < MIN_COMPRESS_BYTES:
+            return typ, data
+        return typ + COMPRESSED_SUFFIX, self._compressor().compress(data)
+
+    def decompress(self, payload: bytes) -> bytes:
+        """Bytes msgpack de un blob "msgpack+zstd", con el diccionario de su frame"""
+        dict_id = zstandard.get_frame_parameters(payload).dict_id
+        return self._decompressor(dict_id).decompress(payload)
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        typ, payload = data
+        if not typ.endswith(COMPRESSED_SUFFIX):
+            return super().loads_typed(data)
+        return super().loads_typed((typ[: -len(COMPRESSED_SUFFIX)], self.decompress(payload)))
+
+
+def load_checkpoint_serializer() -> SerializerProtocol:
+    """Serializador configurado con CHECKPOINT_SERIALIZER (compact | default)"""
+    if os.getenv("CHECKPOINT_SERIALIZER", "compact").lower() == "default":
+        return JsonPlusSerializer()
+    return CompactSerializer.from_database()
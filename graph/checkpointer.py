@@ -0,0 +1,52 @@
+"""
+Checkpointer del grafo sobre el pool psycopg3 de config/database.py.
+
+PostgresSaver protege su conexión con un lock global, así que todas las
+ejecuciones del proceso se serializan en cada lectura y escritura de
+checkpoints. Con un pool cada operación toma su propia conexión y el lock
+sobra: PooledPostgresSaver lo sustituye por un contexto vacío.
+
+Si el servidor se reinicia, el pool descarta las conexiones caídas al
+prestarlas (check_connection) y reconecta, sin reiniciar el bot.
+
+Las escrituras pasan por el fence del lock del thread (graph/thread_lock.py):
+un turno que perdió el lock no escribe checkpoints sobre los de su sucesor.
+"""
+from contextlib import nullcontext
+
+from langgraph.checkpoint.postgres import PostgresSaver
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from psycopg import Connection
+from psycopg_pool import ConnectionPool
+
+from config.database import DB_POOL_ENABLED, get_checkpointer_pool, get_connection_string
+from .checkpoint_serde import load_checkpoint_serializer
+from .thread_lock import check_thread_lease
+
+
+class FencedPostgresSaver(PostgresSaver):
+    """PostgresSaver que no escribe si el turno perdió el lock de su thread"""
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        check_thread_lease(config["configurable"]["thread_id"])
+        return super().put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        check_thread_lease(config["configurable"]["thread_id"])
+        return super().put_writes(config, writes, task_id, task_path)
+
+
+class PooledPostgresSaver(FencedPostgresSaver):
+    """PostgresSaver que no serializa las operaciones de distintos hilos"""
+
+    def __init__(self, pool: ConnectionPool, serde: SerializerProtocol | None = None):
+        super().__init__(pool, serde=serde)
+        self.lock = nullcontext()
+
+
+def build_checkpointer() -> PostgresSaver:
+    """Checkpointer con el serializador configurado (pool salvo DB_POOL_ENABLED=false)"""
+    serde = load_checkpoint_serializer()
+    if DB_POOL_ENABLED:
+        return PooledPostgresSaver(get_checkpointer_pool(), serde=serde)
+    return FencedPostgresSaver(Connection.connect(get_connection_string(), autocommit=True), serde=serde)
@@ -0,0 +1,40 @@
+"""
+Modo de durabilidad de los checkpoints por ejecución del grafo.
+
+LangGraph guarda un checkpoint al final de cada superstep y `durability`
+decide cuándo se escribe:
+
+- "sync": antes de empezar el siguiente superstep (cada paso es un round
+  trip a PostgreSQL en el camino crítico).
+- "async": en segundo plano mientras corre el siguiente superstep; el
+  stream no termina hasta que se han escrito todos.
+- "exit": solo al terminar (o interrumpirse) la ejecución; si el proceso
+  muere a mitad de turno, el turno se pierde entero.
+
+CHECKPOINT_DURABILITY fija el modo del despliegue. Los turnos que ejecutan
+acciones sensibles (reanudar un interrupt_before de *_sensitive_tools)
+usan CHECKPOINT_SENSITIVE_DURABILITY, para que una reserva o cancelación ya
+hecha en la base de negocio no quede sin su checkpoint.
+"""
+import os
+from typing import get_args
+
+from langgraph.types import Durability
+
+DURABILITY_MODES = get_args(Durability)
+
+
+def _mode(name: str, default: str) -> str:
+    value = os.getenv(name, default).lower()
+    if value not in DURABILITY_MODES:
+        raise ValueError(f"{name} debe ser uno de {DURABILITY_MODES}, no {value!r}")
+    return value
+
+
+DEFAULT_DURABILITY = _mode("CHECKPOINT_DURABILITY", "async")
+SENSITIVE_DURABILITY = _mode("CHECKPOINT_SENSITIVE_DURABILITY", "sync")
+
+
+def durability_for(sensitive: bool = False) -> Durability:
+    """Modo para una ejecución del grafo (sensible: reanuda una acción sensible)"""
+    return SENSITIVE_DURABILITY if sensitive else DEFAULT_DURABILITY
@@ -0,0 +1,162 @@
+"""
+Solicitudes compuestas: varios especialistas en paralelo.
+
+Cuando el asistente principal delega en dos o más especialistas en el mismo
+mensaje ("vuelo a París y hotel cerca del Louvre"), cada delegación se lanza
+con Send como una subtarea `specialist_task` con su propio historial: el
+especialista busca con sus tools seguras hasta tener una respuesta. Las
+subtareas corren en el mismo superstep, así que la solicitud tarda lo que el
+especialista más lento y no la suma de todos.
+
+`merge_specialists` responde cada delegación con el resumen de su
+especialista. Las acciones sensibles que propongan (reservas) no se ejecutan
+en la subtarea: se juntan en un único mensaje hacia `fanout_sensitive_tools`,
+que se interrumpe para aprobarse (y pasa por el outbox) como cualquier otra.
+"""
+import os
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.types import Send
+
+from tools import (
+    primary_assistant_tools,
+    flight_safe_tools,
+    hotel_safe_tools,
+    car_rental_safe_tools,
+    excursion_safe_tools,
+)
+from .agents.flights import flight_runnable
+from .agents.hotels import hotel_runnable
+from .agents.cars import car_rental_runnable
+from .agents.excursions import excursion_runnable
+from .nodes import _process_messages_for_llm
+from .state import (
+    State,
+    SpecialistTask,
+    CompleteOrEscalate,
+    ToFlightBookingAssistant,
+    ToHotelBookingAssistant,
+    ToCarRentalAssistant,
+    ToExcursionAssistant,
+)
+
+# Llamadas al LLM de cada subtarea antes de devolver lo que tenga
+SPECIALIST_MAX_STEPS = int(os.getenv("SPECIALIST_MAX_STEPS", "6"))
+
+DELEGATIONS = {
+    ToFlightBookingAssistant.__name__: "flight",
+    ToHotelBookingAssistant.__name__: "hotel",
+    ToCarRentalAssistant.__name__: "car_rental",
+    ToExcursionAssistant.__name__: "excursion",
+}
+
+SPECIALISTS = {
+    "flight": (flight_runnable, flight_safe_tools),
+    "hotel": (hotel_runnable, hotel_safe_tools),
+    "car_rental": (car_rental_runnable, car_rental_safe_tools),
+    "excursion": (excursion_runnable, excursion_safe_tools),
+}
+
+PRIMARY_TOOLS = {t.name: t for t in primary_assistant_tools}
+
+
+def delegation_calls(message) -> list[dict]:
+    """tool_calls del mensaje que delegan en un especialista"""
+    return [call for call in getattr(message, "tool_calls", []) if call["name"] in DELEGATIONS]
+
+
+def fan_out(state: State) -> list[Send]:
+    """Una subtarea por delegación del último mensaje del asistente principal"""
+    context = next(
+        (m.content for m in reversed(state["messages"]) if isinstance(m, HumanMessage)), ""
+    )
+    sends = []
+    for call in delegation_calls(state["messages"][-1]):
+        request = call["args"].get("request", "")
+        if context and context not in request:
+            request = f"{request}\n\nMensaje original del usuario: {context}"
+        sends.append(Send("specialist_task", SpecialistTask(
+            skill=DELEGATIONS[call["name"]],
+            request=request,
+            tool_call_id=call["id"],
+        )))
+    return sends
+
+
+def _run_tool(tool, call: dict, config: RunnableConfig) -> ToolMessage:
+    try:
+        return tool.invoke(call, config)
+    except Exception as e:
+        return ToolMessage(content=f"Error: {e!r}", name=call["name"], tool_call_id=call["id"], status="error")
+
+
+def specialist_task_node(task: SpecialistTask, config: RunnableConfig) -> dict:
+    """Ejecuta un especialista con su propio historial hasta que responde o propone una acción sensible"""
+    runnable, safe_tools = SPECIALISTS[task["skill"]]
+    safe_by_name = {t.name: t for t in safe_tools}
+    messages = [HumanMessage(content=task["request"])]
+    summary, pending = "", []
+
+    for _ in range(SPECIALIST_MAX_STEPS):
+        result = runnable.invoke({"messages": _process_messages_for_llm({"messages": messages})}, config)
+        messages.append(result)
+        summary = result.content or summary
+        if not result.tool_calls:
+            break
+        escalate = next((c for c in result.tool_calls if c["name"] == CompleteOrEscalate.__name__), None)
+        if escalate:
+            summary = summary or escalate["args"].get("reason", "")
+            break
+        pending = [c for c in result.tool_calls if c["name"] not in safe_by_name]
+        if pending:
+            # Reserva/cancelación: se aprueba fuera de la subtarea
+            break
+        for call in result.tool_calls:
+            messages.append(_run_tool(safe_by_name[call["name"]], call, config))
+    else:
+        summary = summary or "El especialista no terminó la tarea en los pasos permitidos."
+
+    return {"specialist_results": [{
+        "skill": task["skill"],
+        "tool_call_id": task["tool_call_id"],
+        "summary": summary,
+        "pending": pending,
+    }]}
+
+
+def merge_specialists_node(state: State, config: RunnableConfig) -> dict:
+    """Responde cada delegación con su resumen y junta las acciones sensibles propuestas"""
+    results = {r["tool_call_id"]: r for r in state.get("specialist_results", [])}
+    messages = []
+    for call in state["messages"][-1].tool_calls:
+        result = results.get(call["id"])
+        if result is not None:
+            content = result["summary"] or "Sin resultados."
+            if result["pending"]:
+                actions = ", ".join(c["name"] for c in result["pending"])
+                content += f"\n\nAcción propuesta, pendiente de aprobación: {actions}"
+            messages.append(ToolMessage(content=content, tool_call_id=call["id"]))
+        elif call["name"] in PRIMARY_TOOLS:
+            # Tools propias del asistente principal pedidas en el mismo mensaje
+            messages.append(_run_tool(PRIMARY_TOOLS[call["name"]], call, config))
+        else:
+            messages.append(ToolMessage(
+                content=f"Error: {call['name']} no es una herramienta válida.",
+                tool_call_id=call["id"],
+                status="error",
+            ))
+
+    pending = [c for r in results.values() for c in r["pending"]]
+    if pending:
+        messages.append(AIMessage(content="", tool_calls=pending, id=str(uuid.uuid4())))
+    return {"messages": messages, "specialist_results": "clear"}
+
+
+def route_after_merge(state: State):
+    """Acciones sensibles propuestas → aprobación; si no, el principal redacta la respuesta"""
+    last = state["messages"][-1]
+    if isinstance(last, AIMessage) and last.tool_calls:
+        return "fanout_sensitive_tools"
+    return "primary_assistant"
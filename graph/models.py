@@ -0,0 +1,256 @@
+"""
+Modelos por nodo del grafo, en dos niveles.
+
+- "fast": modelo pequeño y rápido, con presupuesto corto de latencia (timeout
+  sin reintentos) y de tokens. Por defecto atiende el routing del asistente
+  principal y las consultas sencillas de los especialistas.
+- "strong": modelo grande, con más margen. Recibe las llamadas que el nivel
+  rápido no resuelve bien.
+
+Cada nodo tiene un nivel (NODE_TIERS, configurable con LLM_NODE_TIERS). Una
+llamada de nivel "fast" escala a "strong" si:
+  - se pasa de su presupuesto de latencia o falla ("timeout"/"error"),
+  - el contexto supera LLM_FAST_MAX_INPUT_TOKENS ("context"),
+  - devuelve tool calls inválidas, se corta por max_tokens o sale vacía
+    (siempre: con el mismo modelo, "strong" tiene más margen de tokens),
+  - el plan es complejo: más de LLM_ESCALATE_TOOL_CALLS tool calls o una
+    acción sensible (reserva/cancelación),
+  - con LLM_FAST_LOGPROBS, la probabilidad media de sus tokens queda por
+    debajo de LLM_ESCALATE_MIN_CONFIDENCE ("low_confidence").
+Los motivos de plan y confianza solo escalan si los dos niveles usan
+modelos distintos.
+
+model_stats() devuelve llamadas, latencia (media, p95), tokens, coste
+estimado y escalados por nivel.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+from langchain_core.runnables import RunnableLambda
+from langchain_openai import ChatOpenAI
+
+from tools import (
+    flight_sensitive_tools,
+    hotel_sensitive_tools,
+    car_rental_sensitive_tools,
+    excursion_sensitive_tools,
+)
+
+logger = logging.getLogger(__name__)
+
+DEEPSEEK_BASE_URL = "https://api.deepseek.com"
+
+
+def _tier(prefix: str, timeout: str, max_tokens: str, max_retries: str) -> dict:
+    return {
+        "model": os.getenv(f"{prefix}_MODEL", "deepseek-chat"),
+        "base_url": os.getenv(f"{prefix}_BASE_URL", DEEPSEEK_BASE_URL),
+        "api_key": os.getenv(f"{prefix}_API_KEY") or os.getenv("DEEPSEEK_API_KEY"),
+        # Presupuesto de latencia (s) y de tokens de salida por llamada
+        "timeout": float(os.getenv(f"{prefix}_TIMEOUT", timeout)),
+        # Vacío = sin límite (el del proveedor), como el LLM único de antes
+        "max_tokens": int(os.getenv(f"{prefix}_MAX_TOKENS", max_tokens) or 0) or None,
+        "max_retries": int(os.getenv(f"{prefix}_MAX_RETRIES", max_retries)),
+        # USD por millón de tokens (precios de lista de deepseek-chat por defecto)
+        "price_input": float(os.getenv(f"{prefix}_PRICE_INPUT", "0.27")),
+        "price_output": float(os.getenv(f"{prefix}_PRICE_OUTPUT", "1.10")),
+    }
+
+
+TIERS = {
+    "fast": _tier("LLM_FAST", timeout="15", max_tokens="1024", max_retries="0"),
+    "strong": _tier("LLM_STRONG", timeout="60", max_tokens="", max_retries="2"),
+}
+# Presupuesto de entrada del nivel rápido: con más contexto va directo a "strong"
+FAST_MAX_INPUT_TOKENS = int(os.getenv("LLM_FAST_MAX_INPUT_TOKENS", "6000"))
+FAST_LOGPROBS = os.getenv("LLM_FAST_LOGPROBS", "false").lower() == "true"
+ESCALATE_TOOL_CALLS = int(os.getenv("LLM_ESCALATE_TOOL_CALLS", "2"))
+ESCALATE_MIN_CONFIDENCE = float(os.getenv("LLM_ESCALATE_MIN_CONFIDENCE", "0.8"))
+ESCALATE_ON_SENSITIVE = os.getenv("LLM_ESCALATE_ON_SENSITIVE", "true").lower() != "false"
+# Cada cuántas llamadas se escribe el resumen de model_stats() en el log (0 = nunca)
+STATS_LOG_EVERY = int(os.getenv("LLM_STATS_LOG_EVERY", "100"))
+
+NODE_TIERS = {
+    "primary_assistant": "fast",
+    "flight_assistant": "fast",
+    "hotel_assistant": "fast",
+    "car_rental_assistant": "fast",
+    "excursion_assistant": "fast",
+}
+# p. ej. LLM_NODE_TIERS="flight_assistant=strong,primary_assistant=fast"
+for _item in filter(None, os.getenv("LLM_NODE_TIERS", "").split(",")):
+    _node, _, _level = _item.partition("=")
+    if _level.strip() not in TIERS:
+        raise ValueError(f"Nivel de modelo desconocido en LLM_NODE_TIERS: {_item!r}")
+    NODE_TIERS[_node.strip()] = _level.strip()
+
+SENSITIVE_TOOL_NAMES = {
+    t.name
+    for t in flight_sensitive_tools + hotel_sensitive_tools + car_rental_sensitive_tools + excursion_sensitive_tools
+}
+
+_clients: dict = {}
+_clients_lock = threading.Lock()
+
+
+def chat_model(tier: str) -> ChatOpenAI:
+    """Cliente del nivel `tier` (uno por proceso)"""
+    with _clients_lock:
+        if tier not in _clients:
+            settings = TIERS[tier]
+            _clients[tier] = ChatOpenAI(
+                model=settings["model"],
+                api_key=settings["api_key"],
+                base_url=settings["base_url"],
+                temperature=0,
+                timeout=settings["timeout"],
+                max_tokens=settings["max_tokens"],
+                max_retries=settings["max_retries"],
+                logprobs=FAST_LOGPROBS if tier == "fast" else None,
+            )
+        return _clients[tier]
+
+
+# --- Métricas ---
+
+_stats_lock = threading.Lock()
+_latencies = {tier: deque(maxlen=1000) for tier in TIERS}
+_stats = {
+    tier: {
+        "calls": 0, "errors": 0, "over_budget": 0,
+        "latency_total": 0.0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0,
+    }
+    for tier in TIERS
+}
+_escalations = defaultdict(int)  # (nodo, motivo) -> veces
+
+
+def _record(tier: str, latency: float, result=None, error: bool = False):
+    settings = TIERS[tier]
+    usage = getattr(result, "usage_metadata", None) or {}
+    input_tokens, output_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    with _stats_lock:
+        stats = _stats[tier]
+        stats["calls"] += 1
+        stats["errors"] += error
+        stats["over_budget"] += latency > settings["timeout"]
+        stats["latency_total"] += latency
+        stats["input_tokens"] += input_tokens
+        stats["output_tokens"] += output_tokens
+        stats["cost_usd"] += (input_tokens * settings["price_input"] + output_tokens * settings["price_output"]) / 1e6
+        _latencies[tier].append(latency)
+        total_calls = sum(s["calls"] for s in _stats.values())
+    if STATS_LOG_EVERY and total_calls % STATS_LOG_EVERY == 0:
+        logger.info("Modelos por nivel: %s", model_stats())
+
+
+def model_stats() -> dict:
+    """Latencia, tokens y coste por nivel, y escalados por nodo y motivo"""
+    with _stats_lock:
+        tiers = {}
+        for tier, stats in _stats.items():
+            calls = stats["calls"]
+            latencies = sorted(_latencies[tier])
+            tiers[tier] = {
+                **stats,
+                "model": TIERS[tier]["model"],
+                "latency_avg": stats["latency_total"] / calls if calls else 0.0,
+                "latency_p95": latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+                "cost_per_call_usd": stats["cost_usd"] / calls if calls else 0.0,
+            }
+        escalations = {f"{node}:{reason}": n for (node, reason), n in _escalations.items()}
+    return {"tiers": tiers, "escalations": escalations}
+
+
+# --- Escalado ---
+
+def _estimated_tokens(prompt) -> int:
+    """~4 caracteres por token: suficiente para decidir si el contexto es largo"""
+    messages = prompt.to_messages() if hasattr(prompt, "to_messages") else prompt
+    return sum(len(str(m.content)) for m in messages) // 4
+
+
+def _confidence(result) -> float | None:
+    """Probabilidad media por token del contenido (None sin logprobs)"""
+    tokens = ((result.response_metadata or {}).get("logprobs") or {}).get("content") or []
+    if not tokens:
+        return None
+    return math.exp(sum(t["logprob"] for t in tokens) / len(tokens))
+
+
+def _broken_reply(result) -> str | None:
+    """Respuesta inservible del modelo rápido: se repite con "strong" aunque sea el mismo modelo"""
+    if result.invalid_tool_calls:
+        return "invalid_tool_call"
+    if (result.response_metadata or {}).get("finish_reason") == "length":
+        return "max_tokens"
+    if not result.content and not result.tool_calls:
+        return "empty"
+    return None
+
+
+def _quality_issue(result) -> str | None:
+    """Motivo para preferir el modelo grande (solo si es otro modelo)"""
+    if len(result.tool_calls) > ESCALATE_TOOL_CALLS:
+        return "complex_plan"
+    if ESCALATE_ON_SENSITIVE and any(c["name"] in SENSITIVE_TOOL_NAMES for c in result.tool_calls):
+        return "sensitive"
+    confidence = _confidence(result)
+    if confidence is not None and confidence < ESCALATE_MIN_CONFIDENCE:
+        return "low_confidence"
+    return None
+
+
+def _timed_invoke(tier: str, runnable, prompt, config):
+    start = time.perf_counter()
+    try:
+        result = runnable.invoke(prompt, config)
+    except Exception:
+        _record(tier, time.perf_counter() - start, error=True)
+        raise
+    _record(tier, time.perf_counter() - start, result)
+    return result
+
+
+class TieredLLM:
+    """LLM de un nodo: su nivel con escalado al modelo grande"""
+
+    def __init__(self, node: str):
+        self.node = node
+        self.tier = NODE_TIERS.get(node, "strong")
+
+    def bind_tools(self, tools: list):
+        fast = chat_model("fast").bind_tools(tools)
+        strong = chat_model("strong").bind_tools(tools)
+        same_model = all(TIERS["fast"][k] == TIERS["strong"][k] for k in ("model", "base_url"))
+
+        def invoke(prompt, config):
+            if self.tier == "strong":
+                return _timed_invoke("strong", strong, prompt, config)
+
+            if _estimated_tokens(prompt) > FAST_MAX_INPUT_TOKENS:
+                reason = "context"
+            else:
+                try:
+                    result = _timed_invoke("fast", fast, prompt, config)
+                except Exception as e:
+                    reason = "timeout" if "timeout" in type(e).__name__.lower() else "error"
+                    logger.warning("Modelo rápido de %s falló (%r), escalando", self.node, e)
+                else:
+                    reason = _broken_reply(result) or (None if same_model else _quality_issue(result))
+                    if reason is None:
+                        return result
+            with _stats_lock:
+                _escalations[(self.node, reason)] += 1
+            return _timed_invoke("strong", strong, prompt, config)
+
+        return RunnableLambda(invoke, name=f"{self.node}_llm")
+
+
+def tiered_llm(node: str) -> TieredLLM:
+    """LLM configurado para el nodo `node` del grafo"""
+    return TieredLLM(node)
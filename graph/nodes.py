@@ -1,6 +1,7 @@
 """Nodos auxiliares para el grafo"""
 import json
 from langchain_core.messages import AnyMessage, ToolMessage
+from tools.encoding import json_default
 from .state import State
 
 
@@ -9,15 +10,11 @@ def _process_messages_for_llm(state: State) -> list[AnyMessage]:
     processed_messages = []
     for msg in state["messages"]:
         if isinstance(msg, ToolMessage) and not isinstance(msg.content, str):
-            try:
-                content_str = json.dumps(msg.content)
-                processed_messages.append(
-                    ToolMessage(content=content_str, tool_call_id=msg.tool_call_id)
-                )
-            except TypeError:
-                processed_messages.append(
-                    ToolMessage(content=str(msg.content), tool_call_id=msg.tool_call_id)
-                )
+            # Fechas en ISO en lugar de caer a str() del objeto entero
+            content_str = json.dumps(msg.content, default=json_default, ensure_ascii=False)
+            processed_messages.append(
+                ToolMessage(content=content_str, tool_call_id=msg.tool_call_id)
+            )
         else:
             processed_messages.append(msg)
     return processed_messages
@@ -0,0 +1,333 @@
+"""
+Cola de salida (outbox) de las acciones sensibles aprobadas.
+
+En lugar de ejecutar las tools sensibles dentro del turno del usuario, cada
+tool_call aprobada se guarda en `action_outbox` y el turno termina. Un pool
+de workers (handlers/outbox_worker.py, en cada réplica del bot) las reclama
+con `FOR UPDATE SKIP LOCKED`, las ejecuta y, cuando todas las llamadas del
+mismo mensaje del asistente han terminado, entrega los resultados al thread
+como ToolMessages y continúa el grafo.
+
+- `idempotency_key` = thread_id:tool_call_id: aprobar dos veces la misma
+  llamada (reintento del handler, otra réplica) no la encola dos veces.
+- Los errores transitorios de base de datos se reintentan con espera
+  exponencial hasta OUTBOX_MAX_ATTEMPTS; el resto se entrega como error.
+- Si un worker muere a mitad, la acción vuelve a la cola tras OUTBOX_LEASE
+  y se ejecuta otra vez. Las tools reciben idempotency_key como
+  `request_key` en el configurable y la guardan con la reserva o el cambio
+  de billetes (único, ON CONFLICT DO NOTHING): la segunda ejecución, o un
+  reintento tras un error después del COMMIT, devuelve el resultado
+  original sin repetir la escritura.
+- Los mensajes que el usuario envía mientras el thread espera se guardan en
+  `parked_messages` (park_message) y la entrega los añade tras los
+  ToolMessages antes de continuar el grafo: no se pierde ninguno.
+- Cada tarea worker tiene su propio id (`locked_by`): si su acción se
+  reclamó por lease, ya no puede cerrarla ni devolverla a la cola.
+"""
+import json
+import logging
+import os
+import socket
+
+from langchain_core.messages import HumanMessage, ToolMessage
+
+from config.database import OUTBOX_WORKERS, get_db_connection
+from config.replica import mark_primary_write
+from tools import (
+    car_rental_sensitive_tools,
+    excursion_sensitive_tools,
+    flight_sensitive_tools,
+    hotel_sensitive_tools,
+)
+from tools.base import TRANSIENT_DB_ERRORS
+from tools.encoding import json_default
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "true").lower() != "false"
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+# Espera antes del reintento n: OUTBOX_RETRY_BASE * 2^(n-1) segundos
+OUTBOX_RETRY_BASE = float(os.getenv("OUTBOX_RETRY_BASE", "2"))
+OUTBOX_LEASE = float(os.getenv("OUTBOX_LEASE", "300"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+
+# Prefijo de los ids de worker de este proceso (worker_id)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Errores que suelen desaparecer al reintentar (conexión caída, deadlock, pool lleno)
+RETRYABLE_ERRORS = TRANSIENT_DB_ERRORS
+
+SENSITIVE_TOOLS = {
+    tool.name: tool
+    for tool in (
+        flight_sensitive_tools
+        + hotel_sensitive_tools
+        + car_rental_sensitive_tools
+        + excursion_sensitive_tools
+    )
+}
+
+
+def enqueue_actions(message, node: str, config: dict, chat_id: int | None = None) -> int:
+    """
+    Encola las tool_calls de `message` (el AIMessage interrumpido antes de
+    `node`). Devuelve cuántas son nuevas; las ya encoladas se ignoran.
+    """
+    configurable = config["configurable"]
+    thread_id = configurable["thread_id"]
+    # Solo lo que necesitan las tools (passenger_id), no overrides del turno
+    tool_configurable = {k: configurable[k] for k in ("passenger_id", "thread_id") if k in configurable}
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    inserted = 0
+    for call in message.tool_calls:
+        cursor.execute(
+            """
+            INSERT INTO action_outbox (idempotency_key, thread_id, batch_id, node, chat_id,
+                                       tool_name, tool_call_id, args, configurable)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (idempotency_key) DO NOTHING
+            """,
+            (
+                f"{thread_id}:{call['id']}", thread_id, message.id, node, chat_id,
+                call["name"], call["id"],
+                json.dumps(call["args"], default=json_default, ensure_ascii=False),
+                json.dumps(tool_configurable, default=json_default),
+            ),
+        )
+        inserted += cursor.rowcount
+    conn.commit()
+    conn.close()
+    return inserted
+
+
+def has_pending_actions(thread_id: str) -> bool:
+    """True si el thread tiene acciones sin entregar (encoladas o en curso)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT EXISTS (SELECT 1 FROM action_outbox WHERE thread_id = %s AND delivered_at IS NULL)",
+        (thread_id,),
+    )
+    pending = cursor.fetchone()[0]
+    conn.close()
+    return pending
+
+
+def worker_id(n: int) -> str:
+    """Id de la tarea worker `n` de este proceso"""
+    return f"{WORKER_ID}:{n}"
+
+
+def claim_actions(limit: int = 1, worker: str = WORKER_ID) -> list[dict]:
+    """
+    Reclama hasta `limit` acciones listas (o con el lease caducado) para el
+    worker `worker`. SKIP LOCKED reparte las filas entre workers sin que se
+    esperen.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        UPDATE action_outbox o
+        SET status = 'running', attempts = o.attempts + 1,
+            locked_by = %(worker)s, locked_at = clock_timestamp()
+        FROM (
+            SELECT id FROM action_outbox
+            WHERE (status = 'pending' AND available_at <= clock_timestamp())
+               OR (status = 'running' AND locked_at < clock_timestamp() - make_interval(secs => %(lease)s))
+            ORDER BY id
+            LIMIT %(limit)s
+            FOR UPDATE SKIP LOCKED
+        ) ready
+        WHERE o.id = ready.id
+        RETURNING o.id, o.tool_name, o.args, o.configurable, o.attempts, o.idempotency_key
+        """,
+        {"worker": worker, "lease": OUTBOX_LEASE, "limit": limit},
+    )
+    jobs = [
+        {
+            "id": row[0], "tool_name": row[1], "args": row[2], "configurable": row[3],
+            "attempts": row[4], "idempotency_key": row[5], "worker": worker,
+        }
+        for row in cursor.fetchall()
+    ]
+    conn.commit()
+    conn.close()
+    return jobs
+
+
+def _finish(job: dict, status: str, result: str | None = None, error: str | None = None):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        UPDATE action_outbox
+        SET status = %s, result = %s, error = %s, finished_at = clock_timestamp(), locked_by = NULL
+        WHERE id = %s AND locked_by = %s
+        """,
+        (status, result, error, job["id"], job["worker"]),
+    )
+    conn.commit()
+    conn.close()
+
+
+def _retry_later(job: dict, error: str):
+    delay = OUTBOX_RETRY_BASE * 2 ** (job["attempts"] - 1)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        UPDATE action_outbox
+        SET status = 'pending', error = %s, locked_by = NULL,
+            available_at = clock_timestamp() + make_interval(secs => %s)
+        WHERE id = %s AND locked_by = %s
+        """,
+        (error, delay, job["id"], job["worker"]),
+    )
+    conn.commit()
+    conn.close()
+
+
+def execute_action(job: dict) -> str:
+    """Ejecuta una acción reclamada y registra su resultado. Devuelve el estado final."""
+    tool = SENSITIVE_TOOLS.get(job["tool_name"])
+    if tool is None:
+        _finish(job, "failed", error=f"Error: la tool {job['tool_name']} no existe")
+        return "failed"
+
+    # La tool guarda la clave con su escritura: un reintento devuelve el resultado original
+    configurable = {**job["configurable"], "request_key": job["idempotency_key"]}
+    try:
+        result = tool.invoke(job["args"], config={"configurable": configurable})
+    except RETRYABLE_ERRORS as e:
+        if job["attempts"] < OUTBOX_MAX_ATTEMPTS:
+            logger.warning("Acción %s falló (intento %s), se reintentará: %r", job["id"], job["attempts"], e)
+            _retry_later(job, repr(e))
+            return "pending"
+        logger.error("Acción %s agotó sus %s intentos: %r", job["id"], job["attempts"], e)
+        _finish(job, "failed", error=f"Error: {e!r}")
+        return "failed"
+    except Exception as e:
+        # Como el ToolNode: el asistente recibe el error y se lo explica al usuario
+        _finish(job, "failed", error=f"Error: {e!r}")
+        return "failed"
+
+    if not isinstance(result, str):
+        result = json.dumps(result, default=json_default, ensure_ascii=False)
+    # Respaldo: las tools ya avanzan el fence al confirmar su escritura
+    try:
+        mark_primary_write()
+    except Exception:
+        logger.exception("No se pudo publicar el fence de lectura de la acción %s", job["id"])
+    _finish(job, "done", result=result)
+    return "done"
+
+
+def ready_batches(limit: int = 20) -> list[dict]:
+    """Mensajes del asistente con todas sus acciones terminadas y aún sin entregar"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT thread_id, batch_id, min(node), min(chat_id), (array_agg(configurable ORDER BY id))[1]
+        FROM action_outbox
+        WHERE delivered_at IS NULL
+        GROUP BY thread_id, batch_id
+        HAVING bool_and(status IN ('done', 'failed'))
+        ORDER BY min(finished_at)
+        LIMIT %s
+        """,
+        (limit,),
+    )
+    batches = [
+        {"thread_id": row[0], "batch_id": row[1], "node": row[2], "chat_id": row[3], "configurable": row[4]}
+        for row in cursor.fetchall()
+    ]
+    conn.close()
+    return batches
+
+
+def batch_messages(batch_id: str) -> list[ToolMessage]:
+    """ToolMessages con los resultados de las acciones del mensaje `batch_id`"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT tool_name, tool_call_id, status, result, error FROM action_outbox WHERE batch_id = %s ORDER BY id",
+        (batch_id,),
+    )
+    messages = [
+        ToolMessage(
+            content=result if status == "done" else error,
+            name=tool_name,
+            tool_call_id=tool_call_id,
+            status="success" if status == "done" else "error",
+        )
+        for tool_name, tool_call_id, status, result, error in cursor.fetchall()
+    ]
+    conn.close()
+    return messages
+
+
+def mark_delivered(batch_id: str):
+    """Marca como entregadas las acciones del mensaje `batch_id`"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE action_outbox SET delivered_at = clock_timestamp() WHERE batch_id = %s AND delivered_at IS NULL",
+        (batch_id,),
+    )
+    conn.commit()
+    conn.close()
+
+
+def outbox_stats() -> dict:
+    """Acciones por estado (las entregadas aparte)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT CASE WHEN delivered_at IS NULL THEN status ELSE 'delivered' END, count(*)
+        FROM action_outbox GROUP BY 1
+        """
+    )
+    stats = dict(cursor.fetchall())
+    conn.close()
+    return stats
+
+
+def park_message(thread_id: str, content: str):
+    """Guarda un mensaje del usuario hasta que se entregue el lote pendiente del thread"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO parked_messages (thread_id, content) VALUES (%s, %s)", (thread_id, content))
+    conn.commit()
+    conn.close()
+
+
+def parked_messages(thread_id: str) -> list[HumanMessage]:
+    """
+    Mensajes guardados del thread, en orden. El id del HumanMessage sale de
+    la fila: si la entrega se repite, los ya añadidos al estado se reconocen.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, content FROM parked_messages WHERE thread_id = %s ORDER BY id", (thread_id,))
+    messages = [HumanMessage(content=content, id=f"parked-{row_id}") for row_id, content in cursor.fetchall()]
+    conn.close()
+    return messages
+
+
+def drop_parked_messages(messages: list[HumanMessage]):
+    """Borra los mensajes guardados que ya están en el estado del thread"""
+    if not messages:
+        return
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "DELETE FROM parked_messages WHERE id = ANY(%s)",
+        ([int(m.id.removeprefix("parked-")) for m in messages],),
+    )
+    conn.commit()
+    conn.close()
@@ -10,6 +10,7 @@ from graph.state import (
     ToExcursionAssistant,
     CompleteOrEscalate
 )
+from graph.fanout import delegation_calls, fan_out
 
 
 def route_primary_assistant(state: State):
@@ -17,6 +18,10 @@ def route_primary_assistant(state: State):
     route = tools_condition(state)
     if route == END:
         return END
+
+    # Varias delegaciones en el mismo mensaje: especialistas en paralelo
+    if len(delegation_calls(state["messages"][-1])) > 1:
+        return fan_out(state)
     
     tool_call = state["messages"][-1].tool_calls[0]
     
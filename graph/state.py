@@ -14,10 +14,17 @@ def update_dialog_stack(left: list[str], right: str | None) -> list[str]:
     return left + [right]
 
 
+def update_specialist_results(left: list[dict], right: list[dict] | str) -> list[dict]:
+    """Acumula los resultados de las subtareas en paralelo; "clear" los descarta tras unirlos"""
+    if right == "clear":
+        return []
+    return left + right
+
+
 class State(TypedDict):
     """Estado global del grafo de conversación"""
     messages: Annotated[list[AnyMessage], lambda x, y: x + y]
-    user_info: list
+    user_info: str
     dialog_state: Annotated[
         list[
             Literal[
@@ -30,6 +37,15 @@ class State(TypedDict):
         ],
         update_dialog_stack,
     ]
+    # Resultados de las subtareas de especialistas lanzadas en paralelo (graph/fanout.py)
+    specialist_results: Annotated[list[dict], update_specialist_results]
+
+
+class SpecialistTask(TypedDict):
+    """Subtarea de un especialista con su propio historial de mensajes"""
+    skill: Literal["flight", "hotel", "car_rental", "excursion"]
+    request: str
+    tool_call_id: str
 
 
 # Modelos de escalado entre asistentes
@@ -0,0 +1,258 @@
+"""
+Exclusión mutua por thread_id entre procesos del bot.
+
+Con varias réplicas contra el mismo PostgreSQL, dos mensajes del mismo
+usuario pueden llegar a procesos distintos: ambos cargarían el mismo
+checkpoint y lo bifurcarían. Cada turno toma antes un advisory lock de
+sesión `pg_advisory_lock(THREAD_LOCK_CLASS, hashtext(thread_id))` en una
+conexión que mantiene mientras dura el turno; las demás réplicas esperan.
+
+- Si el proceso muere, PostgreSQL libera el lock al cerrarse su sesión.
+- Si la sesión sigue viva pero el dueño no (conexión medio abierta, proceso
+  colgado), el lock queda huérfano: el dueño registra un latido en
+  thread_lock_holders y, si quien espera ve que el latido es más viejo que
+  THREAD_LOCK_STALE_AFTER, termina la sesión del dueño con
+  pg_terminate_backend y se queda el lock. Un turno largo con latido al día
+  no se interrumpe (pasado THREAD_LOCK_MAX_HOLD solo se avisa en el log).
+- Fence: el turno escribe checkpoints por otras conexiones, que siguen vivas
+  aunque le quiten el lock. El checkpointer (graph/checkpointer.py) llama a
+  check_thread_lease antes de cada escritura: si el último latido confirmado
+  es demasiado viejo para seguir siendo dueño, o el latido falló, lanza
+  ThreadLockLost y el turno se detiene sin bifurcar el thread.
+- La conexión del lock es propia, fuera del pool de negocio: se mantiene
+  todo el turno (y mientras se espera).
+- lock_stats() devuelve las métricas de espera del proceso.
+"""
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from config.database import connect_dedicated
+
+logger = logging.getLogger(__name__)
+
+# Primer entero del advisory lock: separa estos locks de otros usos de hashtext
+THREAD_LOCK_CLASS = 7301
+THREAD_LOCK_TIMEOUT = float(os.getenv("THREAD_LOCK_TIMEOUT", "120"))
+THREAD_LOCK_STALE_AFTER = float(os.getenv("THREAD_LOCK_STALE_AFTER", "60"))
+# Turno más largo esperado: por encima se avisa en el log (el lock no se quita)
+THREAD_LOCK_MAX_HOLD = float(os.getenv("THREAD_LOCK_MAX_HOLD", "600"))
+# Esperas por encima de esto se registran en el log
+THREAD_LOCK_SLOW_WAIT = float(os.getenv("THREAD_LOCK_SLOW_WAIT", "1"))
+_POLL_INTERVAL = 0.05
+_MAX_POLL_INTERVAL = 1.0
+
+HOLDER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+# El dueño deja de escribir antes de que otro pueda considerar su latido caducado
+_FENCE_AFTER = THREAD_LOCK_STALE_AFTER * 0.8
+
+
+class ThreadLockTimeout(Exception):
+    """Otro proceso tiene el thread ocupado más de THREAD_LOCK_TIMEOUT"""
+
+
+class ThreadLockLost(Exception):
+    """El turno ya no tiene el lock de su thread: no debe escribir más checkpoints"""
+
+
+class ThreadLease:
+    """Lock de un thread en manos del turno actual"""
+
+    def __init__(self, thread_id: str):
+        self.thread_id = thread_id
+        self.lost = False
+        # Inicio del último latido confirmado: su heartbeat_at en la base es posterior
+        self.beat_started = time.monotonic()
+
+    def held(self) -> bool:
+        return not self.lost and time.monotonic() - self.beat_started < _FENCE_AFTER
+
+
+_current_lease: ContextVar[ThreadLease | None] = ContextVar("thread_lease", default=None)
+
+
+def check_thread_lease(thread_id: str):
+    """Lanza ThreadLockLost si el turno en curso ya no es dueño de `thread_id`"""
+    lease = _current_lease.get()
+    if lease is not None and lease.thread_id == thread_id and not lease.held():
+        raise ThreadLockLost(f"Se perdió el lock del thread {thread_id}")
+
+
+_stats_lock = threading.Lock()
+_stats = {
+    "acquired": 0,
+    "contended": 0,
+    "timeouts": 0,
+    "stale_recovered": 0,
+    "wait_seconds_total": 0.0,
+    "wait_seconds_max": 0.0,
+}
+
+
+def lock_stats() -> dict:
+    """Métricas de espera de los locks de thread en este proceso"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["wait_seconds_avg"] = stats["wait_seconds_total"] / stats["contended"] if stats["contended"] else 0.0
+    return stats
+
+
+def _record_wait(waited: float, contended: bool):
+    with _stats_lock:
+        _stats["acquired"] += 1
+        if contended:
+            _stats["contended"] += 1
+            _stats["wait_seconds_total"] += waited
+            _stats["wait_seconds_max"] = max(_stats["wait_seconds_max"], waited)
+    if waited >= THREAD_LOCK_SLOW_WAIT:
+        logger.warning("Lock de thread obtenido tras %.2f s de espera", waited)
+
+
+def _recover_stale(cursor, thread_id: str) -> bool:
+    """Termina la sesión del dueño si su latido está caducado"""
+    cursor.execute(
+        """
+        SELECT l.pid,
+               h.backend_pid = l.pid
+               AND h.heartbeat_at < clock_timestamp() - make_interval(secs => %(stale)s)
+        FROM pg_locks l
+        LEFT JOIN thread_lock_holders h ON h.thread_id = %(thread_id)s
+        WHERE l.locktype = 'advisory' AND l.granted
+          AND l.classid = %(class)s AND l.objid = hashtext(%(thread_id)s)::oid AND l.objsubid = 2
+        """,
+        {"thread_id": thread_id, "class": THREAD_LOCK_CLASS, "stale": THREAD_LOCK_STALE_AFTER},
+    )
+    row = cursor.fetchone()
+    if row is None or not row[1]:
+        return False
+    cursor.execute("SELECT pg_terminate_backend(%s)", (row[0],))
+    logger.warning("Lock huérfano del thread %s: terminada la sesión %s", thread_id, row[0])
+    with _stats_lock:
+        _stats["stale_recovered"] += 1
+    return True
+
+
+def _heartbeat(conn, lease: ThreadLease, stop: threading.Event):
+    cursor = conn.cursor()
+    acquired = time.monotonic()
+    warned = False
+    while not stop.wait(THREAD_LOCK_STALE_AFTER / 3):
+        started = time.monotonic()
+        try:
+            cursor.execute(
+                "UPDATE thread_lock_holders SET heartbeat_at = clock_timestamp() "
+                "WHERE thread_id = %s AND backend_pid = pg_backend_pid()",
+                (lease.thread_id,),
+            )
+            renewed = cursor.rowcount == 1
+        except Exception:
+            logger.exception("No se pudo renovar el latido del lock de %s", lease.thread_id)
+            renewed = False
+        if not renewed:
+            # Otro proceso pudo quedarse el lock: el fence corta las escrituras del turno
+            lease.lost = True
+            logger.error("Perdido el lock del thread %s: el turno no escribirá más", lease.thread_id)
+            return
+        lease.beat_started = started
+        if not warned and started - acquired > THREAD_LOCK_MAX_HOLD:
+            warned = True
+            logger.warning("El turno del thread %s lleva más de %.0f s con el lock", lease.thread_id, THREAD_LOCK_MAX_HOLD)
+
+
+def _acquire(thread_id: str, timeout: float):
+    """Espera el lock en una conexión propia; devuelve (conexión, lease, parada del latido, hilo del latido)"""
+    conn = connect_dedicated()
+    conn.autocommit = True
+    cursor = conn.cursor()
+    start = time.monotonic()
+    interval = _POLL_INTERVAL
+    contended = False
+    try:
+        while True:
+            cursor.execute("SELECT pg_try_advisory_lock(%s, hashtext(%s))", (THREAD_LOCK_CLASS, thread_id))
+            if cursor.fetchone()[0]:
+                break
+            contended = True
+            if time.monotonic() - start >= timeout:
+                with _stats_lock:
+                    _stats["timeouts"] += 1
+                raise ThreadLockTimeout(f"El thread {thread_id} sigue ocupado tras {timeout:g} s")
+            if _recover_stale(cursor, thread_id):
+                continue
+            time.sleep(interval)
+            interval = min(interval * 2, _MAX_POLL_INTERVAL)
+
+        _record_wait(time.monotonic() - start, contended)
+        lease = ThreadLease(thread_id)
+        cursor.execute(
+            """
+            INSERT INTO thread_lock_holders (thread_id, backend_pid, holder) VALUES (%s, pg_backend_pid(), %s)
+            ON CONFLICT (thread_id) DO UPDATE
+            SET backend_pid = EXCLUDED.backend_pid, holder = EXCLUDED.holder,
+                acquired_at = clock_timestamp(), heartbeat_at = clock_timestamp()
+            """,
+            (thread_id, HOLDER),
+        )
+    except BaseException:
+        conn.close()
+        raise
+
+    stop = threading.Event()
+    beater = threading.Thread(target=_heartbeat, args=(conn, lease, stop), daemon=True)
+    beater.start()
+    return conn, lease, stop, beater
+
+
+def _release(conn, lease: ThreadLease, stop: threading.Event, beater: threading.Thread):
+    stop.set()
+    beater.join()
+    if lease.lost:
+        # Sin sesión no hay lock que soltar: lo liberó el servidor
+        conn.close()
+        return
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM thread_lock_holders WHERE thread_id = %s AND backend_pid = pg_backend_pid()",
+            (lease.thread_id,),
+        )
+        cursor.execute("SELECT pg_advisory_unlock(%s, hashtext(%s))", (THREAD_LOCK_CLASS, lease.thread_id))
+    except Exception:
+        # Si cayó la conexión, el servidor ya liberó el lock con la sesión
+        logger.exception("No se pudo liberar el lock de %s", lease.thread_id)
+    conn.close()
+
+
+@contextmanager
+def thread_lock(thread_id: str, timeout: float = THREAD_LOCK_TIMEOUT):
+    """Bloquea `thread_id` para este proceso durante el bloque `with`"""
+    held = _acquire(thread_id, timeout)
+    token = _current_lease.set(held[1])
+    try:
+        yield held[1]
+    finally:
+        _current_lease.reset(token)
+        _release(*held)
+
+
+@asynccontextmanager
+async def thread_turn(thread_id: str, timeout: float = THREAD_LOCK_TIMEOUT):
+    """
+    thread_lock para handlers async: espera el lock sin bloquear el event
+    loop. El lease queda en el contexto de la tarea, así las ejecuciones del
+    grafo en asyncio.to_thread lo heredan para el fence del checkpointer.
+    """
+    held = await asyncio.to_thread(_acquire, thread_id, timeout)
+    token = _current_lease.set(held[1])
+    try:
+        yield held[1]
+    finally:
+        _current_lease.reset(token)
+        await asyncio.to_thread(_release, *held)
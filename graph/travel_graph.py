@@ -11,10 +11,9 @@ from .agents import (
 
 from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import ToolNode
-from langgraph.checkpoint.postgres import PostgresSaver
-from psycopg import Connection
 
-from config.database import get_connection_string
+from .checkpointer import build_checkpointer
+from .fanout import specialist_task_node, merge_specialists_node, route_after_merge
 from tools import (
     primary_assistant_tools,
     fetch_user_flight_information,
@@ -28,11 +27,6 @@ from .nodes import create_entry_node, leave_skill_node
 from .routing import route_primary_assistant, create_skill_router, route_to_workflow
 
 
-
-# ✅ Checkpointer con PostgreSQL
-connection_string = get_connection_string()
-
-
 # Construcción del grafo
 builder = StateGraph(State)
 
@@ -69,12 +63,23 @@ builder.add_node("excursion_assistant", excursion_assistant_node)
 builder.add_node("excursion_safe_tools", ToolNode(excursion_safe_tools))
 builder.add_node("excursion_sensitive_tools", ToolNode(excursion_sensitive_tools))
 
+# Solicitudes compuestas: especialistas en paralelo (graph/fanout.py)
+builder.add_node("specialist_task", specialist_task_node)
+builder.add_node("merge_specialists", merge_specialists_node)
+builder.add_node(
+    "fanout_sensitive_tools",
+    ToolNode(flight_sensitive_tools + hotel_sensitive_tools + car_rental_sensitive_tools + excursion_sensitive_tools)
+)
+
 # Edges
 builder.add_edge(START, "fetch_user_info")
 builder.add_conditional_edges("fetch_user_info", route_to_workflow)
 builder.add_conditional_edges("primary_assistant", route_primary_assistant)
 builder.add_edge("primary_tools_node", "primary_assistant")
 builder.add_edge("leave_skill", "primary_assistant")
+builder.add_edge("specialist_task", "merge_specialists")
+builder.add_conditional_edges("merge_specialists", route_after_merge)
+builder.add_edge("fanout_sensitive_tools", "primary_assistant")
 
 # Edges dinámicos para cada skill
 for skill in ["flight", "hotel", "car_rental", "excursion"]:
@@ -94,17 +99,19 @@ for skill in ["flight", "hotel", "car_rental", "excursion"]:
         },
     )
 
-# Crear el checkpointer SIN usar 'with'
-checkpointer = PostgresSaver(
-    Connection.connect(connection_string, autocommit=True)
-)
+# Nodos que se pausan para confirmar (reservas, cambios y cancelaciones)
+SENSITIVE_TOOL_NODES = [
+    "flight_sensitive_tools",
+    "hotel_sensitive_tools",
+    "car_rental_sensitive_tools",
+    "excursion_sensitive_tools",
+    "fanout_sensitive_tools",
+]
+
+# ✅ Checkpointer con PostgreSQL (pool psycopg3, ver graph/checkpointer.py)
+checkpointer = build_checkpointer()
 # ✅ Compilar con checkpointer
 graph = builder.compile(
     checkpointer=checkpointer,
-    interrupt_before=[
-        "flight_sensitive_tools",
-        "hotel_sensitive_tools",
-        "car_rental_sensitive_tools",
-        "excursion_sensitive_tools",
-    ],
+    interrupt_before=SENSITIVE_TOOL_NODES,
 )
\ No newline at end of file
@@ -0,0 +1,246 @@
+"""
+Updates de Telegram procesados una sola vez.
+
+Si el bot tarda, Telegram vuelve a entregar el mismo update, y el usuario
+puede mandar dos veces el mismo mensaje: cada copia lanzaría un turno
+completo del grafo (LLM, consultas y quizá una reserva duplicada). Antes
+de cualquier trabajo, `idempotent_update` reclama las claves del update:
+
+- `update:<update_id>` y `message:<chat_id>:<message_id>`, durante
+  DEDUP_RETENTION (Telegram no reintenta updates de más de 24 h);
+- `content:<chat_id>:<hash>` del texto (o del audio), durante
+  DEDUP_DOUBLE_SEND_WINDOW: el doble envío del usuario. Los textos de
+  menos de DEDUP_MIN_CONTENT_LENGTH caracteres no llevan esta clave: un
+  "sí" repetido es una respuesta nueva, no una copia.
+
+Si alguna clave ya está reclamada, el update se descarta. Primero se
+consulta un LRU en memoria (DEDUP_LRU_SIZE claves) y después la tabla
+processed_updates, compartida por todas las réplicas del bot. Si el
+handler falla, las claves se liberan para que un reintento se procese;
+una clave "processing" de un proceso caído se puede reclamar pasado
+DEDUP_LEASE.
+"""
+import asyncio
+import functools
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import psycopg2
+from psycopg2.pool import PoolError
+from telegram import Update
+
+from config.database import get_db_connection
+from graph.thread_lock import HOLDER, THREAD_LOCK_MAX_HOLD
+
+logger = logging.getLogger(__name__)
+
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() != "false"
+DEDUP_LRU_SIZE = int(os.getenv("DEDUP_LRU_SIZE", "10000"))
+DEDUP_RETENTION = float(os.getenv("DEDUP_RETENTION", "86400"))
+# Mismo contenido en el mismo chat dentro de esta ventana (s) = doble envío (0 = no se compara)
+DEDUP_DOUBLE_SEND_WINDOW = float(os.getenv("DEDUP_DOUBLE_SEND_WINDOW", "5"))
+# Textos más cortos (confirmaciones como "sí" u "ok") nunca se comparan por contenido
+DEDUP_MIN_CONTENT_LENGTH = int(os.getenv("DEDUP_MIN_CONTENT_LENGTH", "12"))
+# Un turno no suele durar más que THREAD_LOCK_MAX_HOLD
+DEDUP_LEASE = float(os.getenv("DEDUP_LEASE", str(THREAD_LOCK_MAX_HOLD)))
+DEDUP_PRUNE_INTERVAL = float(os.getenv("DEDUP_PRUNE_INTERVAL", "3600"))
+
+# Inserta la clave o la recupera si caducó o su dueño la dejó a medias
+CLAIM_SQL = """
+    INSERT INTO processed_updates (dedup_key, holder, expires_at)
+    VALUES (%(key)s, %(holder)s, CURRENT_TIMESTAMP + make_interval(secs => %(ttl)s))
+    ON CONFLICT (dedup_key) DO UPDATE
+    SET status = 'processing', holder = EXCLUDED.holder, claimed_at = CURRENT_TIMESTAMP,
+        expires_at = EXCLUDED.expires_at, finished_at = NULL
+    WHERE processed_updates.expires_at < CURRENT_TIMESTAMP
+       OR (processed_updates.status = 'processing'
+           AND processed_updates.claimed_at < CURRENT_TIMESTAMP - make_interval(secs => %(lease)s))
+    RETURNING dedup_key
+"""
+
+_lock = threading.Lock()
+_lru: OrderedDict[str, float] = OrderedDict()  # clave -> caducidad (time.monotonic)
+_last_prune = 0.0
+_stats = {"claimed": 0, "lru_duplicates": 0, "db_duplicates": 0, "released": 0, "db_errors": 0}
+
+
+def update_keys(update: Update) -> list[tuple[str, float]]:
+    """Claves de idempotencia del update con su duración en segundos"""
+    keys = [(f"update:{update.update_id}", DEDUP_RETENTION)]
+    message = update.effective_message
+    if message is None:
+        return keys
+    keys.append((f"message:{message.chat_id}:{message.message_id}", DEDUP_RETENTION))
+    if message.voice:
+        content = message.voice.file_unique_id
+    elif message.text and len(message.text.strip()) >= DEDUP_MIN_CONTENT_LENGTH:
+        content = message.text
+    else:
+        content = None
+    if content and DEDUP_DOUBLE_SEND_WINDOW > 0:
+        digest = hashlib.sha1(content.strip().lower().encode()).hexdigest()[:16]
+        keys.append((f"content:{message.chat_id}:{digest}", DEDUP_DOUBLE_SEND_WINDOW))
+    return keys
+
+
+def seen_recently(keys: list[tuple[str, float]]) -> bool:
+    """¿Alguna clave la reclamó ya este proceso? (sin ir a la base de datos)"""
+    now = time.monotonic()
+    with _lock:
+        for key, _ in keys:
+            expires = _lru.get(key)
+            if expires is not None and expires > now:
+                _lru.move_to_end(key)
+                _stats["lru_duplicates"] += 1
+                return True
+    return False
+
+
+def _remember(keys: list[tuple[str, float]]):
+    now = time.monotonic()
+    with _lock:
+        for key, ttl in keys:
+            _lru[key] = now + ttl
+            _lru.move_to_end(key)
+        while len(_lru) > DEDUP_LRU_SIZE:
+            _lru.popitem(last=False)
+
+
+def _prune(cursor):
+    """Borra claves caducadas (como mucho una vez por DEDUP_PRUNE_INTERVAL y proceso)"""
+    global _last_prune
+    now = time.monotonic()
+    with _lock:
+        if now - _last_prune < DEDUP_PRUNE_INTERVAL:
+            return
+        _last_prune = now
+    cursor.execute(
+        """
+        DELETE FROM processed_updates
+        WHERE expires_at < CURRENT_TIMESTAMP
+          AND (status = 'done' OR claimed_at < CURRENT_TIMESTAMP - make_interval(secs => %s))
+        """,
+        (DEDUP_LEASE,),
+    )
+
+
+def claim_update(keys: list[tuple[str, float]]) -> bool:
+    """
+    Reclama todas las claves en processed_updates (todas o ninguna).
+    False si otra copia del update ya se procesó o se está procesando.
+    Si la base de datos no responde, se procesa (solo protege el LRU).
+    """
+    try:
+        conn = get_db_connection()
+    except (psycopg2.Error, PoolError):
+        logger.warning("Sin base de datos para deduplicar updates", exc_info=True)
+        with _lock:
+            _stats["db_errors"] += 1
+        _remember(keys)
+        return True
+    try:
+        cursor = conn.cursor()
+        for key, ttl in keys:
+            cursor.execute(CLAIM_SQL, {"key": key, "holder": HOLDER, "ttl": ttl, "lease": DEDUP_LEASE})
+            if cursor.fetchone() is None:
+                conn.rollback()
+                with _lock:
+                    _stats["db_duplicates"] += 1
+                return False
+        _prune(cursor)
+        conn.commit()
+    except psycopg2.Error:
+        conn.rollback()
+        logger.warning("No se pudo reclamar el update, se procesa igualmente", exc_info=True)
+        with _lock:
+            _stats["db_errors"] += 1
+        _remember(keys)
+        return True
+    finally:
+        conn.close()
+
+    _remember(keys)
+    with _lock:
+        _stats["claimed"] += 1
+    return True
+
+
+def finish_update(keys: list[tuple[str, float]]):
+    """El update terminó: sus claves quedan como procesadas hasta caducar"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            UPDATE processed_updates SET status = 'done', finished_at = CURRENT_TIMESTAMP
+            WHERE dedup_key = ANY(%s) AND holder = %s
+            """,
+            ([key for key, _ in keys], HOLDER),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def release_update(keys: list[tuple[str, float]]):
+    """El handler falló: las claves se liberan para que un reintento se procese"""
+    with _lock:
+        for key, _ in keys:
+            _lru.pop(key, None)
+        _stats["released"] += 1
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM processed_updates WHERE dedup_key = ANY(%s) AND holder = %s AND status = 'processing'",
+            ([key for key, _ in keys], HOLDER),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def dedup_stats() -> dict:
+    """Updates procesados y duplicados descartados (por el LRU o por la tabla) en este proceso"""
+    with _lock:
+        stats = dict(_stats)
+        stats["lru_size"] = len(_lru)
+    return stats
+
+
+def idempotent_update(handler):
+    """
+    Decorador de handlers: descarta las copias de un update antes de hacer
+    nada. Las llamadas internas con un update simulado (p. ej. el texto
+    transcrito de un audio) no son un `Update` y pasan directamente.
+    """
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        if not DEDUP_ENABLED or not isinstance(update, Update):
+            return await handler(update, context)
+
+        keys = update_keys(update)
+        if seen_recently(keys) or not await asyncio.to_thread(claim_update, keys):
+            logger.info("🔁 Update %s duplicado, descartado", update.update_id)
+            return None
+
+        try:
+            result = await handler(update, context)
+        except BaseException:
+            try:
+                await asyncio.to_thread(release_update, keys)
+            except Exception:
+                logger.exception("No se pudieron liberar las claves del update %s", update.update_id)
+            raise
+        try:
+            await asyncio.to_thread(finish_update, keys)
+        except Exception:
+            # Se quedan "processing" hasta DEDUP_LEASE: igualmente bloquean las copias
+            logger.warning("No se pudo marcar el update %s como procesado", update.update_id, exc_info=True)
+        return result
+
+    return wrapper
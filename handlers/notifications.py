@@ -0,0 +1,231 @@
+"""
+Recordatorios proactivos de salida de vuelos.
+
+Cada NOTIFY_INTERVAL segundos, `DepartureNotifier` busca los vuelos que
+salen dentro de la ventana [ahora + NOTIFY_MIN_LEAD, ahora + NOTIFY_WINDOW]
+(rango sobre idx_flights_departure) y los une en bloque con sus billetes y
+los usuarios de Telegram del pasajero. Cada recordatorio se reclama en
+departure_notifications con INSERT ... ON CONFLICT, así solo una réplica lo
+envía y nunca se repite:
+
+1. claim_due_reminders: reclama hasta NOTIFY_BATCH_SIZE recordatorios
+   (nuevos, o "pending" de un proceso caído pasado NOTIFY_LEASE).
+2. Se agrupan por usuario (un mensaje con todos sus vuelos) y se envían por
+   la cola de envío (handlers/sender.py) a NOTIFY_RATE mensajes/s, para
+   dejar margen a las respuestas de los chats.
+3. mark_reminders: "sent", o "failed" si el usuario bloqueó el bot; si el
+   envío falla por otra causa queda "pending" y se reintenta tras el lease.
+
+La tabla es el checkpoint del progreso: tras un reinicio se sigue donde se
+quedó. Si el proceso muere entre el envío y la marca, ese lote se reenvía.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from telegram.error import BadRequest, Forbidden
+
+from config.database import get_db_connection
+from graph.thread_lock import HOLDER
+from .sender import TokenBucket, outbound
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_ENABLED = os.getenv("NOTIFY_ENABLED", "true").lower() != "false"
+NOTIFY_INTERVAL = float(os.getenv("NOTIFY_INTERVAL", "60"))
+# Ventana de salida (horas) y antelación mínima (minutos) para avisar
+NOTIFY_WINDOW = float(os.getenv("NOTIFY_WINDOW", "24"))
+NOTIFY_MIN_LEAD = float(os.getenv("NOTIFY_MIN_LEAD", "30"))
+NOTIFY_BATCH_SIZE = int(os.getenv("NOTIFY_BATCH_SIZE", "500"))
+NOTIFY_RATE = float(os.getenv("NOTIFY_RATE", "20"))
+NOTIFY_LEASE = float(os.getenv("NOTIFY_LEASE", "600"))
+
+CLAIM_SQL = """
+    WITH due AS (
+        SELECT u.telegram_user_id, t.ticket_no, f.flight_id, f.flight_no,
+               f.departure_airport, f.arrival_airport, f.scheduled_departure, bp.seat_no
+        FROM flights f
+        JOIN ticket_flights tf ON tf.flight_id = f.flight_id
+        JOIN tickets t ON t.ticket_no = tf.ticket_no
+        JOIN users u ON u.passenger_id = t.passenger_id
+        LEFT JOIN boarding_passes bp ON bp.ticket_no = t.ticket_no AND bp.flight_id = f.flight_id
+        WHERE f.scheduled_departure >= %(start)s
+          AND f.scheduled_departure < %(end)s
+          AND NOT EXISTS (
+              SELECT 1 FROM departure_notifications n
+              WHERE n.telegram_user_id = u.telegram_user_id
+                AND n.ticket_no = t.ticket_no
+                AND n.flight_id = f.flight_id
+                AND (n.status <> 'pending' OR n.claimed_at >= CURRENT_TIMESTAMP - make_interval(secs => %(lease)s))
+          )
+        ORDER BY f.scheduled_departure
+        LIMIT %(limit)s
+    ),
+    claimed AS (
+        INSERT INTO departure_notifications (telegram_user_id, ticket_no, flight_id, holder)
+        SELECT telegram_user_id, ticket_no, flight_id, %(holder)s FROM due
+        ON CONFLICT (telegram_user_id, ticket_no, flight_id) DO UPDATE
+        SET holder = EXCLUDED.holder, claimed_at = CURRENT_TIMESTAMP
+        WHERE departure_notifications.status = 'pending'
+          AND departure_notifications.claimed_at < CURRENT_TIMESTAMP - make_interval(secs => %(lease)s)
+        RETURNING telegram_user_id, ticket_no, flight_id
+    )
+    SELECT due.telegram_user_id, due.ticket_no, due.flight_id, due.flight_no,
+           due.departure_airport, due.arrival_airport, due.scheduled_departure, due.seat_no
+    FROM claimed
+    JOIN due USING (telegram_user_id, ticket_no, flight_id)
+    ORDER BY due.telegram_user_id, due.scheduled_departure
+"""
+
+_stats = {"claimed": 0, "sent": 0, "failed": 0, "retry_later": 0, "messages": 0, "last_run_seconds": 0.0}
+
+
+def claim_due_reminders(now: datetime | None = None, limit: int = NOTIFY_BATCH_SIZE) -> list[dict]:
+    """Reclama los recordatorios de vuelos que salen en la ventana y aún no se enviaron"""
+    now = now or datetime.now()
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(CLAIM_SQL, {
+            "start": now + timedelta(minutes=NOTIFY_MIN_LEAD),
+            "end": now + timedelta(hours=NOTIFY_WINDOW),
+            "lease": NOTIFY_LEASE,
+            "limit": limit,
+            "holder": HOLDER,
+        })
+        columns = [c[0] for c in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        conn.commit()
+    finally:
+        conn.close()
+    _stats["claimed"] += len(rows)
+    return rows
+
+
+def mark_reminders(reminders: list[dict], status: str, error: str | None = None):
+    """Marca en bloque el resultado de los recordatorios"""
+    if not reminders:
+        return
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            UPDATE departure_notifications n
+            SET status = %s, error = %s,
+                sent_at = CASE WHEN %s = 'sent' THEN CURRENT_TIMESTAMP END
+            FROM unnest(%s::bigint[], %s::text[], %s::text[]) AS r(telegram_user_id, ticket_no, flight_id)
+            WHERE n.telegram_user_id = r.telegram_user_id
+              AND n.ticket_no = r.ticket_no
+              AND n.flight_id = r.flight_id
+              AND n.holder = %s
+            """,
+            (
+                status, error, status,
+                [r["telegram_user_id"] for r in reminders],
+                [r["ticket_no"] for r in reminders],
+                [r["flight_id"] for r in reminders],
+                HOLDER,
+            ),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def reminder_text(reminders: list[dict], now: datetime | None = None) -> str:
+    """Un mensaje con todos los vuelos próximos de un usuario"""
+    now = now or datetime.now()
+    lines = ["✈️ Recordatorio de tus próximos vuelos:\n"]
+    for r in reminders:
+        hours = max(0, (r["scheduled_departure"] - now).total_seconds() / 3600)
+        departure = r["scheduled_departure"].strftime("%d/%m/%Y %H:%M")
+        line = (
+            f"• {r['flight_no']} {r['departure_airport']} → {r['arrival_airport']}: "
+            f"sale el {departure} (en {hours:.0f} h)"
+        )
+        if r["seat_no"]:
+            line += f", asiento {r['seat_no']}"
+        lines.append(line)
+    lines.append("\nSi necesitas cambiar algo, escríbeme. ¡Buen viaje!")
+    return "\n".join(lines)
+
+
+def notify_stats() -> dict:
+    """Recordatorios reclamados, enviados, fallidos y pendientes de reintento en este proceso"""
+    return dict(_stats)
+
+
+class DepartureNotifier:
+    """Tarea asyncio que envía los recordatorios por lotes; las consultas van en hilos"""
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        # Ritmo propio por debajo del global de la cola de envío
+        self._bucket = TokenBucket(NOTIFY_RATE, NOTIFY_RATE)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._loop())
+        logger.info("🔔 Recordatorios de salida cada %.0f s (ventana de %.0f h)", NOTIFY_INTERVAL, NOTIFY_WINDOW)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                start = time.monotonic()
+                await self.run_once()
+                _stats["last_run_seconds"] = time.monotonic() - start
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error enviando recordatorios de salida")
+            await asyncio.sleep(NOTIFY_INTERVAL)
+
+    async def run_once(self) -> int:
+        """Envía lotes hasta que no queden recordatorios en la ventana; devuelve cuántos"""
+        total = 0
+        while True:
+            reminders = await asyncio.to_thread(claim_due_reminders)
+            if not reminders:
+                return total
+            await self._send_batch(reminders)
+            total += len(reminders)
+            if len(reminders) < NOTIFY_BATCH_SIZE:
+                return total
+
+    async def _send_batch(self, reminders: list[dict]):
+        by_user = defaultdict(list)
+        for r in reminders:
+            by_user[r["telegram_user_id"]].append(r)
+
+        sends = []
+        for chat_id, user_reminders in by_user.items():
+            await self._bucket.acquire()
+            sends.append(outbound.send(chat_id, reminder_text(user_reminders)))
+        results = await asyncio.gather(*sends, return_exceptions=True)
+
+        sent, failed, retry = [], [], []
+        for user_reminders, result in zip(by_user.values(), results):
+            if not isinstance(result, BaseException):
+                sent.extend(user_reminders)
+            elif isinstance(result, (Forbidden, BadRequest)):
+                # Bot bloqueado o chat inexistente: reintentar no sirve
+                failed.append((user_reminders, repr(result)))
+            else:
+                retry.extend(user_reminders)
+
+        await asyncio.to_thread(mark_reminders, sent, "sent")
+        for user_reminders, error in failed:
+            await asyncio.to_thread(mark_reminders, user_reminders, "failed", error)
+        _stats["messages"] += len(by_user)
+        _stats["sent"] += len(sent)
+        _stats["failed"] += sum(len(r) for r, _ in failed)
+        _stats["retry_later"] += len(retry)
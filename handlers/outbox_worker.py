@@ -0,0 +1,196 @@
+"""
+Workers de la cola de acciones sensibles (graph/outbox.py).
+
+Cada réplica del bot arranca OUTBOX_WORKERS tareas que reclaman y ejecutan
+acciones, y una tarea de entrega: cuando todas las acciones de un mensaje
+del asistente terminan, toma el lock del thread, añade los ToolMessages
+como si el nodo sensible se hubiera ejecutado, continúa el grafo y envía
+la respuesta al chat (por la cola de envío, handlers/sender.py).
+"""
+import asyncio
+import logging
+import os
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+from graph.durability import durability_for
+from graph.outbox import (
+    OUTBOX_POLL_INTERVAL,
+    OUTBOX_WORKERS,
+    batch_messages,
+    claim_actions,
+    drop_parked_messages,
+    execute_action,
+    mark_delivered,
+    parked_messages,
+    ready_batches,
+    worker_id,
+)
+from graph.thread_lock import ThreadLockLost, ThreadLockTimeout, thread_turn
+from graph.travel_graph import graph
+from .sender import outbound
+from .telegram_handlers import QUEUED_MESSAGE, queue_sensitive_actions, run_graph
+from .utils import clean_telegram_message
+
+logger = logging.getLogger(__name__)
+
+# Si otro turno tiene el thread, la entrega se reintenta en la siguiente vuelta
+DELIVERY_LOCK_TIMEOUT = 5
+# Entregas fallidas de un lote antes de enviar los resultados sin el asistente
+DELIVERY_MAX_ATTEMPTS = int(os.getenv("OUTBOX_DELIVERY_MAX_ATTEMPTS", "3"))
+
+
+def results_applied(messages: list, batch_id: str) -> bool:
+    """
+    ¿Ya están en el estado los ToolMessages del lote sin que el asistente
+    haya respondido? (una entrega anterior falló tras update_state)
+    """
+    index = next((i for i, m in enumerate(messages) if m.id == batch_id), None)
+    if index is None:
+        return False
+    after = messages[index + 1:]
+    if any(isinstance(m, AIMessage) for m in after):
+        return False
+    call_ids = {call["id"] for call in messages[index].tool_calls}
+    return call_ids <= {m.tool_call_id for m in after if isinstance(m, ToolMessage)}
+
+
+def deliver_batch(batch: dict):
+    """
+    Continúa el thread con los resultados del lote (llamar con su lock),
+    seguidos de los mensajes que el usuario envió mientras tanto.
+    Devuelve (respuesta del asistente, si quedó otra acción encolada); la
+    respuesta es None si el thread ya no espera este lote (otra réplica lo
+    entregó, o la conversación se reinició).
+    """
+    # Mismo passenger_id y thread_id con los que se encolaron las acciones
+    config = {"configurable": dict(batch["configurable"])}
+    snapshot = graph.get_state(config)
+    messages = snapshot.values.get("messages", [])
+    parked = parked_messages(batch["thread_id"])
+    if batch["node"] in snapshot.next and messages and messages[-1].id == batch["batch_id"]:
+        update = batch_messages(batch["batch_id"])
+    elif snapshot.next and results_applied(messages, batch["batch_id"]):
+        # Reintento: los resultados ya se añadieron, solo falta continuar el grafo
+        update = []
+    else:
+        # Conversación reiniciada u otra réplica ya lo entregó
+        drop_parked_messages(parked)
+        mark_delivered(batch["batch_id"])
+        return None, False
+
+    applied = {m.id for m in messages}
+    update += [m for m in parked if m.id not in applied]
+    if update:
+        graph.update_state(config, {"messages": update}, as_node=batch["node"])
+    drop_parked_messages(parked)
+    final_response = run_graph(None, config, durability_for(sensitive=True))
+    mark_delivered(batch["batch_id"])
+    # El asistente puede pedir otra acción sensible al ver el resultado
+    queued = queue_sensitive_actions(config, batch["chat_id"])
+    return final_response, queued
+
+
+def fallback_text(batch_id: str) -> str:
+    """Resultados del lote en crudo, para cuando el asistente no puede responder"""
+    lines = ["✅ Tu solicitud se procesó, pero no pude preparar la respuesta. Resultado:"]
+    lines += [f"- {message.content}" for message in batch_messages(batch_id)]
+    return "\n".join(lines)
+
+
+class OutboxWorkers:
+    """Tareas asyncio que vacían la cola; las ejecuciones van en hilos"""
+
+    def __init__(self, workers: int = OUTBOX_WORKERS):
+        self.workers = workers
+        self._tasks: list[asyncio.Task] = []
+        self._finished = asyncio.Event()
+        # Entregas fallidas por lote (en este proceso)
+        self._failures: dict[str, int] = {}
+
+    async def start(self):
+        # Un id por tarea: locked_by identifica a quién pertenece cada acción en curso
+        self._tasks = [asyncio.create_task(self._execute_loop(worker_id(n))) for n in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._deliver_loop()))
+        logger.info("📤 Outbox: %s workers en marcha", self.workers)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _execute_loop(self, worker: str):
+        while True:
+            try:
+                jobs = await asyncio.to_thread(claim_actions, 1, worker)
+                if not jobs:
+                    await asyncio.sleep(OUTBOX_POLL_INTERVAL)
+                    continue
+                status = await asyncio.to_thread(execute_action, jobs[0])
+                if status != "pending":
+                    self._finished.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error en un worker del outbox")
+                await asyncio.sleep(OUTBOX_POLL_INTERVAL)
+
+    async def _deliver_loop(self):
+        while True:
+            try:
+                # Despierta al terminar una acción local o cada intervalo (acciones de otras réplicas)
+                try:
+                    await asyncio.wait_for(self._finished.wait(), OUTBOX_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._finished.clear()
+                for batch in await asyncio.to_thread(ready_batches):
+                    await self._deliver(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error entregando resultados del outbox")
+                await asyncio.sleep(OUTBOX_POLL_INTERVAL)
+
+    async def _deliver(self, batch: dict):
+        try:
+            async with thread_turn(batch["thread_id"], DELIVERY_LOCK_TIMEOUT):
+                final_response, queued = await asyncio.to_thread(deliver_batch, batch)
+        except ThreadLockTimeout:
+            return
+        except ThreadLockLost:
+            # Quien se quedó el thread entregará el lote en su siguiente vuelta
+            logger.error("Entrega del thread %s interrumpida: se perdió el lock", batch["thread_id"])
+            return
+        except Exception:
+            logger.exception("No se pudo continuar el thread %s con el lote %s", batch["thread_id"], batch["batch_id"])
+            await self._delivery_failed(batch)
+            return
+        self._failures.pop(batch["batch_id"], None)
+        if batch["chat_id"] is None or final_response is None:
+            return
+        if queued:
+            text = QUEUED_MESSAGE
+        elif final_response.content:
+            text = clean_telegram_message(final_response.content)
+        else:
+            text = "✅ Acción procesada. ¿Necesitas algo más?"
+        outbound.send(batch["chat_id"], text)
+
+    async def _delivery_failed(self, batch: dict):
+        """
+        La acción terminó pero el grafo no pudo continuar: se avisa al chat y
+        el lote se reintenta; tras DELIVERY_MAX_ATTEMPTS se envían los
+        resultados en crudo y el lote se da por entregado.
+        """
+        failures = self._failures.get(batch["batch_id"], 0) + 1
+        self._failures[batch["batch_id"]] = failures
+        if failures < DELIVERY_MAX_ATTEMPTS:
+            if failures == 1 and batch["chat_id"] is not None:
+                outbound.send(batch["chat_id"], "⚠️ Tu solicitud ya se procesó, pero estoy teniendo problemas para responder. Lo reintento en un momento.")
+            return
+        del self._failures[batch["batch_id"]]
+        if batch["chat_id"] is not None:
+            outbound.send(batch["chat_id"], await asyncio.to_thread(fallback_text, batch["batch_id"]))
+        await asyncio.to_thread(mark_delivered, batch["batch_id"])
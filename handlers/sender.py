@@ -0,0 +1,264 @@
+"""
+Cola de envío de mensajes respetando los límites de Telegram.
+
+Telegram limita los envíos de un bot a ~30 mensajes/s en total, ~1/s por
+chat privado y ~20/min por grupo; por encima responde 429 (RetryAfter).
+Todas las respuestas del bot pasan por `outbound`:
+
+- Cada chat tiene su cola FIFO y una tarea que la vacía en orden.
+- Antes de cada envío se toma un token del bucket del chat y del global.
+- Un RetryAfter pausa el bucket afectado `retry_after` segundos y el
+  mensaje se reintenta; los errores de red se reintentan con backoff.
+- Los textos de más de 4096 caracteres se parten en varios mensajes.
+
+Los handlers encolan y siguen (`reply`), así una ráfaga se reparte en el
+tiempo en vez de hacer fallar los handlers. sender_stats() expone la
+profundidad de la cola y las esperas.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from datetime import timedelta
+
+from telegram import Bot
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Máximo de Telegram por mensaje (en unidades UTF-16)
+MESSAGE_LIMIT = 4096
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_GROUP_RATE = float(os.getenv("SEND_GROUP_RATE", str(20 / 60)))
+# Ráfaga permitida por chat antes de aplicar su ritmo
+SEND_CHAT_BURST = int(os.getenv("SEND_CHAT_BURST", "3"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "5"))
+# Buckets por chat que se guardan antes de descartar los inactivos
+SEND_MAX_CHAT_BUCKETS = int(os.getenv("SEND_MAX_CHAT_BUCKETS", "10000"))
+# Al apagar, tiempo para vaciar lo pendiente
+SEND_DRAIN_TIMEOUT = float(os.getenv("SEND_DRAIN_TIMEOUT", "10"))
+
+
+def _utf16_len(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> list[str]:
+    """Parte el texto en trozos de como mucho `limit`, por líneas y si no por palabras"""
+    if _utf16_len(text) <= limit:
+        return [text]
+
+    chunks, current = [], ""
+
+    def push(piece: str, sep: str):
+        nonlocal current
+        candidate = f"{current}{sep}{piece}" if current else piece
+        if _utf16_len(candidate) <= limit:
+            current = candidate
+            return
+        if current:
+            chunks.append(current)
+        current = ""
+        if _utf16_len(piece) <= limit:
+            current = piece
+        elif sep == "\n":
+            for word in piece.split(" "):
+                push(word, " ")
+        else:
+            # Palabra sin espacios más larga que el límite: corte duro
+            for char in piece:
+                if _utf16_len(current + char) > limit:
+                    chunks.append(current)
+                    current = ""
+                current += char
+
+    for line in text.split("\n"):
+        push(line, "\n")
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _seconds(retry_after: int | timedelta) -> float:
+    return retry_after.total_seconds() if isinstance(retry_after, timedelta) else float(retry_after)
+
+
+class TokenBucket:
+    """`rate` envíos por segundo con ráfagas de hasta `capacity`; se puede pausar (RetryAfter)"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()  # FIFO: los chats esperan el bucket global por orden
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> float:
+        """Espera un token; devuelve los segundos esperados"""
+        start = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return time.monotonic() - start
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def idle(self, now: float) -> bool:
+        """Lleno y sin pausa: descartarlo equivale a crear uno nuevo"""
+        return now >= self.paused_until and self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class OutboundSender:
+    """Cola de mensajes salientes con un bucket global y uno por chat"""
+
+    def __init__(self):
+        self.bot: Bot | None = None
+        self._global = TokenBucket(SEND_GLOBAL_RATE, SEND_GLOBAL_RATE)
+        self._chat_buckets: dict[int, TokenBucket] = {}
+        self._queues: dict[int, deque] = {}
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._stats = {
+            "sent": 0, "failed": 0, "split": 0, "retry_after": 0, "retry_after_seconds": 0.0,
+            "network_retries": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0, "max_depth": 0,
+        }
+
+    def start(self, bot: Bot):
+        self.bot = bot
+
+    async def stop(self):
+        """Espera a que se vacíen las colas (hasta SEND_DRAIN_TIMEOUT) y cancela el resto"""
+        tasks = list(self._tasks.values())
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=SEND_DRAIN_TIMEOUT)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def depth(self) -> int:
+        """Mensajes encolados aún sin enviar"""
+        return sum(len(q) for q in self._queues.values())
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        if chat_id not in self._chat_buckets:
+            if len(self._chat_buckets) >= SEND_MAX_CHAT_BUCKETS:
+                now = time.monotonic()
+                for idle in [c for c, b in self._chat_buckets.items() if c not in self._tasks and b.idle(now)]:
+                    del self._chat_buckets[idle]
+            # Los ids de grupos y canales son negativos
+            rate = SEND_GROUP_RATE if chat_id < 0 else SEND_CHAT_RATE
+            self._chat_buckets[chat_id] = TokenBucket(rate, SEND_CHAT_BURST)
+        return self._chat_buckets[chat_id]
+
+    def send(self, chat_id: int, text: str, **kwargs) -> asyncio.Future:
+        """
+        Encola el texto para el chat (partido si supera 4096) y devuelve un
+        futuro con los mensajes enviados; no hace falta esperarlo.
+        """
+        if self.bot is None:
+            raise RuntimeError("OutboundSender sin arrancar: llamar a outbound.start(bot)")
+        chunks = split_message(text)
+        if len(chunks) > 1:
+            self._stats["split"] += 1
+        futures = []
+        queue = self._queues.setdefault(chat_id, deque())
+        for chunk in chunks:
+            future = asyncio.get_running_loop().create_future()
+            queue.append((chunk, kwargs, future, time.monotonic()))
+            futures.append(future)
+        self._stats["max_depth"] = max(self._stats["max_depth"], self.depth())
+        if chat_id not in self._tasks:
+            self._tasks[chat_id] = asyncio.create_task(self._drain(chat_id))
+        result = asyncio.gather(*futures)
+        # Quien no espera el envío no ve el error (ya queda en el log de _drain)
+        result.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return result
+
+    async def _drain(self, chat_id: int):
+        queue = self._queues[chat_id]
+        bucket = self._chat_bucket(chat_id)
+        try:
+            while queue:
+                text, kwargs, future, queued_at = queue[0]
+                try:
+                    message = await self._send_one(chat_id, bucket, text, kwargs)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self._stats["failed"] += 1
+                    logger.warning("No se pudo enviar un mensaje al chat %s: %r", chat_id, e)
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    waited = time.monotonic() - queued_at
+                    self._stats["sent"] += 1
+                    self._stats["wait_seconds_total"] += waited
+                    self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+                    if not future.done():
+                        future.set_result(message)
+                queue.popleft()
+        finally:
+            for *_, future, _ in queue:
+                if not future.done():
+                    future.cancel()
+            del self._queues[chat_id]
+            del self._tasks[chat_id]
+
+    async def _send_one(self, chat_id: int, bucket: TokenBucket, text: str, kwargs: dict):
+        for attempt in range(SEND_MAX_RETRIES + 1):
+            await bucket.acquire()
+            await self._global.acquire()
+            try:
+                return await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+            except RetryAfter as e:
+                if attempt == SEND_MAX_RETRIES:
+                    raise
+                seconds = _seconds(e.retry_after)
+                self._stats["retry_after"] += 1
+                self._stats["retry_after_seconds"] += seconds
+                logger.info("⏳ Flood control en el chat %s: reintento en %.0f s", chat_id, seconds)
+                bucket.pause(seconds)
+            except BadRequest:
+                # Hereda de NetworkError pero reintentar no lo arregla
+                raise
+            except NetworkError:
+                # Incluye TimedOut
+                if attempt == SEND_MAX_RETRIES:
+                    raise
+                self._stats["network_retries"] += 1
+                await asyncio.sleep(min(2 ** attempt, 30))
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["depth"] = self.depth()
+        stats["active_chats"] = len(self._tasks)
+        stats["wait_seconds_avg"] = stats["wait_seconds_total"] / stats["sent"] if stats["sent"] else 0.0
+        return stats
+
+
+outbound = OutboundSender()
+
+
+def sender_stats() -> dict:
+    """Profundidad de la cola, envíos, 429 recibidos y esperas"""
+    return outbound.stats()
+
+
+def reply(update, text: str, **kwargs) -> asyncio.Future:
+    """Responde en el chat del update a través de la cola de envío"""
+    return outbound.send(update.effective_chat.id, text, **kwargs)
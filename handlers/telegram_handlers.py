@@ -1,4 +1,6 @@
 """Handlers de Telegram (start, mensajes de texto, voz)"""
+import asyncio
+import logging
 import uuid
 from io import BytesIO
 from types import SimpleNamespace
@@ -9,7 +11,13 @@ from langchain_core.messages import HumanMessage
 from elevenlabs import ElevenLabs
 
 from config.settings import ELEVEN_API_KEY
-from graph.travel_graph import graph
+from graph.travel_graph import graph, SENSITIVE_TOOL_NODES
+from graph.durability import durability_for
+from graph.thread_lock import ThreadLockLost, ThreadLockTimeout, thread_turn
+from graph.checkpoint_archive import archive_thread, rehydrate_thread
+from graph.outbox import OUTBOX_ENABLED, enqueue_actions, has_pending_actions, park_message
+from .dedup import idempotent_update
+from .sender import reply
 from .utils import (
     clean_telegram_message, 
     get_or_create_thread_id, 
@@ -18,6 +26,19 @@ from .utils import (
 )
 
 from config.database import get_db_connection
+from config.replica import mark_primary_write
+
+logger = logging.getLogger(__name__)
+
+# Mensajes de la conversación que muestra /history <n>
+HISTORY_PREVIEW_MESSAGES = 6
+
+# run_turn lo devuelve cuando la acción sensible quedó en el outbox
+QUEUED = object()
+QUEUED_MESSAGE = "⏳ Estoy procesando tu solicitud. Te aviso en cuanto esté lista."
+# run_turn lo devuelve cuando el mensaje se guardó para la entrega del outbox
+PARKED = object()
+PARKED_MESSAGE = "📝 Recibido. Te respondo en cuanto termine la acción que estoy procesando."
 
 # Cliente de ElevenLabs
 client = ElevenLabs(api_key=ELEVEN_API_KEY)
@@ -34,13 +55,89 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data["thread_id"] = thread_id
     context.user_data["passenger_id"] = passenger_id
     
-    await update.message.reply_text(
+    reply(
+        update,
         f"👋 ¡Hola! Soy tu asistente de vuelos.\n"
         f"Tu ID de conversación es: {thread_id}\n\n"
         f"¿Cómo puedo ayudarte hoy?"
     )
 
 
+def run_graph(graph_input, config: dict, durability: str):
+    """Ejecuta el grafo hasta el final (o un interrupt) y devuelve el último mensaje."""
+    final_response = None
+    for event in graph.stream(graph_input, config, stream_mode="values", durability=durability):
+        if "messages" in event:
+            final_response = event["messages"][-1]
+    return final_response
+
+
+def sensitive_interrupt(snapshot):
+    """Nodo sensible ante el que está pausado el grafo, o None."""
+    return next((node for node in snapshot.next if node in SENSITIVE_TOOL_NODES), None)
+
+
+def queue_sensitive_actions(config: dict, chat_id: int) -> bool:
+    """Si el grafo quedó pausado ante una acción sensible, la encola en el outbox."""
+    snapshot = graph.get_state(config)
+    node = sensitive_interrupt(snapshot)
+    if node is None:
+        return False
+    enqueue_actions(snapshot.values["messages"][-1], node, config, chat_id)
+    return True
+
+
+async def run_turn(update: Update, context: ContextTypes.DEFAULT_TYPE, user_input: str, config: dict):
+    """Ejecuta un turno del grafo (con la aprobación de acciones sensibles) y devuelve la respuesta."""
+    thread_id = config["configurable"]["thread_id"]
+    if OUTBOX_ENABLED and await asyncio.to_thread(has_pending_actions, thread_id):
+        # El thread sigue pausado hasta que el outbox entregue el resultado: el
+        # mensaje se guarda y la entrega lo añade tras los resultados de la acción
+        await asyncio.to_thread(park_message, thread_id, user_input)
+        reply(update, PARKED_MESSAGE)
+        return PARKED
+
+    # Stream del grafo (checkpoints según CHECKPOINT_DURABILITY) en un hilo:
+    # el event loop sigue atendiendo a otros usuarios (hasta GRAPH_CONCURRENCY)
+    final_response = await asyncio.to_thread(
+        run_graph,
+        {"messages": [HumanMessage(content=user_input)]},
+        config,
+        durability_for()
+    )
+
+    # Manejo de interrupciones (sensitive tools)
+    snapshot = await asyncio.to_thread(graph.get_state, config)
+
+    if sensitive_interrupt(snapshot):
+        reply(
+            update,
+            "⚠️ El agente quiere realizar una acción sensible (reserva/cancelación). "
+            "Aprobando automáticamente para esta demo..."
+        )
+
+        if OUTBOX_ENABLED:
+            # La acción se ejecuta fuera del turno (graph/outbox.py) y el
+            # resultado llega al chat cuando termina
+            await asyncio.to_thread(queue_sensitive_actions, config, update.effective_chat.id)
+            reply(update, QUEUED_MESSAGE)
+            return QUEUED
+
+        await context.bot.send_chat_action(
+            chat_id=update.effective_chat.id, action="typing"
+        )
+
+        # Continuar con la ejecución: la acción sensible se persiste paso a paso
+        final_response = await asyncio.to_thread(
+            run_graph, None, config, durability_for(sensitive=True)
+        ) or final_response
+        # Las tools ya avanzan el fence al confirmar; esto es solo por si alguna no lo hizo
+        await asyncio.to_thread(mark_primary_write)
+
+    return final_response
+
+
+@idempotent_update
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Maneja mensajes de texto del usuario."""
     user_input = update.message.text
@@ -65,50 +162,34 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat_id=update.effective_chat.id, action="typing"
     )
 
-    # Stream del grafo
-    events = graph.stream(
-        {"messages": [HumanMessage(content=user_input)]},
-        config,
-        stream_mode="values"
-    )
-
-    final_response = None
-    for event in events:
-        if "messages" in event:
-            final_response = event["messages"][-1]
-
-    # Manejo de interrupciones (sensitive tools)
-    snapshot = graph.get_state(config)
-    interrupt_nodes = [
-        "flight_sensitive_tools",
-        "hotel_sensitive_tools",
-        "car_rental_sensitive_tools",
-        "excursion_sensitive_tools",
-    ]
-
-    if snapshot.next and any(node in snapshot.next for node in interrupt_nodes):
-        await update.message.reply_text(
-            "⚠️ El agente quiere realizar una acción sensible (reserva/cancelación). "
-            "Aprobando automáticamente para esta demo..."
-        )
-        await context.bot.send_chat_action(
-            chat_id=update.effective_chat.id, action="typing"
+    # Una sola réplica del bot avanza este thread a la vez
+    try:
+        async with thread_turn(thread_id):
+            final_response = await run_turn(update, context, user_input, config)
+    except ThreadLockTimeout:
+        reply(
+            update,
+            "⏳ Todavía estoy procesando tu mensaje anterior. Inténtalo de nuevo en un momento."
         )
+        return
+    except ThreadLockLost:
+        # Otra réplica se quedó el thread a mitad del turno: no se escribió nada más
+        logger.error("Turno del thread %s interrumpido: se perdió el lock", thread_id)
+        reply(update, "⚠️ No pude terminar de procesar tu mensaje. ¿Puedes enviarlo de nuevo?")
+        return
 
-        # Continuar con la ejecución
-        events = graph.stream(None, config, stream_mode="values")
-        for event in events:
-            if "messages" in event:
-                final_response = event["messages"][-1]
+    if final_response is QUEUED or final_response is PARKED:
+        return
 
     # Responder al usuario
     if final_response and final_response.content:
         cleaned_response = clean_telegram_message(final_response.content)
-        await update.message.reply_text(cleaned_response)
+        reply(update, cleaned_response)
     else:
-        await update.message.reply_text("✅ Acción procesada. ¿Necesitas algo más?")
+        reply(update, "✅ Acción procesada. ¿Necesitas algo más?")
 
 
+@idempotent_update
 async def procesar_audio(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Procesa mensajes de voz con ElevenLabs."""
     try:
@@ -129,7 +210,6 @@ async def procesar_audio(update: Update, context: ContextTypes.DEFAULT_TYPE):
             text=text,
             chat=update.message.chat,
             from_user=update.message.from_user,
-            reply_text=update.message.reply_text,
         )
 
         fake_update = SimpleNamespace(
@@ -142,12 +222,14 @@ async def procesar_audio(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await handle_message(fake_update, context)
 
     except Exception as e:
-        await update.message.reply_text(
+        reply(
+            update,
             f"⚠️ Disculpa, estoy teniendo problemas para procesar el audio. "
             f"¿Podrías intentarlo de nuevo más tarde o enviarme un mensaje de texto?"
         )
 
 
+@idempotent_update
 async def reset(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Reinicia la conversación del usuario (archiva la anterior)."""
     telegram_user_id = update.effective_user.id
@@ -161,14 +243,25 @@ async def reset(update: Update, context: ContextTypes.DEFAULT_TYPE):
         (telegram_user_id,)
     )
     result = cursor.fetchone()
+    # Sin transacción ni conexión del pool abiertas mientras se espera el lock
+    conn.close()
     
     if result and result[0]:
         old_thread_id = result[0]
         
         # 2. Archivar conversación anterior
         archive_conversation(telegram_user_id, old_thread_id)
+
+        # Sus checkpoints pasan al almacén en frío (cuando termine el turno en curso,
+        # si otra réplica aún lo está procesando); si falla, los recoge scripts.archive_threads
+        try:
+            async with thread_turn(old_thread_id):
+                await asyncio.to_thread(archive_thread, old_thread_id)
+        except Exception:
+            logger.exception("No se pudo archivar en frío el thread %s", old_thread_id)
         
-        await update.message.reply_text(
+        reply(
+            update,
             f"📦 Conversación anterior archivada: {old_thread_id[:8]}..."
         )
     
@@ -176,6 +269,8 @@ async def reset(update: Update, context: ContextTypes.DEFAULT_TYPE):
     new_thread_id = str(uuid.uuid4())
     
     # 4. Crear nueva conversación
+    conn = get_db_connection()
+    cursor = conn.cursor()
     cursor.execute(
         "INSERT INTO conversations (telegram_user_id, thread_id) VALUES (%s, %s)",
         (telegram_user_id, new_thread_id)
@@ -189,31 +284,46 @@ async def reset(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     conn.commit()
     conn.close()
+    await asyncio.to_thread(mark_primary_write)
     
     # Actualizar context
     context.user_data["thread_id"] = new_thread_id
     
-    await update.message.reply_text(
+    reply(
+        update,
         f"🔄 Nueva conversación iniciada\n"
         f"ID: {new_thread_id}"
     )
 
 
 async def history(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Muestra el historial de conversaciones del usuario."""
+    """
+    Muestra el historial de conversaciones del usuario.
+    Con `/history <número o ID>` muestra los últimos mensajes de esa
+    conversación, rehidratándola si está en el almacén en frío.
+    """
     telegram_user_id = update.effective_user.id
     
     conversations = get_user_conversations(telegram_user_id, limit=10)
     
     if not conversations:
-        await update.message.reply_text("No tienes conversaciones previas.")
+        reply(update, "No tienes conversaciones previas.")
+        return
+
+    if context.args:
+        await show_conversation(update, conversations, context.args[0])
         return
     
     # Formatear respuesta
     message = "📜 **Historial de Conversaciones**\n\n"
     
     for i, conv in enumerate(conversations, 1):
-        status = "🟢 Activa" if conv["is_active"] else "⚪ Archivada"
+        if conv["is_active"]:
+            status = "🟢 Activa"
+        elif conv["is_cold"]:
+            status = "🧊 Archivada (en frío)"
+        else:
+            status = "⚪ Archivada"
         thread_short = conv["thread_id"][:8]
         started = conv["started_at"].strftime("%d/%m/%Y %H:%M")
         
@@ -226,8 +336,42 @@ async def history(update: Update, context: ContextTypes.DEFAULT_TYPE):
             message += f"   Fin: {ended}\n"
         
         message += "\n"
+
+    message += "Usa /history <número> para ver una conversación."
     
-    await update.message.reply_text(clean_telegram_message(message))
+    reply(update, clean_telegram_message(message))
+
+
+async def show_conversation(update: Update, conversations: list[dict], selector: str):
+    """Muestra los últimos mensajes de la conversación elegida en /history."""
+    if selector.isdigit() and 1 <= int(selector) <= len(conversations):
+        conv = conversations[int(selector) - 1]
+    else:
+        matches = [c for c in conversations if c["thread_id"].startswith(selector)]
+        if len(matches) != 1:
+            reply(update, "No encontré esa conversación en tu historial.")
+            return
+        conv = matches[0]
+
+    thread_id = conv["thread_id"]
+    if conv["is_cold"]:
+        reply(update, f"🧊 Recuperando la conversación {thread_id[:8]}...")
+        await asyncio.to_thread(rehydrate_thread, thread_id)
+
+    snapshot = await asyncio.to_thread(graph.get_state, {"configurable": {"thread_id": thread_id}})
+    messages = [
+        m for m in snapshot.values.get("messages", [])
+        if m.type in ("human", "ai") and isinstance(m.content, str) and m.content
+    ]
+    if not messages:
+        reply(update, "Esa conversación no tiene mensajes guardados.")
+        return
+
+    message = f"💬 Conversación {thread_id[:8]}...\n\n"
+    for m in messages[-HISTORY_PREVIEW_MESSAGES:]:
+        author = "👤" if m.type == "human" else "🤖"
+        message += f"{author} {m.content}\n\n"
+    reply(update, clean_telegram_message(message))
 
 """""""""
 
@@ -1,7 +1,8 @@
 """Funciones auxiliares para Telegram"""
 import re
 import uuid
-from config.database import get_db_connection
+from config.database import get_db_connection, get_read_connection
+from config.replica import mark_primary_write
 
 def clean_telegram_message(text: str) -> str:
     """
@@ -83,6 +84,8 @@ def get_or_create_thread_id(telegram_user_id: int) -> tuple[str, str]:
     
     conn.commit()
     conn.close()
+    # /history lee de la réplica: que vea ya la conversación nueva
+    mark_primary_write()
     return thread_id, passenger_id
 
 
@@ -115,19 +118,21 @@ def get_user_conversations(telegram_user_id: int, limit: int = 10) -> list[dict]
                 "thread_id": "abc-123",
                 "started_at": "2025-10-29 10:00:00",
                 "ended_at": "2025-10-29 12:00:00",
-                "is_active": False
+                "is_active": False,
+                "is_cold": True   # checkpoints en checkpoint_archive
             },
             ...
         ]
     """
-    conn = get_db_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     
     cursor.execute(
-        """SELECT thread_id, started_at, ended_at, is_active 
-           FROM conversations 
-           WHERE telegram_user_id = %s 
-           ORDER BY started_at DESC 
+        """SELECT c.thread_id, c.started_at, c.ended_at, c.is_active, a.thread_id IS NOT NULL
+           FROM conversations c
+           LEFT JOIN checkpoint_archive a ON a.thread_id = c.thread_id
+           WHERE c.telegram_user_id = %s 
+           ORDER BY c.started_at DESC 
            LIMIT %s""",
         (telegram_user_id, limit)
     )
@@ -141,7 +146,8 @@ def get_user_conversations(telegram_user_id: int, limit: int = 10) -> list[dict]
             "thread_id": row[0],
             "started_at": row[1],
             "ended_at": row[2],
-            "is_active": row[3]
+            "is_active": row[3],
+            "is_cold": row[4]
         })
     
     return conversations
\ No newline at end of file
@@ -8,6 +8,12 @@ from telegram.ext import (
 )
 
 from config.settings import TELEGRAM_TOKEN
+from config.database import DB_REPLICA_HOST, GRAPH_CONCURRENCY
+from tools.cache import search_cache
+from graph.outbox import OUTBOX_ENABLED
+from handlers.outbox_worker import OutboxWorkers
+from handlers.sender import outbound
+from handlers.notifications import NOTIFY_ENABLED, DepartureNotifier
 from handlers.telegram_handlers import (
     start, 
     handle_message, 
@@ -23,11 +29,50 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+async def post_init(app):
+    """
+    Arranca la cola de envío y, si están activos, el outbox de acciones
+    sensibles (graph/outbox.py) y los recordatorios de salida.
+    """
+    outbound.start(app.bot)
+    if OUTBOX_ENABLED:
+        app.bot_data["outbox"] = OutboxWorkers()
+        await app.bot_data["outbox"].start()
+    if NOTIFY_ENABLED:
+        app.bot_data["notifier"] = DepartureNotifier()
+        await app.bot_data["notifier"].start()
+
+
+async def post_stop(app):
+    """
+    Detiene el outbox (las acciones en curso vuelven a la cola tras OUTBOX_LEASE)
+    y los recordatorios, y vacía la cola de envío mientras el bot aún puede enviar.
+    """
+    if OUTBOX_ENABLED:
+        await app.bot_data["outbox"].stop()
+    if NOTIFY_ENABLED:
+        await app.bot_data["notifier"].stop()
+    await outbound.stop()
+
+
 def main():
     """Inicia el bot de Telegram."""
     logger.info("🚀 Iniciando bot de Telegram...")
+
+    # Con réplica, el listener también recibe los fences de lectura de las demás réplicas del bot
+    if DB_REPLICA_HOST:
+        search_cache.ensure_listener()
     
-    app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+    # Hasta GRAPH_CONCURRENCY mensajes a la vez (los pools se dimensionan con este valor)
+    # Las respuestas salen por handlers/sender.py (límites de envío de Telegram)
+    app = (
+        ApplicationBuilder()
+        .token(TELEGRAM_TOKEN)
+        .concurrent_updates(GRAPH_CONCURRENCY)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .build()
+    )
     
     # Registrar handlers
     app.add_handler(CommandHandler("start", start))
@@ -0,0 +1,41 @@
+"""
+Mueve al almacén en frío (checkpoint_archive) los checkpoints de las
+conversaciones archivadas que siguen en las tablas calientes.
+
+/reset ya archiva el thread anterior al momento; este script recoge lo que
+quedó pendiente (conversaciones anteriores a esta funcionalidad o archivados
+que fallaron) y se puede programar en cron.
+
+Uso:
+    python -m scripts.archive_threads
+    python -m scripts.archive_threads --grace-hours 24 --limit 500
+"""
+import argparse
+import time
+from datetime import timedelta
+
+from graph.checkpoint_archive import archive_inactive_threads
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archiva en frío los checkpoints de conversaciones inactivas")
+    parser.add_argument("--grace-hours", type=float, default=0, help="Antigüedad mínima de la conversación archivada")
+    parser.add_argument("--limit", type=int, default=1000, help="Máximo de threads por ejecución")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    archived = archive_inactive_threads(timedelta(hours=args.grace_hours), args.limit)
+    elapsed = time.perf_counter() - start
+
+    if not archived:
+        print("✅ No hay threads pendientes de archivar")
+        return
+    rows = sum(stats["rows"] for _, stats in archived)
+    raw = sum(stats["raw_bytes"] for _, stats in archived)
+    compressed = sum(stats["compressed_bytes"] for _, stats in archived)
+    print(f"🧊 {len(archived)} threads archivados ({rows:,} filas) en {elapsed:.1f} s")
+    print(f"   {raw / 1024:,.1f} KiB → {compressed / 1024:,.1f} KiB (x{raw / max(compressed, 1):.1f})")
+
+
+if __name__ == "__main__":
+    main()
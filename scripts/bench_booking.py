@@ -0,0 +1,147 @@
+"""
+Benchmark de reservas concurrentes sobre inventario "caliente".
+
+Lanza cientos de reservas simultáneas contra un mismo hotel (mismas noches)
+y una misma excursión con poca capacidad, y comprueba que no hay
+sobre-reservas: reservas confirmadas == capacidad == unidades del inventario.
+
+Uso:
+    python -m scripts.bench_booking --bookers 500 --workers 64 --capacity 50
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from config.database import get_db_connection
+from tools import book_excursion, book_hotel
+
+BENCH_NAME = "Bench Hot Inventory"
+
+
+def create_fixtures(capacity: int) -> tuple[int, int]:
+    """Crea un hotel y una excursión de prueba con la capacidad indicada"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO hotels (name, location, price_tier, capacity) VALUES (%s, 'Bench', 'Standard', %s) RETURNING id",
+        (BENCH_NAME, capacity),
+    )
+    hotel_id = cursor.fetchone()[0]
+    cursor.execute(
+        "INSERT INTO trip_recommendations (name, location, capacity) VALUES (%s, 'Bench', %s) RETURNING id",
+        (BENCH_NAME, capacity),
+    )
+    excursion_id = cursor.fetchone()[0]
+    conn.commit()
+    conn.close()
+    return hotel_id, excursion_id
+
+
+def drop_fixtures(hotel_id: int, excursion_id: int):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM hotel_inventory WHERE hotel_id = %s", (hotel_id,))
+    cursor.execute("DELETE FROM hotel_reservations WHERE hotel_id = %s", (hotel_id,))
+    cursor.execute("DELETE FROM hotels WHERE id = %s", (hotel_id,))
+    cursor.execute("DELETE FROM excursion_reservations WHERE recommendation_id = %s", (excursion_id,))
+    cursor.execute("DELETE FROM trip_recommendations WHERE id = %s", (excursion_id,))
+    conn.commit()
+    conn.close()
+
+
+def run_bookers(label: str, book, bookers: int, workers: int) -> int:
+    """Ejecuta `bookers` reservas con `workers` hilos y muestra throughput y latencias"""
+    latencies = []
+
+    def attempt(n: int) -> bool:
+        config = {"configurable": {"passenger_id": f"BENCH{n:05d}"}}
+        start = time.perf_counter()
+        result = book(config)
+        latencies.append(time.perf_counter() - start)
+        return "con éxito" in result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(attempt, range(bookers)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(
+        f"{label}: {bookers} intentos en {elapsed:.2f}s ({bookers / elapsed:.0f} reservas/s) | "
+        f"p50 {statistics.median(latencies) * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms | "
+        f"confirmadas {sum(outcomes)}"
+    )
+    return sum(outcomes)
+
+
+def verify(hotel_id: int, excursion_id: int, nights: int, capacity: int,
+           hotel_ok: int, excursion_ok: int) -> bool:
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT count(*) FROM hotel_reservations WHERE hotel_id = %s AND status = 'active'", (hotel_id,)
+    )
+    hotel_reservations = cursor.fetchone()[0]
+    cursor.execute(
+        "SELECT count(*), min(reserved), max(reserved) FROM hotel_inventory WHERE hotel_id = %s", (hotel_id,)
+    )
+    inventory_days, min_reserved, max_reserved = cursor.fetchone()
+    cursor.execute(
+        "SELECT count(*) FROM excursion_reservations WHERE recommendation_id = %s AND status = 'active'",
+        (excursion_id,),
+    )
+    excursion_reservations = cursor.fetchone()[0]
+    cursor.execute("SELECT reserved FROM trip_recommendations WHERE id = %s", (excursion_id,))
+    excursion_reserved = cursor.fetchone()[0]
+    conn.close()
+
+    checks = {
+        "hotel: confirmadas == capacidad": hotel_ok == capacity,
+        "hotel: filas de reserva == confirmadas": hotel_reservations == hotel_ok,
+        "hotel: inventario == confirmadas cada noche": (
+            inventory_days == nights and min_reserved == max_reserved == hotel_ok
+        ),
+        "excursión: confirmadas == capacidad": excursion_ok == capacity,
+        "excursión: filas de reserva == contador": excursion_reservations == excursion_reserved == excursion_ok,
+    }
+    for name, passed in checks.items():
+        print(f"   {'✅' if passed else '❌'} {name}")
+    return all(checks.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de reservas concurrentes")
+    parser.add_argument("--bookers", type=int, default=500, help="Intentos de reserva simultáneos")
+    parser.add_argument("--workers", type=int, default=64, help="Hilos (conexiones) concurrentes")
+    parser.add_argument("--capacity", type=int, default=50, help="Capacidad del inventario caliente")
+    parser.add_argument("--nights", type=int, default=3)
+    args = parser.parse_args()
+
+    checkin = date.today() + timedelta(days=30)
+    checkout = checkin + timedelta(days=args.nights)
+    hotel_id, excursion_id = create_fixtures(args.capacity)
+    try:
+        hotel_ok = run_bookers(
+            "🏨 book_hotel",
+            lambda config: book_hotel.invoke(
+                {"hotel_id": hotel_id, "checkin_date": checkin, "checkout_date": checkout}, config
+            ),
+            args.bookers, args.workers,
+        )
+        excursion_ok = run_bookers(
+            "🌍 book_excursion",
+            lambda config: book_excursion.invoke({"recommendation_id": excursion_id}, config),
+            args.bookers, args.workers,
+        )
+        ok = verify(hotel_id, excursion_id, args.nights, min(args.capacity, args.bookers),
+                    hotel_ok, excursion_ok)
+    finally:
+        drop_fixtures(hotel_id, excursion_id)
+    print("✅ Sin sobre-reservas" if ok else "❌ Resultados inconsistentes")
+
+
+if __name__ == "__main__":
+    main()
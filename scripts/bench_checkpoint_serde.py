@@ -0,0 +1,137 @@
+"""
+Benchmark del serializador de checkpoints (graph/checkpoint_serde.py).
+
+Reproduce conversaciones sintéticas (scripts/train_checkpoint_dictionary.py,
+con otra semilla que la del entrenamiento) sobre un grafo con el State real y
+un PostgresSaver por serializador: el por defecto de LangGraph, zstd sin
+diccionario y zstd con los diccionarios de checkpoint_dictionaries. Mide los
+bytes que acaban en checkpoints, checkpoint_blobs y checkpoint_writes y la
+latencia de serializar (durante el turno) y deserializar (get_state) por turno.
+
+Uso:
+    python -m scripts.bench_checkpoint_serde
+    python -m scripts.bench_checkpoint_serde --conversations 20 --turns 10
+"""
+import argparse
+import random
+import time
+import uuid
+
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.postgres import PostgresSaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.graph import END, START, StateGraph
+from psycopg import Connection
+
+from config.database import get_connection_string, get_db_connection
+from graph.checkpoint_serde import CompactSerializer
+from graph.state import State
+from scripts.train_checkpoint_dictionary import synthetic_turns, synthetic_user_info
+
+
+class Timer:
+    """Acumula el tiempo de las llamadas a una función"""
+
+    def __init__(self, func):
+        self.func = func
+        self.total = 0.0
+
+    def __call__(self, *args):
+        start = time.perf_counter()
+        try:
+            return self.func(*args)
+        finally:
+            self.total += time.perf_counter() - start
+
+
+def build_graph(checkpointer, pending: list):
+    """Un mensaje de la respuesta por superstep, como el asistente con sus tools"""
+    def assistant(state: State):
+        return {"messages": [pending.pop(0)]}
+
+    builder = StateGraph(State)
+    builder.add_node("assistant", assistant)
+    builder.add_edge(START, "assistant")
+    builder.add_conditional_edges("assistant", lambda state: "assistant" if pending else END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def written_bytes(thread_ids: list[str]) -> int:
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT (SELECT coalesce(sum(octet_length(checkpoint::text) + octet_length(metadata::text)), 0)
+                FROM checkpoints WHERE thread_id = ANY(%(t)s))
+             + (SELECT coalesce(sum(octet_length(blob)), 0) FROM checkpoint_blobs WHERE thread_id = ANY(%(t)s))
+             + (SELECT coalesce(sum(octet_length(blob)), 0) FROM checkpoint_writes WHERE thread_id = ANY(%(t)s))
+        """,
+        {"t": thread_ids},
+    )
+    total = cursor.fetchone()[0]
+    for table in ("checkpoint_writes", "checkpoint_blobs", "checkpoints"):
+        cursor.execute(f"DELETE FROM {table} WHERE thread_id = ANY(%s)", (thread_ids,))
+    conn.commit()
+    conn.close()
+    return total
+
+
+def run(serde, conversations: int, turns: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    dumps, loads = Timer(serde.dumps_typed), Timer(serde.loads_typed)
+    serde.dumps_typed, serde.loads_typed = dumps, loads
+
+    pending = []
+    with Connection.connect(get_connection_string(), autocommit=True) as conn:
+        graph = build_graph(PostgresSaver(conn, serde=serde), pending)
+        thread_ids, total_turns = [], 0
+        for _ in range(conversations):
+            thread_id = f"bench-serde-{uuid.uuid4()}"
+            thread_ids.append(thread_id)
+            config = {"configurable": {"thread_id": thread_id}}
+            user_info = synthetic_user_info(rng)
+            for messages in synthetic_turns(rng, turns):
+                human, *answer = messages
+                pending[:] = answer or [AIMessage(content="")]
+                graph.invoke({"messages": [human], "user_info": user_info}, config)
+                graph.get_state(config)
+                total_turns += 1
+
+    return {
+        "bytes": written_bytes(thread_ids) / total_turns,
+        "dumps_ms": dumps.total * 1000 / total_turns,
+        "loads_ms": loads.total * 1000 / total_turns,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes y latencia por turno de cada serializador de checkpoints")
+    parser.add_argument("--conversations", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=8, help="Turnos por conversación")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    trained = CompactSerializer.from_database()
+    serializers = [
+        ("default (msgpack)", JsonPlusSerializer()),
+        ("msgpack+zstd", CompactSerializer()),
+        ("msgpack+zstd+dict", trained),
+    ]
+    if not trained.dictionaries:
+        print("⚠️  No hay diccionario: ejecuta python -m scripts.train_checkpoint_dictionary")
+        serializers.pop()
+
+    print(f"💾 {args.conversations} conversaciones x {args.turns} turnos (por turno)\n")
+    print(f"{'serializador':<22}{'bytes':>10}{'vs default':>12}{'serializar':>13}{'deserializar':>15}")
+    baseline = None
+    for name, serde in serializers:
+        result = run(serde, args.conversations, args.turns, args.seed)
+        baseline = baseline or result["bytes"]
+        print(
+            f"{name:<22}{result['bytes']:>10,.0f}{result['bytes'] / baseline:>11.0%}"
+            f"{result['dumps_ms']:>10.2f} ms{result['loads_ms']:>12.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
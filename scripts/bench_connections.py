@@ -0,0 +1,57 @@
+"""
+Benchmark de la búsqueda de vuelos con escalas (tools/route_index.py).
+
+Mide la carga del índice de rutas y la latencia de búsquedas 0-2 escalas
+entre pares de aeropuertos aleatorios del dataset cargado.
+
+Uso:
+    python -m scripts.setup_business_db --scale 4
+    python -m scripts.bench_connections --queries 500
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from tools.route_index import route_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de búsqueda de conexiones")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--max-stops", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    route_index.reload()
+    print(
+        f"🗺️ Índice de rutas: {len(route_index._flights):,} vuelos, "
+        f"{len(route_index._by_route):,} rutas en {time.perf_counter() - start:.2f}s"
+    )
+
+    rng = random.Random(args.seed)
+    airports = sorted(route_index._by_origin)
+    latencies, found = [], []
+    for _ in range(args.queries):
+        origin, destination = rng.sample(airports, 2)
+        day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=rng.randrange(1, 60))
+        start = time.perf_counter()
+        itineraries = route_index.connections(origin, destination, day, day + timedelta(days=1),
+                                              max_stops=args.max_stops)
+        latencies.append(time.perf_counter() - start)
+        found.append(len(itineraries))
+
+    latencies.sort()
+    print(
+        f"🔎 {args.queries} búsquedas (≤{args.max_stops} escalas, ventana de 1 día): "
+        f"p50 {statistics.median(latencies) * 1000:.2f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms | "
+        f"itinerarios por búsqueda: mediana {statistics.median(found):.0f}, "
+        f"sin resultados {sum(1 for n in found if not n)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark de la latencia por turno con cada modo de durabilidad
+(graph/durability.py).
+
+Simula turnos con varias llamadas a tools (asistente → tools → asistente …)
+sobre un grafo con el State real y el mismo checkpointer y serializador que
+el bot. El LLM y las tools se sustituyen por esperas fijas y, para emular una
+base de datos remota, --db-latency-ms añade esa espera a cada escritura del
+checkpointer (put y put_writes).
+
+Uso:
+    python -m scripts.bench_durability
+    python -m scripts.bench_durability --turns 30 --tool-calls 3 --db-latency-ms 5
+"""
+import argparse
+import random
+import statistics
+import time
+import uuid
+
+from langgraph.checkpoint.postgres import PostgresSaver
+from langgraph.graph import END, START, StateGraph
+from psycopg import Connection
+
+from config.database import get_connection_string, get_db_connection
+from graph.checkpoint_serde import load_checkpoint_serializer
+from graph.durability import DURABILITY_MODES
+from graph.state import State
+from scripts.train_checkpoint_dictionary import synthetic_turns, synthetic_user_info
+
+
+class SlowSaver(PostgresSaver):
+    """PostgresSaver con una latencia de red simulada en cada escritura"""
+
+    latency = 0.0
+
+    def put(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return super().put(*args, **kwargs)
+
+    def put_writes(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return super().put_writes(*args, **kwargs)
+
+
+def build_graph(checkpointer, pending: list, llm_seconds: float, tool_seconds: float):
+    """El asistente y las tools emiten por turnos los mensajes pendientes"""
+    def assistant(state: State):
+        time.sleep(llm_seconds)
+        return {"messages": [pending.pop(0)]}
+
+    def tools(state: State):
+        time.sleep(tool_seconds)
+        return {"messages": [pending.pop(0)]}
+
+    def route(state: State):
+        if not pending:
+            return END
+        return "tools" if state["messages"][-1].type == "ai" and state["messages"][-1].tool_calls else "assistant"
+
+    builder = StateGraph(State)
+    builder.add_node("assistant", assistant)
+    builder.add_node("tools", tools)
+    builder.add_edge(START, "assistant")
+    builder.add_conditional_edges("assistant", route)
+    builder.add_conditional_edges("tools", route)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def tool_heavy_turns(rng: random.Random, count: int, tool_calls: int) -> list[list]:
+    """Turnos sintéticos con exactamente `tool_calls` pares (llamada del LLM, resultado de la tool)"""
+    turns = []
+    human, final, pairs = None, None, []
+    while len(turns) < count:
+        for messages in synthetic_turns(rng, 8):
+            human, final = human or messages[0], final or messages[-1]
+            pairs += [messages[i:i + 2] for i in range(1, len(messages) - 1, 2)]
+            if len(pairs) >= tool_calls and len(turns) < count:
+                turns.append([human, *(m for pair in pairs[:tool_calls] for m in pair), final])
+                human, final, pairs = None, None, pairs[tool_calls:]
+    return turns
+
+
+def cleanup(prefix: str):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    for table in ("checkpoint_writes", "checkpoint_blobs", "checkpoints"):
+        cursor.execute(f"DELETE FROM {table} WHERE thread_id LIKE %s", (prefix + "%",))
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia por turno con cada modo de durabilidad")
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--tool-calls", type=int, default=2, help="Llamadas a tools por turno")
+    parser.add_argument("--llm-ms", type=float, default=0, help="Latencia simulada de cada llamada al LLM")
+    parser.add_argument("--tool-ms", type=float, default=0, help="Latencia simulada de cada tool")
+    parser.add_argument("--db-latency-ms", type=float, default=2, help="Latencia simulada por escritura")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    SlowSaver.latency = args.db_latency_ms / 1000
+    turns = tool_heavy_turns(random.Random(args.seed), args.turns, args.tool_calls)
+    user_info = synthetic_user_info(random.Random(args.seed))
+    prefix = f"bench-durability-{uuid.uuid4()}"
+
+    print(
+        f"⏱️  {args.turns} turnos, {args.tool_calls} tools/turno, LLM {args.llm_ms:g} ms, "
+        f"tool {args.tool_ms:g} ms, escritura {args.db_latency_ms:g} ms\n"
+    )
+    print(f"{'modo':<8}{'p50':>10}{'p95':>10}{'media':>10}{'checkpoints/turno':>20}")
+    pending = []
+    with Connection.connect(get_connection_string(), autocommit=True) as conn:
+        saver = SlowSaver(conn, serde=load_checkpoint_serializer())
+        graph = build_graph(saver, pending, args.llm_ms / 1000, args.tool_ms / 1000)
+        for mode in DURABILITY_MODES:
+            config = {"configurable": {"thread_id": f"{prefix}-{mode}"}}
+            latencies = []
+            for human, *answer in turns:
+                pending[:] = answer
+                start = time.perf_counter()
+                for _ in graph.stream({"messages": [human], "user_info": user_info}, config,
+                                      stream_mode="values", durability=mode):
+                    pass
+                latencies.append((time.perf_counter() - start) * 1000)
+                # Lo que verá el siguiente turno: el estado completo ya persistido
+                assert not graph.get_state(config).next
+            checkpoints = conn.execute(
+                "SELECT count(*) FROM checkpoints WHERE thread_id = %s", (config["configurable"]["thread_id"],)
+            ).fetchone()[0]
+            print(
+                f"{mode:<8}{statistics.median(latencies):>7.1f} ms"
+                f"{statistics.quantiles(latencies, n=20)[-1]:>7.1f} ms"
+                f"{statistics.mean(latencies):>7.1f} ms{checkpoints / len(turns):>20.1f}"
+            )
+    cleanup(prefix)
+
+
+if __name__ == "__main__":
+    main()
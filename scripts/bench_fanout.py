@@ -0,0 +1,137 @@
+"""
+Benchmark de una solicitud compuesta (graph/fanout.py): especialistas en
+secuencia frente a especialistas en paralelo.
+
+Usa el grafo real del bot (travel_graph) con las tools de búsqueda reales;
+solo el LLM de los especialistas se sustituye por uno guionizado que espera
+--llm-ms por llamada (busca con su tool y luego responde, o propone una
+reserva con --book). El asistente principal también se simula: el turno
+empieza con su mensaje de delegación ya en el estado y se detiene antes de
+que redacte la respuesta final.
+
+Uso:
+    python -m scripts.bench_fanout
+    python -m scripts.bench_fanout --skills flight hotel car_rental excursion --llm-ms 800 --runs 3
+"""
+import argparse
+import statistics
+import time
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+import graph.fanout as fanout
+from config.database import get_db_connection
+from graph.fanout import specialist_task_node
+from graph.state import SpecialistTask
+from graph.travel_graph import graph, SENSITIVE_TOOL_NODES
+
+DELEGATION_BY_SKILL = {skill: name for name, skill in fanout.DELEGATIONS.items()}
+
+SEARCHES = {
+    "flight": ("search_flights", {"arrival_airport": "CDG", "limit": 5}),
+    "hotel": ("search_hotels", {"location": "Paris", "limit": 5}),
+    "car_rental": ("search_car_rentals", {"location": "Paris", "limit": 5}),
+    "excursion": ("search_trip_recommendations", {"location": "Paris", "limit": 5}),
+}
+
+BOOKINGS = {
+    "flight": None,
+    "hotel": ("book_hotel", {"hotel_id": 1, "checkin_date": "2030-05-01", "checkout_date": "2030-05-03"}),
+    "car_rental": ("book_car_rental", {"rental_id": 1, "start_date": "2030-05-01", "end_date": "2030-05-03"}),
+    "excursion": ("book_excursion", {"recommendation_id": 1}),
+}
+
+
+def scripted_specialist(skill: str, llm_seconds: float, book: bool):
+    """LLM falso: 1ª llamada busca, 2ª responde (o propone la reserva)"""
+    def respond(prompt_input):
+        time.sleep(llm_seconds)
+        messages = prompt_input["messages"]
+        if not any(m.type == "tool" for m in messages):
+            name, args = SEARCHES[skill]
+            return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:8]}"}])
+        if book and BOOKINGS[skill]:
+            name, args = BOOKINGS[skill]
+            return AIMessage(content=f"Propongo reservar ({skill}).",
+                             tool_calls=[{"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:8]}"}])
+        return AIMessage(content=f"Opciones de {skill}: {len(messages[-1].content)} caracteres de resultados.")
+
+    return RunnableLambda(respond)
+
+
+def delegation_message(skills: list[str]) -> AIMessage:
+    return AIMessage(
+        content="",
+        id=str(uuid.uuid4()),
+        tool_calls=[
+            {"name": DELEGATION_BY_SKILL[s], "args": {"request": f"Necesito {s} en París"}, "id": f"call_{s}"}
+            for s in skills
+        ],
+    )
+
+
+def run_sequential(skills: list[str], config: dict) -> float:
+    """Cota de la cadena actual: un especialista detrás de otro"""
+    start = time.perf_counter()
+    for s in skills:
+        specialist_task_node(SpecialistTask(skill=s, request=f"Necesito {s} en París", tool_call_id=f"call_{s}"), config)
+    return time.perf_counter() - start
+
+
+def run_parallel(skills: list[str], config: dict) -> tuple[float, tuple]:
+    """Fan-out real del grafo: Send → specialist_task x N → merge_specialists"""
+    graph.update_state(
+        config,
+        {"messages": [HumanMessage(content="Vuelo, hotel, coche y excursión en París"), delegation_message(skills)]},
+        as_node="primary_assistant",
+    )
+    start = time.perf_counter()
+    # interrupt_before en tiempo de ejecución sustituye al del grafo compilado: se repiten los nodos sensibles
+    for _ in graph.stream(None, config, interrupt_before=["primary_assistant", *SENSITIVE_TOOL_NODES]):
+        pass
+    elapsed = time.perf_counter() - start
+    return elapsed, graph.get_state(config).next
+
+
+def cleanup(thread_ids: list[str]):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    for table in ("checkpoint_writes", "checkpoint_blobs", "checkpoints"):
+        cursor.execute(f"DELETE FROM {table} WHERE thread_id = ANY(%s)", (thread_ids,))
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de especialistas en paralelo")
+    parser.add_argument("--skills", nargs="+", default=["flight", "hotel", "car_rental"], choices=list(SEARCHES))
+    parser.add_argument("--llm-ms", type=float, default=800, help="Latencia simulada por llamada al LLM")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--book", action="store_true", help="Los especialistas proponen una reserva")
+    parser.add_argument("--passenger-id", default="P00564934")
+    args = parser.parse_args()
+
+    for skill in args.skills:
+        _, safe_tools = fanout.SPECIALISTS[skill]
+        fanout.SPECIALISTS[skill] = (scripted_specialist(skill, args.llm_ms / 1000, args.book), safe_tools)
+
+    thread_ids, sequential, parallel = [], [], []
+    for _ in range(args.runs):
+        thread_id = f"bench-fanout-{uuid.uuid4()}"
+        thread_ids.append(thread_id)
+        config = {"configurable": {"thread_id": thread_id, "passenger_id": args.passenger_id}}
+        sequential.append(run_sequential(args.skills, config))
+        elapsed, next_nodes = run_parallel(args.skills, config)
+        parallel.append(elapsed)
+    cleanup(thread_ids)
+
+    print(f"📊 {len(args.skills)} especialistas, 2 llamadas al LLM de {args.llm_ms:g} ms cada uno")
+    print(f"   En secuencia: {statistics.median(sequential) * 1000:8.0f} ms (mediana de {args.runs})")
+    print(f"   En paralelo:  {statistics.median(parallel) * 1000:8.0f} ms")
+    print(f"   Siguiente nodo tras unir: {next_nodes}")
+
+
+if __name__ == "__main__":
+    main()
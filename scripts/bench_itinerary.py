@@ -0,0 +1,70 @@
+"""
+Benchmark de fetch_user_flight_information: join de 4 tablas vs read model.
+
+Mide la consulta original (tickets ⋈ ticket_flights ⋈ flights ⋈
+boarding_passes) y la lectura de passenger_itineraries para una muestra de
+pasajeros del dataset cargado, y comprueba que ambas devuelven lo mismo.
+Para probar con millones de billetes, cargar antes el dataset masivo:
+
+Uso:
+    python -m scripts.setup_business_db --scale 2
+    python -m scripts.bench_itinerary --passengers 2000
+"""
+import argparse
+import statistics
+import time
+
+from config.database import get_db_connection
+from scripts.setup_business_db import ITINERARY_SELECT
+
+JOIN_QUERY = ITINERARY_SELECT + " AND t.passenger_id = %s ORDER BY t.ticket_no, f.flight_id"
+READ_MODEL_QUERY = """
+    SELECT passenger_id, ticket_no, book_ref, flight_id, flight_no, departure_airport,
+           arrival_airport, scheduled_departure, scheduled_arrival, seat_no, fare_conditions
+    FROM passenger_itineraries WHERE passenger_id = %s ORDER BY ticket_no, flight_id
+"""
+
+
+def measure(cursor, label: str, query: str, passengers: list[str]) -> list[list[tuple]]:
+    latencies, results = [], []
+    for passenger_id in passengers:
+        start = time.perf_counter()
+        cursor.execute(query, (passenger_id,))
+        results.append(cursor.fetchall())
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(
+        f"{label}: p50 {statistics.median(latencies) * 1000:.2f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms"
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del read model de itinerarios")
+    parser.add_argument("--passengers", type=int, default=1000, help="Pasajeros de la muestra")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute("SELECT count(*) FROM tickets")
+    tickets = cursor.fetchone()[0]
+    cursor.execute(
+        "SELECT passenger_id FROM tickets TABLESAMPLE SYSTEM (1) WHERE passenger_id IS NOT NULL LIMIT %s",
+        (args.passengers,),
+    )
+    passengers = [row[0] for row in cursor.fetchall()]
+    print(f"🎫 {tickets:,} billetes, muestra de {len(passengers)} pasajeros")
+
+    cursor.execute("EXPLAIN " + READ_MODEL_QUERY, (passengers[0],))
+    print("📋 Plan del read model:\n   " + "\n   ".join(row[0] for row in cursor.fetchall()))
+
+    joined = measure(cursor, "🐢 join de 4 tablas", JOIN_QUERY, passengers)
+    read_model = measure(cursor, "⚡ passenger_itineraries", READ_MODEL_QUERY, passengers)
+    conn.close()
+    print("✅ Resultados idénticos" if joined == read_model else "❌ Los resultados difieren")
+
+
+if __name__ == "__main__":
+    main()
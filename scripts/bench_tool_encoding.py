@@ -0,0 +1,155 @@
+"""
+Benchmark del tamaño de los resultados de las tools de búsqueda.
+
+Compara, para las mismas búsquedas, el formato anterior (SELECT * y lista de
+dicts serializada por el ToolNode: json.dumps o str() si hay fechas) con la
+tabla compacta de tools/encoding.py. Cuenta tokens con tiktoken si está
+instalado (y tiene el vocabulario descargado) y, si no, con la aproximación
+de 4 caracteres por token.
+
+Uso:
+    python -m scripts.bench_tool_encoding
+    python -m scripts.bench_tool_encoding --limit 50
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from config.database import get_db_connection
+from tools import (
+    search_car_rentals,
+    search_connecting_flights,
+    search_flights,
+    search_hotels,
+    search_trip_recommendations,
+)
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count_tokens(text: str) -> int:
+        return len(_encoding.encode(text))
+
+    TOKENIZER = "tiktoken cl100k_base"
+except Exception:  # sin tiktoken o sin red para descargar el vocabulario
+    def count_tokens(text: str) -> int:
+        return len(text) // 4
+
+    TOKENIZER = "aprox. 4 caracteres/token"
+
+
+def legacy_output(value) -> str:
+    """Lo que veía el LLM antes: json.dumps del resultado o str() si no es serializable"""
+    try:
+        return json.dumps(value, ensure_ascii=False)
+    except TypeError:
+        return str(value)
+
+
+def legacy_rows(query: str, params) -> list[dict]:
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    column_names = [column[0] for column in cursor.description]
+    rows = [dict(zip(column_names, row)) for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+
+def busiest_route() -> tuple[str, str, datetime]:
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT departure_airport, arrival_airport, min(scheduled_departure)
+        FROM flights WHERE scheduled_departure > now()
+        GROUP BY 1, 2 ORDER BY count(*) DESC LIMIT 1
+    """)
+    route = cursor.fetchone()
+    conn.close()
+    return route
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens por resultado de las tools de búsqueda")
+    parser.add_argument("--limit", type=int, default=20, help="Filas por búsqueda")
+    args = parser.parse_args()
+    limit = args.limit
+
+    origin, destination, first_departure = busiest_route()
+    window = (first_departure, first_departure + timedelta(days=30))
+    cases = [
+        (
+            "search_flights",
+            lambda: search_flights.func(origin, destination, *window, limit=limit),
+            lambda: legacy_rows(
+                "SELECT * FROM flights WHERE departure_airport = %s AND arrival_airport = %s "
+                "AND scheduled_departure >= %s AND scheduled_departure <= %s LIMIT %s",
+                (origin, destination, *window, limit),
+            ),
+        ),
+        (
+            "search_hotels",
+            lambda: search_hotels.func(price_tier="Luxury", limit=limit),
+            lambda: legacy_rows(
+                "SELECT * FROM hotels WHERE lower(price_tier) = 'luxury' ORDER BY id LIMIT %s", (limit,)
+            ),
+        ),
+        (
+            "search_car_rentals",
+            lambda: search_car_rentals.func(price_tier="Premium", limit=limit),
+            lambda: legacy_rows(
+                "SELECT * FROM car_rentals WHERE lower(price_tier) = 'premium' ORDER BY id LIMIT %s", (limit,)
+            ),
+        ),
+        (
+            "search_trip_recommendations",
+            lambda: search_trip_recommendations.func(limit=limit),
+            lambda: legacy_rows("SELECT * FROM trip_recommendations ORDER BY id LIMIT %s", (limit,)),
+        ),
+    ]
+
+    print(f"🔢 Tokens por resultado ({TOKENIZER}), {limit} filas por búsqueda\n")
+    print(f"{'tool':<30}{'antes':>8}{'ahora':>8}{'ahorro':>9}{'tiempo':>13}")
+    for name, compact, legacy in cases:
+        start = time.perf_counter()
+        before = legacy_output(legacy())
+        legacy_time = time.perf_counter() - start
+        start = time.perf_counter()
+        after = compact()
+        compact_time = time.perf_counter() - start
+        before_tokens, after_tokens = count_tokens(before), count_tokens(after)
+        saving = 1 - after_tokens / before_tokens if before_tokens else 0.0
+        print(
+            f"{name:<30}{before_tokens:>8,}{after_tokens:>8,}{saving:>8.0%}"
+            f"{legacy_time * 1000:>7.1f}→{compact_time * 1000:.1f} ms"
+        )
+
+    # Conexiones: antes una lista de itinerarios con los vuelos anidados
+    connections = search_connecting_flights.func(origin, destination, first_departure, limit=limit)
+    rows = [line.split("|") for line in connections.splitlines()[2:]]
+    nested = {}
+    for option, stops, total, layover, *flight in rows:
+        itinerary = nested.setdefault(option, {
+            "stops": int(stops), "total_duration_minutes": int(total), "layovers_minutes": [], "legs": [],
+        })
+        if layover:
+            itinerary["layovers_minutes"].append(int(layover))
+        itinerary["legs"].append(dict(zip(
+            ["flight_id", "flight_no", "departure_airport", "arrival_airport",
+             "scheduled_departure", "scheduled_arrival"],
+            [*flight[:4], *(datetime.fromisoformat(value) for value in flight[4:])],
+        )))
+    for itinerary in nested.values():
+        itinerary["departure"] = itinerary["legs"][0]["scheduled_departure"]
+        itinerary["arrival"] = itinerary["legs"][-1]["scheduled_arrival"]
+    before_tokens = count_tokens(legacy_output(list(nested.values())))
+    after_tokens = count_tokens(connections)
+    saving = 1 - after_tokens / before_tokens if before_tokens else 0.0
+    print(f"{'search_connecting_flights':<30}{before_tokens:>8,}{after_tokens:>8,}{saving:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
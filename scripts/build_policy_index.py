@@ -0,0 +1,54 @@
+"""
+Reconstruye el índice BM25 de políticas (tools/policy_index.py).
+
+Ejecutar cada vez que se añadan o modifiquen documentos en policies/. Los
+procesos del bot en marcha recargan el índice nuevo automáticamente.
+
+Uso:
+    python -m scripts.build_policy_index
+    python -m scripts.build_policy_index --bench 1000
+"""
+import argparse
+import statistics
+import time
+
+from tools.policy_index import policy_index
+
+BENCH_QUERIES = [
+    "¿puedo cambiar mi vuelo?",
+    "cuánto cuesta una maleta extra",
+    "cancelar hotel",
+    "viajar con mi perro",
+    "reembolso de billete",
+    "edad mínima para alquilar un coche",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruye el índice de políticas")
+    parser.add_argument("--bench", type=int, default=0, help="Consultas de prueba tras el build")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    passages = policy_index.build()
+    print(
+        f"✅ Índice de políticas: {passages} pasajes, {len(policy_index.vocabulary)} términos "
+        f"en {(time.perf_counter() - start) * 1000:.0f} ms ({policy_index.path})"
+    )
+
+    if args.bench:
+        latencies = []
+        for n in range(args.bench):
+            query = BENCH_QUERIES[n % len(BENCH_QUERIES)]
+            start = time.perf_counter()
+            policy_index.search(query)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print(
+            f"🔎 {args.bench} consultas top-3: p50 {statistics.median(latencies) * 1e6:.0f} µs, "
+            f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1e6:.0f} µs"
+        )
+
+
+if __name__ == "__main__":
+    main()
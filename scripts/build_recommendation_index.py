@@ -0,0 +1,61 @@
+"""
+Reconstruye el índice semántico de recomendaciones (tools/recommendation_index.py).
+
+El bot lo mantiene al día de forma incremental; este script rehace la matriz
+completa (p. ej. tras una carga masiva) y mide la latencia de búsqueda.
+
+Uso:
+    python -m scripts.build_recommendation_index
+    python -m scripts.build_recommendation_index --bench 200
+"""
+import argparse
+import statistics
+import time
+
+from tools.recommendation_index import recommendation_index
+
+BENCH_QUERIES = [
+    "algo cultural con museos",
+    "comida típica y vinos",
+    "naturaleza y montaña",
+    "paseo en bici",
+    "vida nocturna",
+    "historia y monumentos",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruye el índice de recomendaciones")
+    parser.add_argument("--bench", type=int, default=0, help="Consultas de prueba tras el build")
+    parser.add_argument("--k", type=int, default=20)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    recommendation_index.build()
+    print(
+        f"✅ Índice construido: {len(recommendation_index.ids)} excursiones en "
+        f"{time.perf_counter() - start:.1f}s ({recommendation_index.path})"
+    )
+
+    if args.bench:
+        recommendation_index.ensure_ready()
+        latencies = []
+        for n in range(args.bench):
+            query = BENCH_QUERIES[n % len(BENCH_QUERIES)]
+            start = time.perf_counter()
+            recommendation_index.search(query, args.k)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print(
+            f"🔎 {args.bench} búsquedas top-{args.k}: p50 {statistics.median(latencies) * 1000:.2f} ms, "
+            f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms"
+        )
+        batch = BENCH_QUERIES * 10
+        start = time.perf_counter()
+        recommendation_index.search_batch(batch, args.k)
+        elapsed = time.perf_counter() - start
+        print(f"📦 batch de {len(batch)} consultas: {elapsed * 1000:.1f} ms ({elapsed / len(batch) * 1000:.2f} ms/consulta)")
+
+
+if __name__ == "__main__":
+    main()
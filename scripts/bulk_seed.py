@@ -0,0 +1,357 @@
+"""
+Generador de datos masivos para benchmarks.
+
+Produce vuelos, billetes, pases de abordar, hoteles, coches y excursiones
+de forma determinista (misma semilla -> mismo dataset) y los carga con
+COPY FROM STDIN por bloques, sin materializar el dataset en memoria.
+"""
+import io
+import random
+import time
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+# Filas generadas por unidad de scale factor
+SCALE_ROWS = {
+    "flights": 50_000,
+    "tickets": 1_000_000,
+    "hotels": 20_000,
+    "car_rentals": 20_000,
+    "trip_recommendations": 20_000,
+    "hotel_reservations": 1_000_000,
+    "car_reservations": 500_000,
+}
+
+CHUNK_SIZE = 50_000
+
+# Tablas que se reconstruyen en cada carga masiva (orden de TRUNCATE)
+BULK_TABLES = [
+    # Se vuelven a crear desde boarding_passes al asignar el primer asiento
+    "flight_seat_maps",
+    "boarding_passes",
+    "ticket_flights",
+    "tickets",
+    "flights",
+    "hotel_inventory",
+    "car_inventory",
+    "hotel_reservations",
+    "car_reservations",
+    "excursion_reservations",
+    "hotels",
+    "car_rentals",
+    "trip_recommendations",
+]
+
+# FKs que se validan una sola vez al final en lugar de fila a fila durante COPY
+BULK_FOREIGN_KEYS = {
+    "ticket_flights_ticket_no_fkey": "ticket_flights (ticket_no) REFERENCES tickets(ticket_no)",
+    "ticket_flights_flight_id_fkey": "ticket_flights (flight_id) REFERENCES flights(flight_id)",
+    "boarding_passes_ticket_no_fkey": "boarding_passes (ticket_no) REFERENCES tickets(ticket_no)",
+    "boarding_passes_flight_id_fkey": "boarding_passes (flight_id) REFERENCES flights(flight_id)",
+    "hotel_reservations_hotel_id_fkey": "hotel_reservations (hotel_id) REFERENCES hotels(id)",
+    "car_reservations_car_rental_id_fkey": "car_reservations (car_rental_id) REFERENCES car_rentals(id)",
+    "hotel_inventory_hotel_id_fkey": "hotel_inventory (hotel_id) REFERENCES hotels(id)",
+    "car_inventory_car_rental_id_fkey": "car_inventory (car_rental_id) REFERENCES car_rentals(id)",
+}
+
+AIRPORTS = [
+    ("MAD", "Madrid"), ("BCN", "Barcelona"), ("AGP", "Málaga"), ("SVQ", "Sevilla"),
+    ("VLC", "Valencia"), ("CDG", "Paris"), ("ORY", "Paris"), ("LHR", "London"),
+    ("LGW", "London"), ("TXL", "Berlin"), ("MUC", "München"), ("FRA", "Frankfurt"),
+    ("AMS", "Amsterdam"), ("BRU", "Bruselas"), ("ZRH", "Zürich"), ("VIE", "Viena"),
+    ("FCO", "Roma"), ("MXP", "Milán"), ("LIS", "Lisboa"), ("OPO", "Oporto"),
+    ("DUB", "Dublín"), ("CPH", "Copenhague"), ("ARN", "Estocolmo"), ("ATH", "Atenas"),
+    ("IST", "Estambul"), ("JFK", "New York"), ("MIA", "Miami"), ("LAX", "Los Angeles"),
+    ("MEX", "Ciudad de México"), ("BOG", "Bogotá"), ("LIM", "Lima"), ("EZE", "Buenos Aires"),
+    ("GRU", "São Paulo"), ("SCL", "Santiago"), ("NRT", "Tokyo"), ("ICN", "Seoul"),
+    ("PEK", "Beijing"), ("SIN", "Singapore"), ("DXB", "Dubai"), ("CMN", "Casablanca"),
+]
+
+AIRLINES = ["IB", "UX", "VY", "AF", "BA", "LH", "KL", "AZ", "TP", "AA", "UA", "KE", "JL", "EK"]
+FARE_CONDITIONS = [("Economy", 80), ("Business", 15), ("First", 5)]
+PRICE_TIERS = ["Economy", "Standard", "Premium", "Luxury"]
+SEAT_LETTERS = "ABCDEF"
+SEATS_PER_FLIGHT = 30 * len(SEAT_LETTERS)
+
+HOTEL_PREFIXES = ["Hotel", "Gran Hotel", "Hostal", "Apartamentos", "Posada", "Boutique Hotel"]
+HOTEL_NAMES = [
+    "Plaza", "Central", "Real", "del Mar", "Sol", "Palacio", "Jardín", "Catedral",
+    "Estación", "Imperial", "Continental", "Los Arcos", "Miramar", "Alameda",
+]
+CAR_COMPANIES = ["Hertz", "Avis", "Europcar", "Sixt", "Budget", "Enterprise", "Alamo", "Goldcar"]
+CAR_SPOTS = ["Airport", "Centro", "Estación"]
+EXCURSION_TEMPLATES = [
+    ("Tour gastronómico por {city}", "Degustación de tapas, vinos y mercados locales: gastronomía típica de {city}"),
+    ("Visita guiada al casco histórico de {city}", "Historia, monumentos y arquitectura del centro antiguo de {city} con guía"),
+    ("Paseo en bicicleta por {city}", "Ruta en bici al aire libre por parques y barrios de {city}, actividad deportiva"),
+    ("Excursión de un día desde {city}", "Escapada a la naturaleza: montaña, pueblos y paisajes cerca de {city}"),
+    ("Tour nocturno por {city}", "Vida nocturna, miradores iluminados y leyendas de {city} de noche"),
+    ("Ruta de museos de {city}", "Arte, pintura y cultura: los museos y galerías más importantes de {city}"),
+    ("Crucero por el río en {city}", "Navegación relajada por el río con vistas panorámicas de {city}"),
+    ("Clase de cocina local en {city}", "Taller práctico de cocina tradicional con un chef de {city}, gastronomía y recetas"),
+]
+
+CITIES = sorted({city for _, city in AIRPORTS})
+
+
+def dataset_sizes(scale: float) -> dict[str, int]:
+    """Número de filas por tabla para un scale factor"""
+    return {table: max(1, int(rows * scale)) for table, rows in SCALE_ROWS.items()}
+
+
+def _copy_value(value) -> str:
+    """Convierte un valor Python al formato de texto de COPY"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def copy_rows(cursor, table: str, columns: list[str], rows, freeze: bool = False) -> int:
+    """
+    Carga un iterable de tuplas con COPY FROM STDIN en bloques de CHUNK_SIZE.
+
+    Returns:
+        Número de filas cargadas
+    """
+    options = " WITH (FREEZE)" if freeze else ""
+    statement = f"COPY {table} ({', '.join(columns)}) FROM STDIN{options}"
+    rows = iter(rows)
+    total = 0
+    while True:
+        chunk = list(islice(rows, CHUNK_SIZE))
+        if not chunk:
+            return total
+        buffer = io.StringIO()
+        for row in chunk:
+            buffer.write("\t".join(_copy_value(v) for v in row))
+            buffer.write("\n")
+        buffer.seek(0)
+        cursor.copy_expert(statement, buffer)
+        total += len(chunk)
+
+
+def _route_minutes(origin: str, destination: str) -> int:
+    """Duración estable (en minutos) para una ruta"""
+    return 60 + (sum(map(ord, origin + destination)) * 37) % 660
+
+
+def generate_flights(rng: random.Random, count: int, base: datetime):
+    """Genera vuelos repartidos en una ventana de 120 días"""
+    for n in range(count):
+        origin, destination = rng.sample(AIRPORTS, 2)
+        departure = base + timedelta(minutes=5 * rng.randrange(120 * 24 * 12))
+        arrival = departure + timedelta(minutes=_route_minutes(origin[0], destination[0]))
+        yield (
+            f"BF{n:08d}",
+            f"{rng.choice(AIRLINES)}{rng.randrange(100, 9999)}",
+            origin[0],
+            destination[0],
+            departure,
+            arrival,
+        )
+
+
+def generate_tickets(rng: random.Random, count: int, flight_count: int):
+    """
+    Genera billetes con su vuelo y asiento.
+
+    Yields:
+        (ticket, ticket_flight, boarding_pass) con asientos únicos por vuelo
+    """
+    seats_taken = [0] * flight_count
+    fares = [fare for fare, _ in FARE_CONDITIONS]
+    weights = [weight for _, weight in FARE_CONDITIONS]
+    passenger_pool = max(1, count // 3)
+    book_ref = 0
+    remaining_in_booking = 0
+    flight_idx = 0
+
+    for n in range(count):
+        # Reservas de 1 a 4 pasajeros en el mismo vuelo
+        if remaining_in_booking == 0:
+            book_ref += 1
+            remaining_in_booking = rng.choice((1, 1, 1, 2, 2, 3, 4))
+            flight_idx = rng.randrange(flight_count)
+            for _ in range(flight_count):
+                if seats_taken[flight_idx] < SEATS_PER_FLIGHT:
+                    break
+                flight_idx = (flight_idx + 1) % flight_count
+        remaining_in_booking -= 1
+
+        seat = seats_taken[flight_idx]
+        if seat >= SEATS_PER_FLIGHT:
+            remaining_in_booking = 0
+            continue
+        seats_taken[flight_idx] += 1
+
+        ticket_no = f"BT{n:010d}"
+        flight_id = f"BF{flight_idx:08d}"
+        yield (
+            (ticket_no, f"B{book_ref:07X}", f"P{rng.randrange(passenger_pool):08d}"),
+            (ticket_no, flight_id, rng.choices(fares, weights)[0]),
+            (ticket_no, flight_id, f"{seat // len(SEAT_LETTERS) + 1}{SEAT_LETTERS[seat % len(SEAT_LETTERS)]}"),
+        )
+
+
+def generate_hotels(rng: random.Random, count: int):
+    for n in range(1, count + 1):
+        city = rng.choice(CITIES)
+        name = f"{rng.choice(HOTEL_PREFIXES)} {rng.choice(HOTEL_NAMES)} {city} {n}"
+        yield (n, name, city, rng.choice(PRICE_TIERS), False, rng.choice((1, 2, 3, 5, 10, 20)))
+
+
+def generate_car_rentals(rng: random.Random, count: int):
+    for n in range(1, count + 1):
+        location = f"{rng.choice(CITIES)} {rng.choice(CAR_SPOTS)}"
+        yield (n, rng.choice(CAR_COMPANIES), location, rng.choice(PRICE_TIERS), False, rng.choice((1, 2, 3, 5)))
+
+
+def generate_reservations(rng: random.Random, count: int, item_count: int, first_day: date):
+    """Reservas de 1 a 7 días dentro de la ventana de 120 días (~5% canceladas)"""
+    passenger_pool = max(1, count // 2)
+    for n in range(1, count + 1):
+        start = first_day + timedelta(days=rng.randrange(120))
+        end = start + timedelta(days=rng.choice((1, 1, 2, 2, 3, 3, 4, 5, 7)))
+        status = "cancelled" if rng.random() < 0.05 else "active"
+        yield (n, rng.randrange(1, item_count + 1), f"P{rng.randrange(passenger_pool):08d}", start, end, status)
+
+
+def rebuild_inventory(cursor, inventory: str, reservations: str, item_table: str, key: str,
+                      start_column: str, end_column: str):
+    """
+    Recalcula el inventario diario a partir de las reservas activas y sube la
+    capacidad de los items que el generador haya sobre-reservado.
+    """
+    cursor.execute(f"""
+        INSERT INTO {inventory} ({key}, day, reserved)
+        SELECT r.{key}, day::date, count(*)
+        FROM {reservations} r,
+             generate_series(r.{start_column}, r.{end_column} - 1, interval '1 day') AS day
+        WHERE r.status = 'active'
+        GROUP BY 1, 2
+    """)
+    cursor.execute(f"""
+        UPDATE {item_table} t SET capacity = p.peak
+        FROM (SELECT {key}, max(reserved) AS peak FROM {inventory} GROUP BY 1) p
+        WHERE p.{key} = t.id AND p.peak > t.capacity
+    """)
+
+
+def generate_trip_recommendations(rng: random.Random, count: int):
+    for n in range(1, count + 1):
+        city = rng.choice(CITIES)
+        name, details = rng.choice(EXCURSION_TEMPLATES)
+        yield (n, name.format(city=city), city, False, rng.choice((10, 15, 20, 30, 40)), details.format(city=city))
+
+
+def load_bulk_dataset(conn, scale: float, seed: int = 42) -> dict[str, int]:
+    """
+    Reconstruye las tablas de negocio con un dataset sintético.
+
+    Vacía las tablas (TRUNCATE) y las carga con COPY ... FREEZE dentro de la
+    misma transacción, así una re-ejecución con la misma semilla deja los
+    mismos datos (con fechas relativas al día de carga) en lugar de duplicarlos.
+    No hace commit: lo decide el llamador.
+
+    Returns:
+        Filas cargadas por tabla
+    """
+    sizes = dataset_sizes(scale)
+    rng = random.Random(seed)
+    base = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=30)
+    cursor = conn.cursor()
+    loaded = {}
+
+    cursor.execute(f"TRUNCATE {', '.join(BULK_TABLES)} RESTART IDENTITY")
+    # Triggers de read models: se recalculan de una vez al final
+    for table in BULK_TABLES:
+        cursor.execute(f"ALTER TABLE {table} DISABLE TRIGGER USER")
+    for name, definition in BULK_FOREIGN_KEYS.items():
+        table = definition.split(" ", 1)[0]
+        cursor.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name}")
+
+    start = time.perf_counter()
+    loaded["flights"] = copy_rows(
+        cursor, "flights",
+        ["flight_id", "flight_no", "departure_airport", "arrival_airport",
+         "scheduled_departure", "scheduled_arrival"],
+        generate_flights(rng, sizes["flights"], base),
+        freeze=True,
+    )
+    print(f"   ✈️  flights: {loaded['flights']:,} filas ({time.perf_counter() - start:.1f}s)")
+
+    # Los tres COPY se hacen por bloque para no recorrer el generador tres veces
+    start = time.perf_counter()
+    tickets = generate_tickets(rng, sizes["tickets"], sizes["flights"])
+    loaded["tickets"] = 0
+    while True:
+        chunk = list(islice(tickets, CHUNK_SIZE))
+        if not chunk:
+            break
+        ticket_rows, ticket_flight_rows, boarding_rows = zip(*chunk)
+        copy_rows(cursor, "tickets", ["ticket_no", "book_ref", "passenger_id"], ticket_rows, freeze=True)
+        copy_rows(cursor, "ticket_flights", ["ticket_no", "flight_id", "fare_conditions"], ticket_flight_rows, freeze=True)
+        copy_rows(cursor, "boarding_passes", ["ticket_no", "flight_id", "seat_no"], boarding_rows, freeze=True)
+        loaded["tickets"] += len(chunk)
+    loaded["ticket_flights"] = loaded["boarding_passes"] = loaded["tickets"]
+    print(f"   🎫 tickets/ticket_flights/boarding_passes: {loaded['tickets']:,} filas c/u ({time.perf_counter() - start:.1f}s)")
+
+    start = time.perf_counter()
+    loaded["hotels"] = copy_rows(
+        cursor, "hotels", ["id", "name", "location", "price_tier", "booked", "capacity"],
+        generate_hotels(rng, sizes["hotels"]), freeze=True,
+    )
+    loaded["car_rentals"] = copy_rows(
+        cursor, "car_rentals", ["id", "name", "location", "price_tier", "booked", "capacity"],
+        generate_car_rentals(rng, sizes["car_rentals"]), freeze=True,
+    )
+    loaded["trip_recommendations"] = copy_rows(
+        cursor, "trip_recommendations", ["id", "name", "location", "booked", "capacity", "details"],
+        generate_trip_recommendations(rng, sizes["trip_recommendations"]), freeze=True,
+    )
+    print(f"   🏨 hotels/car_rentals/trip_recommendations ({time.perf_counter() - start:.1f}s)")
+
+    start = time.perf_counter()
+    loaded["hotel_reservations"] = copy_rows(
+        cursor, "hotel_reservations",
+        ["id", "hotel_id", "passenger_id", "checkin_date", "checkout_date", "status"],
+        generate_reservations(rng, sizes["hotel_reservations"], sizes["hotels"], base.date()),
+        freeze=True,
+    )
+    loaded["car_reservations"] = copy_rows(
+        cursor, "car_reservations",
+        ["id", "car_rental_id", "passenger_id", "start_date", "end_date", "status"],
+        generate_reservations(rng, sizes["car_reservations"], sizes["car_rentals"], base.date()),
+        freeze=True,
+    )
+    rebuild_inventory(cursor, "hotel_inventory", "hotel_reservations", "hotels", "hotel_id",
+                      "checkin_date", "checkout_date")
+    rebuild_inventory(cursor, "car_inventory", "car_reservations", "car_rentals", "car_rental_id",
+                      "start_date", "end_date")
+    print(f"   📅 reservas e inventario diario ({time.perf_counter() - start:.1f}s)")
+
+    for name, definition in BULK_FOREIGN_KEYS.items():
+        table, columns = definition.split(" ", 1)
+        cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY {columns}")
+
+    start = time.perf_counter()
+    cursor.execute("SELECT rebuild_passenger_itineraries()")
+    loaded["passenger_itineraries"] = cursor.fetchone()[0]
+    print(f"   🧭 passenger_itineraries: {loaded['passenger_itineraries']:,} filas ({time.perf_counter() - start:.1f}s)")
+    for table in BULK_TABLES:
+        cursor.execute(f"ALTER TABLE {table} ENABLE TRIGGER USER")
+
+    # Las tablas SERIAL se cargaron con id explícito: avanzar las secuencias
+    for table in ("hotels", "car_rentals", "trip_recommendations", "hotel_reservations", "car_reservations"):
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"
+        )
+
+    cursor.close()
+    return loaded
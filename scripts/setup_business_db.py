@@ -1,11 +1,253 @@
 """
 Crea todas las tablas de negocio: flights, hotels, cars, excursions
-Ejecutar UNA SOLA VEZ al iniciar el proyecto.
+Es idempotente: se puede re-ejecutar sin duplicar datos.
+
+Uso:
+    python -m scripts.setup_business_db                 # tablas + datos de prueba
+    python -m scripts.setup_business_db --scale 1       # + dataset masivo (~1M billetes)
 """
+import argparse
 from datetime import datetime, timedelta
 from psycopg2.extras import execute_batch
 from config.database import get_db_connection
-def setup_business_tables():
+from scripts.bulk_seed import load_bulk_dataset
+
+# Índices secundarios: se eliminan antes de una carga masiva y se crean al final
+BUSINESS_INDEXES = {
+    "idx_flights_route": "flights (departure_airport, arrival_airport, scheduled_departure)",
+    "idx_flights_departure": "flights (scheduled_departure)",
+    # Refresco incremental del índice de rutas (tools/route_index.py)
+    "idx_flights_updated": "flights (updated_at)",
+    "idx_tickets_passenger": "tickets (passenger_id)",
+    "idx_tickets_book_ref": "tickets (book_ref)",
+    "idx_ticket_flights_flight": "ticket_flights (flight_id)",
+    "idx_boarding_passes_flight": "boarding_passes (flight_id)",
+    # Un asiento no se asigna dos veces en el mismo vuelo (tools/seat_allocator.py)
+    "idx_boarding_passes_seat": "boarding_passes (flight_id, seat_no)",
+    # Búsqueda difusa sin acentos (ver tools/base.py: fuzzy_filters)
+    "idx_hotels_location_trgm": "hotels USING gin (search_key(location) gin_trgm_ops)",
+    "idx_hotels_name_trgm": "hotels USING gin (search_key(name) gin_trgm_ops)",
+    "idx_car_rentals_location_trgm": "car_rentals USING gin (search_key(location) gin_trgm_ops)",
+    "idx_car_rentals_name_trgm": "car_rentals USING gin (search_key(name) gin_trgm_ops)",
+    "idx_trip_recommendations_location_trgm": "trip_recommendations USING gin (search_key(location) gin_trgm_ops)",
+    "idx_trip_recommendations_name_trgm": "trip_recommendations USING gin (search_key(name) gin_trgm_ops)",
+    # Refresco incremental del índice de recomendaciones (tools/recommendation_index.py)
+    "idx_trip_recommendations_updated": "trip_recommendations (updated_at)",
+    # Filtro por categoría y reservas
+    "idx_hotels_price_tier": "hotels (lower(price_tier))",
+    "idx_car_rentals_price_tier": "car_rentals (lower(price_tier))",
+    "idx_hotel_reservations_hotel": "hotel_reservations (hotel_id, checkin_date)",
+    "idx_hotel_reservations_passenger": "hotel_reservations (passenger_id)",
+    "idx_car_reservations_car": "car_reservations (car_rental_id, start_date)",
+    "idx_car_reservations_passenger": "car_reservations (passenger_id)",
+    "idx_excursion_reservations_passenger": "excursion_reservations (passenger_id)",
+    # Mantenimiento del read model de itinerarios (por billete y por vuelo)
+    "idx_passenger_itineraries_ticket": "passenger_itineraries (ticket_no)",
+    "idx_passenger_itineraries_flight": "passenger_itineraries (flight_id)",
+}
+UNIQUE_INDEXES = {"idx_boarding_passes_seat"}
+
+# Read model de itinerarios: una fila por (pasajero, billete, vuelo) con todo lo
+# que devuelve fetch_user_flight_information
+ITINERARY_COLUMNS = (
+    "passenger_id, ticket_no, book_ref, flight_id, flight_no, departure_airport, "
+    "arrival_airport, scheduled_departure, scheduled_arrival, seat_no, fare_conditions"
+)
+ITINERARY_SELECT = """
+    SELECT t.passenger_id, t.ticket_no, t.book_ref, f.flight_id, f.flight_no,
+           f.departure_airport, f.arrival_airport, f.scheduled_departure,
+           f.scheduled_arrival, bp.seat_no, tf.fare_conditions
+    FROM tickets t
+    JOIN ticket_flights tf ON t.ticket_no = tf.ticket_no
+    JOIN flights f ON tf.flight_id = f.flight_id
+    JOIN boarding_passes bp ON bp.ticket_no = t.ticket_no AND bp.flight_id = f.flight_id
+    WHERE t.passenger_id IS NOT NULL
+"""
+# Tablas cuyas filas afectan al itinerario de un billete
+ITINERARY_SOURCES = ("tickets", "ticket_flights", "boarding_passes")
+
+
+def create_business_indexes(cursor):
+    """Crea los índices secundarios de las tablas de negocio"""
+    for name, definition in BUSINESS_INDEXES.items():
+        unique = "UNIQUE " if name in UNIQUE_INDEXES else ""
+        cursor.execute(f"CREATE {unique}INDEX IF NOT EXISTS {name} ON {definition}")
+
+
+def drop_business_indexes(cursor):
+    """Elimina los índices secundarios (antes de una carga masiva)"""
+    for name in BUSINESS_INDEXES:
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def seed_bulk_dataset(conn, scale: float, seed: int = 42, force: bool = False):
+    """
+    Carga el dataset masivo si no está ya cargado con el mismo scale y semilla.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT scale, seed, loaded_at FROM dataset_seeds WHERE name = 'business'"
+    )
+    current = cursor.fetchone()
+    if current and current[0] == scale and current[1] == seed and not force:
+        print(f"ℹ️ Dataset con scale={scale} ya cargado el {current[2]:%Y-%m-%d %H:%M} (usa --force para recargar)")
+        return
+
+    print(f"📦 Cargando dataset masivo (scale={scale}, seed={seed})...")
+    drop_business_indexes(cursor)
+    load_bulk_dataset(conn, scale, seed)
+    cursor.execute(
+        """INSERT INTO dataset_seeds (name, scale, seed, loaded_at)
+           VALUES ('business', %s, %s, CURRENT_TIMESTAMP)
+           ON CONFLICT (name) DO UPDATE
+           SET scale = EXCLUDED.scale, seed = EXCLUDED.seed, loaded_at = EXCLUDED.loaded_at""",
+        (scale, seed)
+    )
+
+
+def create_itinerary_read_model(cursor):
+    """
+    Crea passenger_itineraries y los triggers que la mantienen.
+
+    Cualquier cambio en tickets, ticket_flights o boarding_passes recalcula las
+    filas de ese billete; un cambio de horario o ruta en flights actualiza las
+    filas de ese vuelo. Las cargas masivas desactivan los triggers y llaman a
+    rebuild_passenger_itineraries() al final.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS passenger_itineraries (
+            passenger_id TEXT NOT NULL,
+            ticket_no TEXT NOT NULL,
+            book_ref TEXT,
+            flight_id TEXT NOT NULL,
+            flight_no TEXT,
+            departure_airport TEXT,
+            arrival_airport TEXT,
+            scheduled_departure TIMESTAMP,
+            scheduled_arrival TIMESTAMP,
+            seat_no TEXT,
+            fare_conditions TEXT,
+            PRIMARY KEY (passenger_id, ticket_no, flight_id)
+        )
+    """)
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION refresh_passenger_itinerary(p_ticket_no TEXT) RETURNS void AS $$
+            DELETE FROM passenger_itineraries WHERE ticket_no = p_ticket_no;
+            INSERT INTO passenger_itineraries ({ITINERARY_COLUMNS})
+            {ITINERARY_SELECT} AND t.ticket_no = p_ticket_no;
+        $$ LANGUAGE sql
+    """)
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION rebuild_passenger_itineraries() RETURNS bigint AS $$
+            TRUNCATE passenger_itineraries;
+            INSERT INTO passenger_itineraries ({ITINERARY_COLUMNS})
+            {ITINERARY_SELECT};
+            SELECT count(*) FROM passenger_itineraries;
+        $$ LANGUAGE sql
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION sync_passenger_itinerary() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM refresh_passenger_itinerary(OLD.ticket_no);
+            END IF;
+            IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.ticket_no IS DISTINCT FROM OLD.ticket_no) THEN
+                PERFORM refresh_passenger_itinerary(NEW.ticket_no);
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION sync_flight_itineraries() RETURNS trigger AS $$
+        BEGIN
+            UPDATE passenger_itineraries
+            SET flight_no = NEW.flight_no,
+                departure_airport = NEW.departure_airport,
+                arrival_airport = NEW.arrival_airport,
+                scheduled_departure = NEW.scheduled_departure,
+                scheduled_arrival = NEW.scheduled_arrival
+            WHERE flight_id = NEW.flight_id;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    for table in ITINERARY_SOURCES:
+        cursor.execute(f"DROP TRIGGER IF EXISTS passenger_itineraries_sync ON {table}")
+        cursor.execute(f"""
+            CREATE TRIGGER passenger_itineraries_sync
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION sync_passenger_itinerary()
+        """)
+    cursor.execute("DROP TRIGGER IF EXISTS passenger_itineraries_sync ON flights")
+    cursor.execute("""
+        CREATE TRIGGER passenger_itineraries_sync
+        AFTER UPDATE OF flight_no, departure_airport, arrival_airport,
+                        scheduled_departure, scheduled_arrival ON flights
+        FOR EACH ROW EXECUTE FUNCTION sync_flight_itineraries()
+    """)
+
+    # Primera creación sobre una base con billetes: poblar desde las tablas
+    cursor.execute(
+        "SELECT NOT EXISTS (SELECT 1 FROM passenger_itineraries) AND EXISTS (SELECT 1 FROM tickets)"
+    )
+    if cursor.fetchone()[0]:
+        cursor.execute("SELECT rebuild_passenger_itineraries()")
+        print(f"🧭 Itinerarios reconstruidos: {cursor.fetchone()[0]} filas")
+
+
+def create_seat_maps(cursor):
+    """
+    Crea flight_seat_maps (bitmap de ocupación por vuelo) y el trigger de
+    boarding_passes que lo mantiene. Los mapas se crean al asignar el primer
+    asiento de cada vuelo (tools/seat_allocator.py), así que una carga masiva
+    solo tiene que vaciarlos.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS flight_seat_maps (
+            flight_id TEXT PRIMARY KEY REFERENCES flights(flight_id) ON DELETE CASCADE,
+            seat_rows INTEGER NOT NULL,
+            seats_per_row INTEGER NOT NULL,
+            occupancy BYTEA NOT NULL
+        )
+    """)
+    # "12C" -> bit (12 - 1) * seats_per_row + 2; NULL si no cabe en el avión
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION seat_map_index(p_seat_no TEXT, p_rows INT, p_seats_per_row INT) RETURNS int AS $$
+            SELECT CASE WHEN seat_row BETWEEN 1 AND p_rows AND seat_column BETWEEN 0 AND p_seats_per_row - 1
+                        THEN (seat_row - 1) * p_seats_per_row + seat_column END
+            FROM (SELECT substring(p_seat_no FROM '^([0-9]+)[A-Za-z]$')::int AS seat_row,
+                         ascii(upper(right(p_seat_no, 1))) - 65 AS seat_column) seat
+        $$ LANGUAGE sql IMMUTABLE STRICT
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION sync_seat_map() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE flight_seat_maps
+                SET occupancy = set_bit(occupancy, seat_map_index(OLD.seat_no, seat_rows, seats_per_row), 0)
+                WHERE flight_id = OLD.flight_id
+                  AND seat_map_index(OLD.seat_no, seat_rows, seats_per_row) IS NOT NULL;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                UPDATE flight_seat_maps
+                SET occupancy = set_bit(occupancy, seat_map_index(NEW.seat_no, seat_rows, seats_per_row), 1)
+                WHERE flight_id = NEW.flight_id
+                  AND seat_map_index(NEW.seat_no, seat_rows, seats_per_row) IS NOT NULL;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    cursor.execute("DROP TRIGGER IF EXISTS flight_seat_maps_sync ON boarding_passes")
+    cursor.execute("""
+        CREATE TRIGGER flight_seat_maps_sync
+        AFTER INSERT OR DELETE OR UPDATE OF flight_id, seat_no ON boarding_passes
+        FOR EACH ROW EXECUTE FUNCTION sync_seat_map()
+    """)
+
+
+def setup_business_tables(scale: float = 0, seed: int = 42, force: bool = False):
     """Crea tablas de negocio y datos de prueba"""
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -45,6 +287,31 @@ def setup_business_tables():
         CREATE INDEX IF NOT EXISTS idx_conversations_active 
         ON conversations(telegram_user_id, is_active)
     """)
+
+    # Usuarios de Telegram de un pasajero (recordatorios de salida en bloque)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_passenger
+        ON users(passenger_id)
+    """)
+
+    # Recordatorios de salida ya reclamados/enviados (handlers/notifications.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS departure_notifications (
+            telegram_user_id BIGINT NOT NULL,
+            ticket_no TEXT NOT NULL,
+            flight_id TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',  -- pending | sent | failed
+            holder TEXT NOT NULL,
+            claimed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            sent_at TIMESTAMP,
+            error TEXT,
+            PRIMARY KEY (telegram_user_id, ticket_no, flight_id)
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_departure_notifications_pending
+        ON departure_notifications(claimed_at) WHERE status = 'pending'
+    """)
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS tickets (
             ticket_no TEXT PRIMARY KEY,
@@ -115,7 +382,144 @@ def setup_business_tables():
         )
     """)
 
-    # --- Insertar datos de prueba ---
+    # --- Disponibilidad por fechas ---
+    # capacity: habitaciones / vehículos disponibles por día
+    cursor.execute("ALTER TABLE hotels ADD COLUMN IF NOT EXISTS capacity INTEGER NOT NULL DEFAULT 10")
+    cursor.execute("ALTER TABLE car_rentals ADD COLUMN IF NOT EXISTS capacity INTEGER NOT NULL DEFAULT 10")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS hotel_reservations (
+            id SERIAL PRIMARY KEY,
+            hotel_id INTEGER NOT NULL REFERENCES hotels(id),
+            passenger_id TEXT NOT NULL,
+            checkin_date DATE NOT NULL,
+            checkout_date DATE NOT NULL,
+            status TEXT NOT NULL DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            CHECK (checkout_date > checkin_date)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS car_reservations (
+            id SERIAL PRIMARY KEY,
+            car_rental_id INTEGER NOT NULL REFERENCES car_rentals(id),
+            passenger_id TEXT NOT NULL,
+            start_date DATE NOT NULL,
+            end_date DATE NOT NULL,
+            status TEXT NOT NULL DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            CHECK (end_date > start_date)
+        )
+    """)
+
+    # Inventario por día: una fila solo existe si ese día hay reservas activas
+    # (sin fila = nada reservado), así no hay que pre-generar el calendario.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS hotel_inventory (
+            hotel_id INTEGER NOT NULL REFERENCES hotels(id),
+            day DATE NOT NULL,
+            reserved INTEGER NOT NULL DEFAULT 0 CHECK (reserved >= 0),
+            PRIMARY KEY (hotel_id, day)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS car_inventory (
+            car_rental_id INTEGER NOT NULL REFERENCES car_rentals(id),
+            day DATE NOT NULL,
+            reserved INTEGER NOT NULL DEFAULT 0 CHECK (reserved >= 0),
+            PRIMARY KEY (car_rental_id, day)
+        )
+    """)
+
+    # Plazas de excursiones: contador de reservas frente a capacidad
+    cursor.execute("ALTER TABLE trip_recommendations ADD COLUMN IF NOT EXISTS capacity INTEGER NOT NULL DEFAULT 20")
+    cursor.execute("ALTER TABLE trip_recommendations ADD COLUMN IF NOT EXISTS reserved INTEGER NOT NULL DEFAULT 0 CHECK (reserved >= 0)")
+
+    # Descripción para la búsqueda semántica y marca de modificación
+    cursor.execute("ALTER TABLE trip_recommendations ADD COLUMN IF NOT EXISTS details TEXT")
+    cursor.execute("ALTER TABLE trip_recommendations ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT now()")
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := now();
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    # Marca de modificación de vuelos para el índice de rutas en memoria
+    cursor.execute("ALTER TABLE flights ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT now()")
+    cursor.execute("DROP TRIGGER IF EXISTS flights_touch ON flights")
+    cursor.execute("""
+        CREATE TRIGGER flights_touch
+        BEFORE UPDATE ON flights
+        FOR EACH ROW EXECUTE FUNCTION touch_updated_at()
+    """)
+
+    # Solo los cambios de texto: reservar plazas no obliga a re-indexar
+    cursor.execute("DROP TRIGGER IF EXISTS trip_recommendations_touch ON trip_recommendations")
+    cursor.execute("""
+        CREATE TRIGGER trip_recommendations_touch
+        BEFORE UPDATE OF name, location, details ON trip_recommendations
+        FOR EACH ROW EXECUTE FUNCTION touch_updated_at()
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS excursion_reservations (
+            id SERIAL PRIMARY KEY,
+            recommendation_id INTEGER NOT NULL REFERENCES trip_recommendations(id),
+            passenger_id TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Idempotencia de las acciones sensibles ejecutadas por la outbox: un
+    # reintento con la misma clave (tools/base.py: get_request_key) devuelve
+    # la reserva original en lugar de crear otra
+    for table in ("hotel_reservations", "car_reservations", "excursion_reservations"):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS request_key TEXT UNIQUE")
+    # Resultado de los cambios de billetes por clave (tools/flights_tools.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ticket_requests (
+            request_key TEXT PRIMARY KEY,
+            result JSONB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Itinerarios por pasajero (read model de fetch_user_flight_information)
+    create_itinerary_read_model(cursor)
+
+    # Mapas de asientos por vuelo (asignación sin colisiones)
+    create_seat_maps(cursor)
+
+    # Búsqueda difusa: trigramas + eliminación de acentos
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+    # unaccent() no es IMMUTABLE: se envuelve para poder indexar la expresión
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION search_key(text) RETURNS text AS $$
+            SELECT lower(public.unaccent('public.unaccent'::regdictionary, $1))
+        $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    """)
+
+    # Registro de cargas masivas (para no repetirlas)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS dataset_seeds (
+            name TEXT PRIMARY KEY,
+            scale DOUBLE PRECISION NOT NULL,
+            seed INTEGER NOT NULL,
+            loaded_at TIMESTAMP NOT NULL
+        )
+    """)
+
+    # --- Dataset masivo (opcional) ---
+    if scale > 0:
+        seed_bulk_dataset(conn, scale, seed, force)
+
+    # --- Insertar datos de prueba (sin duplicar en re-ejecuciones) ---
     tickets = [
         ("T001", "BR001", "3442 587242"),
         ("T002", "BR002", "3442 587242"),
@@ -155,7 +559,7 @@ def setup_business_tables():
         ("Europcar", "Berlin Tegel", "Luxury", False),
         ("Budget", "London Heathrow", "Economy", False),
     ]
-    execute_batch(cursor, "INSERT INTO car_rentals (name, location, price_tier, booked) VALUES (%s, %s, %s, %s)", car_rentals)
+    execute_batch(cursor, "INSERT INTO car_rentals (name, location, price_tier, booked) SELECT %s, %s, %s, %s WHERE NOT EXISTS (SELECT 1 FROM car_rentals WHERE name = %s AND location = %s)", [row + row[:2] for row in car_rentals])
 
     hotels = [
         ("Hotel Ritz", "Madrid", "Luxury", False),
@@ -163,19 +567,34 @@ def setup_business_tables():
         ("Hotel Berlin", "Berlin", "Standard", False),
         ("Hotel Savoy", "London", "Luxury", False),
     ]
-    execute_batch(cursor, "INSERT INTO hotels (name, location, price_tier, booked) VALUES (%s, %s, %s, %s)", hotels)
+    execute_batch(cursor, "INSERT INTO hotels (name, location, price_tier, booked) SELECT %s, %s, %s, %s WHERE NOT EXISTS (SELECT 1 FROM hotels WHERE name = %s AND location = %s)", [row + row[:2] for row in hotels])
 
     trip_recommendations = [
-        ("Tour del Louvre", "Paris", False),
-        ("Paseo por el Retiro", "Madrid", False),
-        ("Visita al Muro de Berlín", "Berlin", False),
-        ("Tour del Big Ben", "London", False),
+        ("Tour del Louvre", "Paris", False, "Visita guiada al museo del Louvre: arte, pintura y cultura, con la Gioconda"),
+        ("Paseo por el Retiro", "Madrid", False, "Paseo al aire libre por el parque del Retiro, naturaleza y barca en el estanque"),
+        ("Visita al Muro de Berlín", "Berlin", False, "Recorrido histórico por el Muro de Berlín y su memorial, historia de la Guerra Fría"),
+        ("Tour del Big Ben", "London", False, "Tour por Westminster, el Big Ben y el Parlamento, monumentos y arquitectura"),
     ]
-    execute_batch(cursor, "INSERT INTO trip_recommendations (name, location, booked) VALUES (%s, %s, %s)", trip_recommendations)
+    execute_batch(cursor, "INSERT INTO trip_recommendations (name, location, booked, details) SELECT %s, %s, %s, %s WHERE NOT EXISTS (SELECT 1 FROM trip_recommendations WHERE name = %s AND location = %s)", [row + row[:2] for row in trip_recommendations])
+    execute_batch(cursor, "UPDATE trip_recommendations SET details = %s WHERE name = %s AND location = %s AND details IS NULL", [(row[3],) + row[:2] for row in trip_recommendations])
+
+    # Índices después de cargar los datos
+    create_business_indexes(cursor)
 
     conn.commit()
+    if scale > 0:
+        # Estadísticas frescas para el planner tras la carga masiva
+        conn.autocommit = True
+        cursor.execute("ANALYZE")
     conn.close()
     print("✅ Tablas de negocio creadas correctamente")
 
 if __name__ == "__main__":
-    setup_business_tables()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Crea las tablas de negocio y datos de prueba")
+    parser.add_argument("--scale", type=float, default=0,
+                        help="Scale factor del dataset masivo (1 = ~50k vuelos y ~1M billetes)")
+    parser.add_argument("--seed", type=int, default=42, help="Semilla del generador")
+    parser.add_argument("--force", action="store_true",
+                        help="Recarga el dataset aunque ya exista con el mismo scale")
+    args = parser.parse_args()
+    setup_business_tables(scale=args.scale, seed=args.seed, force=args.force)
\ No newline at end of file
@@ -10,7 +10,14 @@ root_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(root_dir))
 
 from langgraph.checkpoint.postgres import PostgresSaver
-from config.database import get_connection_string
+from config.database import get_connection_string, get_db_connection
+from config.schema import (
+    ARCHIVE_TABLE_SQL,
+    DEDUP_TABLE_SQL,
+    DICTIONARY_TABLE_SQL,
+    HOLDERS_TABLE_SQL,
+    OUTBOX_TABLE_SQL,
+)
 
 def setup_langgraph_memory():
     """Crea tablas de checkpoints para LangGraph"""
@@ -19,6 +26,21 @@ def setup_langgraph_memory():
     # LangGraph crea automáticamente las tablas
     with PostgresSaver.from_conn_string(conn_string) as checkpointer:
         checkpointer.setup()
+
+    # Almacén en frío de los threads archivados (graph/checkpoint_archive.py)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(ARCHIVE_TABLE_SQL)
+    # Diccionarios zstd del serializador de checkpoints (graph/checkpoint_serde.py)
+    cursor.execute(DICTIONARY_TABLE_SQL)
+    # Dueños de los locks por thread (graph/thread_lock.py)
+    cursor.execute(HOLDERS_TABLE_SQL)
+    # Cola de acciones sensibles aprobadas (graph/outbox.py)
+    cursor.execute(OUTBOX_TABLE_SQL)
+    # Updates de Telegram ya procesados (handlers/dedup.py)
+    cursor.execute(DEDUP_TABLE_SQL)
+    conn.commit()
+    conn.close()
     
     print("✅ Tablas de memoria LangGraph creadas correctamente")
 
@@ -0,0 +1,206 @@
+"""
+Entrena el diccionario zstd del serializador de checkpoints
+(graph/checkpoint_serde.py) y lo guarda en checkpoint_dictionaries.
+
+Las muestras son los blobs msgpack de checkpoint_blobs y checkpoint_writes
+(descomprimidos si ya se escribieron con un diccionario anterior). Si aún no
+hay suficientes conversaciones reales, se completan con conversaciones
+sintéticas con la misma forma que las del bot: mensajes de DeepSeek con
+tool_calls, resultados de tools en tabla compacta y el user_info.
+
+El diccionario nuevo se usa para escribir en cuanto el bot se reinicia; los
+anteriores se conservan para leer los checkpoints que comprimieron.
+
+Uso:
+    python -m scripts.train_checkpoint_dictionary
+    python -m scripts.train_checkpoint_dictionary --size 65536 --max-samples 20000
+"""
+import argparse
+import random
+import uuid
+from datetime import datetime, timedelta
+
+import zstandard
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from config.database import get_db_connection
+from config.schema import DICTIONARY_TABLE_SQL
+from graph.checkpoint_serde import COMPRESSED_SUFFIX, CompactSerializer
+
+MIN_SAMPLES = 2000
+
+AIRPORTS = ["MAD", "BCN", "CDG", "LHR", "FRA", "AMS", "FCO", "LIS", "JFK", "MEX", "BOG", "EZE", "SCL", "LIM"]
+CITIES = ["Madrid", "Barcelona", "París", "Londres", "Roma", "Lisboa", "Ámsterdam", "Berlín", "Zúrich", "Basilea"]
+QUESTIONS = [
+    "¿Hay vuelos de {a} a {b} el {d}?",
+    "Quiero cambiar mi vuelo a uno más tarde",
+    "Busca un hotel en {c} para esas fechas",
+    "¿Qué excursiones me recomiendas en {c}?",
+    "Necesito un coche de alquiler en {c}",
+    "Cancela mi billete, por favor",
+    "¿Cuál es la política de equipaje?",
+    "Resérvame el segundo",
+]
+TOOLS = {
+    "search_flights": ("flight_id|flight_no|departure_airport|arrival_airport|scheduled_departure|scheduled_arrival",
+                       lambda r: {"departure_airport": r.choice(AIRPORTS), "arrival_airport": r.choice(AIRPORTS),
+                                  "start_time": _date(r).isoformat(), "limit": 20}),
+    "search_hotels": ("id|name|location|price_tier",
+                      lambda r: {"location": r.choice(CITIES), "price_tier": r.choice(["Midscale", "Luxury"])}),
+    "search_car_rentals": ("id|name|location|price_tier",
+                           lambda r: {"location": r.choice(CITIES)}),
+    "search_trip_recommendations": ("id|name|location|details|available_spots",
+                                    lambda r: {"location": r.choice(CITIES), "keywords": "museos, historia"}),
+    "lookup_policy": (None, lambda r: {"query": "cambio de vuelo"}),
+}
+
+
+def _date(rng: random.Random) -> datetime:
+    return datetime(2025, 11, 1, 6) + timedelta(days=rng.randrange(60), minutes=5 * rng.randrange(200))
+
+
+def _tool_result(rng: random.Random, name: str, header: str) -> str:
+    if header is None:
+        return "Cambios de vuelo: se permiten hasta 24 horas antes de la salida con un cargo según la tarifa. " * 3
+    rows = []
+    for i in range(rng.randint(1, 20)):
+        if name == "search_flights":
+            dep = _date(rng)
+            rows.append(f"{rng.randrange(1, 10**6)}|PG{rng.randrange(1000):04d}|{rng.choice(AIRPORTS)}|"
+                        f"{rng.choice(AIRPORTS)}|{dep:%Y-%m-%dT%H:%M}|{dep + timedelta(hours=2):%Y-%m-%dT%H:%M}")
+        elif name == "search_trip_recommendations":
+            rows.append(f"{rng.randrange(1, 40000)}|Ruta {i}|{rng.choice(CITIES)}|"
+                        f"Visita guiada por el casco histórico y museos|{rng.randrange(30)}")
+        else:
+            rows.append(f"{rng.randrange(1, 5000)}|{rng.choice(['Hilton', 'Europcar', 'NH', 'Avis'])} {i}|"
+                        f"{rng.choice(CITIES)}|{rng.choice(['Economy', 'Midscale', 'Luxury', 'Premium'])}")
+    label = "resultado" if len(rows) == 1 else "resultados"
+    return "\n".join([f"{len(rows)} {label}", header, *rows])
+
+
+def _ai(rng: random.Random, content: str, tool_calls: list) -> AIMessage:
+    prompt_tokens = rng.randrange(1500, 9000)
+    completion_tokens = rng.randrange(20, 400)
+    return AIMessage(
+        content=content,
+        tool_calls=tool_calls,
+        id=f"run-{uuid.UUID(int=rng.getrandbits(128))}-0",
+        response_metadata={
+            "token_usage": {"completion_tokens": completion_tokens, "prompt_tokens": prompt_tokens,
+                            "total_tokens": prompt_tokens + completion_tokens,
+                            "prompt_cache_hit_tokens": prompt_tokens // 2,
+                            "prompt_cache_miss_tokens": prompt_tokens - prompt_tokens // 2},
+            "model_name": "deepseek-chat",
+            "system_fingerprint": "fp_3a5770e1b4_prod0820_fp8_kvcache",
+            "finish_reason": "tool_calls" if tool_calls else "stop",
+            "logprobs": None,
+        },
+        usage_metadata={"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens},
+    )
+
+
+def synthetic_turns(rng: random.Random, turns: int) -> list[list]:
+    """Mensajes nuevos de cada turno de una conversación sintética"""
+    result = []
+    for _ in range(turns):
+        question = rng.choice(QUESTIONS).format(
+            a=rng.choice(AIRPORTS), b=rng.choice(AIRPORTS), c=rng.choice(CITIES), d=f"{_date(rng):%d/%m}"
+        )
+        messages = [HumanMessage(content=question, id=str(uuid.UUID(int=rng.getrandbits(128))))]
+        for _ in range(rng.randint(0, 2)):
+            name = rng.choice(list(TOOLS))
+            header, make_args = TOOLS[name]
+            call_id = f"call_{rng.getrandbits(96):024x}"
+            messages.append(_ai(rng, "", [{"name": name, "args": make_args(rng), "id": call_id, "type": "tool_call"}]))
+            messages.append(ToolMessage(content=_tool_result(rng, name, header), name=name, tool_call_id=call_id,
+                                        id=str(uuid.UUID(int=rng.getrandbits(128)))))
+        messages.append(_ai(rng, "He encontrado estas opciones para tu viaje. " * rng.randint(1, 6), []))
+        result.append(messages)
+    return result
+
+
+def synthetic_user_info(rng: random.Random) -> str:
+    header = "ticket_no|book_ref|flight_id|flight_no|departure_airport|arrival_airport|scheduled_departure|scheduled_arrival|seat_no|fare_conditions"
+    rows = []
+    for _ in range(rng.randint(1, 4)):
+        dep = _date(rng)
+        rows.append(f"{rng.randrange(10**12):013d}|{rng.getrandbits(24):06X}|{rng.randrange(10**6)}|PG{rng.randrange(1000):04d}|"
+                    f"{rng.choice(AIRPORTS)}|{rng.choice(AIRPORTS)}|{dep:%Y-%m-%dT%H:%M}|"
+                    f"{dep + timedelta(hours=3):%Y-%m-%dT%H:%M}|{rng.randint(1, 30)}{rng.choice('ABCDEF')}|Economy")
+    return "\n".join([f"{len(rows)} resultados", header, *rows])
+
+
+def synthetic_samples(count: int, seed: int = 0) -> list[bytes]:
+    """Blobs msgpack de checkpoints sintéticos (canales y writes de cada turno)"""
+    rng = random.Random(seed)
+    serde = JsonPlusSerializer()
+    samples = []
+    while len(samples) < count:
+        history = []
+        user_info = synthetic_user_info(rng)
+        for new_messages in synthetic_turns(rng, rng.randint(2, 8)):
+            history = history + new_messages
+            for value in (history, new_messages, user_info, ["primary_assistant", "flight_assistant"]):
+                typ, data = serde.dumps_typed(value)
+                if typ == "msgpack":
+                    samples.append(data)
+    return samples[:count]
+
+
+def database_samples(limit: int) -> list[bytes]:
+    serde = CompactSerializer.from_database()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        (SELECT type, blob FROM checkpoint_blobs WHERE type LIKE 'msgpack%%' ORDER BY random() LIMIT %s)
+        UNION ALL
+        (SELECT type, blob FROM checkpoint_writes WHERE type LIKE 'msgpack%%' ORDER BY random() LIMIT %s)
+        """,
+        (limit // 2, limit // 2),
+    )
+    samples = []
+    for typ, blob in cursor.fetchall():
+        blob = bytes(blob)
+        samples.append(serde.decompress(blob) if typ.endswith(COMPRESSED_SUFFIX) else blob)
+    conn.close()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrena el diccionario zstd de los checkpoints")
+    parser.add_argument("--size", type=int, default=32 * 1024, help="Tamaño del diccionario en bytes")
+    parser.add_argument("--max-samples", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    samples = database_samples(args.max_samples)
+    real = len(samples)
+    if real < MIN_SAMPLES:
+        samples += synthetic_samples(MIN_SAMPLES - real, args.seed)
+    print(f"📦 {len(samples):,} muestras ({real:,} reales, {len(samples) - real:,} sintéticas)")
+
+    dictionary = zstandard.train_dictionary(args.size, samples)
+    raw = sum(len(sample) for sample in samples)
+    plain = zstandard.ZstdCompressor(level=3)
+    trained = zstandard.ZstdCompressor(level=3, dict_data=dictionary)
+    without = sum(len(plain.compress(sample)) for sample in samples)
+    with_dict = sum(len(trained.compress(sample)) for sample in samples)
+    print(f"   msgpack {raw / 1024:,.0f} KiB → zstd {without / 1024:,.0f} KiB → zstd+diccionario {with_dict / 1024:,.0f} KiB")
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(DICTIONARY_TABLE_SQL)
+    cursor.execute(
+        "INSERT INTO checkpoint_dictionaries (dict_id, samples, data) VALUES (%s, %s, %s) ON CONFLICT DO NOTHING",
+        (dictionary.dict_id(), len(samples), dictionary.as_bytes()),
+    )
+    conn.commit()
+    conn.close()
+    print(f"✅ Diccionario {dictionary.dict_id()} guardado ({len(dictionary.as_bytes()) / 1024:.0f} KiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,13 @@
 from .flights_tools import (
     fetch_user_flight_information,
     search_flights,
+    search_connecting_flights,
     cancel_ticket,
     update_ticket_to_new_flight,
-    register_new_flight
+    cancel_booking,
+    rebook_booking,
+    register_new_flight,
+    register_group_flight
 )
 
 from .car_tools import (
@@ -26,26 +30,30 @@ from .excursion_tools import (
 )
 
 from .policy_tools import lookup_policy
+from .pagination import next_page
 
 
 
 
 primary_assistant_tools = [ fetch_user_flight_information, lookup_policy]
 
-flight_safe_tools = [search_flights, lookup_policy]
+flight_safe_tools = [search_flights, search_connecting_flights, lookup_policy]
 flight_sensitive_tools = [
     update_ticket_to_new_flight,
     cancel_ticket,
+    rebook_booking,
+    cancel_booking,
     register_new_flight,
+    register_group_flight,
 ]
 
-car_rental_safe_tools = [search_car_rentals,buscar_carros_rentados, lookup_policy]
+car_rental_safe_tools = [search_car_rentals,buscar_carros_rentados, next_page, lookup_policy]
 car_rental_sensitive_tools = [book_car_rental, cancel_car_rental]
 
-hotel_safe_tools = [search_hotels, lookup_policy]
+hotel_safe_tools = [search_hotels, next_page, lookup_policy]
 hotel_sensitive_tools = [book_hotel, cancel_hotel]
 
-excursion_safe_tools = [search_trip_recommendations, lookup_policy]
+excursion_safe_tools = [search_trip_recommendations, next_page, lookup_policy]
 excursion_sensitive_tools = [book_excursion, cancel_excursion]
 
 
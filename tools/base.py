@@ -0,0 +1,313 @@
+"""Funciones helper comunes para las tools"""
+import logging
+import re
+import unicodedata
+from datetime import date, datetime, timedelta
+from typing import Optional, Union
+
+import psycopg2
+from langchain_core.runnables import RunnableConfig
+from psycopg2.pool import PoolError
+
+from config.replica import mark_primary_write
+from tools.cache import notify_change_sql, search_cache
+
+logger = logging.getLogger(__name__)
+
+# Tablas de las reservas por rango de fechas (ver scripts/setup_business_db.py)
+RANGE_BOOKINGS = {
+    "hotel": {
+        "items": "hotels",
+        "inventory": "hotel_inventory",
+        "reservations": "hotel_reservations",
+        "key": "hotel_id",
+        "start": "checkin_date",
+        "end": "checkout_date",
+    },
+    "car": {
+        "items": "car_rentals",
+        "inventory": "car_inventory",
+        "reservations": "car_reservations",
+        "key": "car_rental_id",
+        "start": "start_date",
+        "end": "end_date",
+    },
+}
+
+# Errores que suelen desaparecer al reintentar (conexión caída, deadlock, pool
+# lleno): las tools sensibles los dejan pasar para que la outbox reintente
+TRANSIENT_DB_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, PoolError)
+
+# Palabras vacías que no aportan a los índices en memoria
+STOPWORDS = frozenset(
+    "a al algo con de del el en es la las lo los o para por que quiero se su sus un una y".split()
+)
+
+
+def get_passenger_id(config: RunnableConfig) -> str:
+    """Extrae el passenger_id del config o lanza un error"""
+    passenger_id = config.get("configurable", {}).get("passenger_id")
+    if not passenger_id:
+        raise ValueError("No se ha configurado un ID de pasajero.")
+    return passenger_id
+
+
+def get_request_key(config: Optional[RunnableConfig]) -> Optional[str]:
+    """
+    Clave de idempotencia de la acción (la pone graph/outbox.py). Con ella un
+    reintento de la misma acción devuelve el resultado original en lugar de
+    repetir la escritura; fuera de la outbox es None.
+    """
+    return config.get("configurable", {}).get("request_key") if config else None
+
+
+def fence_primary_write(conn):
+    """
+    Tras confirmar una escritura sensible: las lecturas siguientes, también
+    las de las tools seguras del mismo turno, no van a una réplica sin ella.
+    La escritura ya está hecha, así que un fallo aquí solo se registra.
+    """
+    try:
+        mark_primary_write(conn)
+    except Exception:
+        logger.warning("No se pudo avanzar el fence de lectura tras una escritura", exc_info=True)
+
+
+def fuzzy_filters(filters: dict[str, Optional[str]]) -> tuple[str, str, dict]:
+    """
+    Construye condiciones de búsqueda difusa (pg_trgm + unaccent).
+
+    Cada filtro compara search_key(valor) con search_key(columna) usando
+    word similarity, así "paris" encuentra "París" y "madrid" encuentra
+    "Madrid Airport". Las condiciones usan los índices GIN trigram que crea
+    scripts/setup_business_db.py.
+
+    Args:
+        filters: {columna: valor}; los valores vacíos se ignoran
+
+    Returns:
+        (where, order_by, params) para usar con parámetros con nombre
+    """
+    conditions = ["1=1"]
+    params = {}
+    for column, value in filters.items():
+        if not value:
+            continue
+        params[column] = value
+        conditions.append(f"search_key(%({column})s) <%% search_key({column})")
+
+    score = fuzzy_score(filters)
+    order_by = f"{score} DESC, id" if score else "id"
+    return " AND ".join(conditions), order_by, params
+
+
+def fuzzy_score(filters: dict[str, Optional[str]]) -> Optional[str]:
+    """Expresión de relevancia de fuzzy_filters (None si no hay filtros)"""
+    scores = [
+        f"word_similarity(search_key(%({column})s), search_key({column}))"
+        for column, value in filters.items()
+        if value
+    ]
+    return " + ".join(scores) if scores else None
+
+
+def search_tokens(text: str) -> list[str]:
+    """Palabras en minúsculas y sin acentos, sin palabras vacías"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    plain = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return [word for word in re.findall(r"\w+", plain) if word not in STOPWORDS]
+
+
+def stay_range(
+    start: Union[datetime, date, str],
+    end: Optional[Union[datetime, date, str]] = None,
+) -> tuple[date, date]:
+    """
+    Normaliza un rango de fechas [start, end) a fechas sin hora.
+    Si no hay fecha de fin se asume un solo día.
+    """
+    def as_date(value) -> date:
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        return value.date() if isinstance(value, datetime) else value
+
+    start_day = as_date(start)
+    end_day = as_date(end) if end else start_day + timedelta(days=1)
+    if end_day <= start_day:
+        raise ValueError("La fecha de fin debe ser posterior a la fecha de inicio.")
+    return start_day, end_day
+
+
+def availability_filter(table: str, inventory: str, key: str) -> tuple[str, str]:
+    """
+    Condición de disponibilidad sobre el inventario diario.
+
+    Un item está disponible si ningún día de [%(start_date)s, %(end_date)s)
+    tiene todas sus unidades reservadas. Los días sin fila en el inventario no
+    tienen reservas. Ambas expresiones usan la PK (key, day) del inventario.
+
+    Returns:
+        (condición para el WHERE, expresión con las unidades libres en el rango)
+    """
+    days = (
+        f"inv.{key} = {table}.id "
+        f"AND inv.day >= %(start_date)s AND inv.day < %(end_date)s"
+    )
+    condition = (
+        f"NOT EXISTS (SELECT 1 FROM {inventory} inv "
+        f"WHERE {days} AND inv.reserved >= {table}.capacity)"
+    )
+    available = (
+        f"{table}.capacity - COALESCE("
+        f"(SELECT max(inv.reserved) FROM {inventory} inv WHERE {days}), 0)"
+    )
+    return condition, available
+
+
+def reserve_range(conn, kind: str, item_id: int, passenger_id: str,
+                  start: date, end: date, request_key: Optional[str] = None) -> tuple[bool, Optional[int]]:
+    """
+    Reserva una unidad de un item para cada día de [start, end) de forma atómica.
+
+    Cada día se incrementa con INSERT ... ON CONFLICT DO UPDATE condicionado a
+    reserved < capacity: la fila del día queda bloqueada y la condición se
+    evalúa sobre su última versión, así dos reservas concurrentes nunca
+    superan la capacidad. Los días se bloquean en orden (sin deadlocks) y la
+    reserva solo se inserta si se obtuvieron todos los días; si no, se hace
+    rollback y no queda nada incrementado. Un rango ya agotado se descarta
+    antes de bloquear nada. La notificación de invalidación de la caché de
+    búsquedas viaja en la misma transacción y solo se entrega con el commit.
+
+    Con `request_key` (único en la tabla de reservas) la reserva es
+    idempotente: si ya existe una con esa clave se devuelve su id sin tocar
+    el inventario, y si otra ejecución de la misma acción la inserta a la
+    vez, ON CONFLICT DO NOTHING deja esta sin efecto (rollback).
+
+    Returns:
+        (existe el item, id de la reserva o None si no hay disponibilidad)
+    """
+    t = RANGE_BOOKINGS[kind]
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"""
+            WITH item AS (
+                SELECT id, capacity FROM {t["items"]} WHERE id = %(item_id)s
+            ),
+            existing AS (
+                SELECT id FROM {t["reservations"]} WHERE request_key = %(request_key)s
+            ),
+            taken AS (
+                INSERT INTO {t["inventory"]} ({t["key"]}, day, reserved)
+                SELECT item.id, day::date, 1
+                FROM item, generate_series(%(start)s::date, %(end)s::date - 1, interval '1 day') AS day
+                WHERE item.capacity > 0
+                  AND NOT EXISTS (SELECT 1 FROM existing)
+                  -- Si algún día ya está lleno no se toca (ni bloquea) ninguna fila
+                  AND NOT EXISTS (
+                      SELECT 1 FROM {t["inventory"]} inv
+                      WHERE inv.{t["key"]} = item.id
+                        AND inv.day >= %(start)s AND inv.day < %(end)s
+                        AND inv.reserved >= item.capacity
+                  )
+                ORDER BY day
+                ON CONFLICT ({t["key"]}, day) DO UPDATE
+                    SET reserved = {t["inventory"]}.reserved + 1
+                    WHERE {t["inventory"]}.reserved < (SELECT capacity FROM item)
+                RETURNING day
+            ),
+            reservation AS (
+                INSERT INTO {t["reservations"]} ({t["key"]}, passenger_id, {t["start"]}, {t["end"]}, request_key)
+                SELECT id, %(passenger_id)s, %(start)s, %(end)s, %(request_key)s FROM item
+                WHERE (SELECT count(*) FROM taken) = %(days)s
+                ON CONFLICT (request_key) DO NOTHING
+                RETURNING id
+            )
+            SELECT EXISTS (SELECT 1 FROM item), (SELECT id FROM reservation),
+                   (SELECT id FROM existing),
+                   {notify_change_sql(t["inventory"])}
+            """,
+            {
+                "item_id": item_id,
+                "passenger_id": passenger_id,
+                "start": start,
+                "end": end,
+                "days": (end - start).days,
+                "request_key": request_key,
+            },
+        )
+        found, reservation_id, existing_id, _ = cursor.fetchone()
+        if reservation_id is None:
+            conn.rollback()
+        else:
+            conn.commit()
+            search_cache.invalidate(t["inventory"])
+            fence_primary_write(conn)
+        if reservation_id is None and request_key is not None:
+            if existing_id is None:
+                # La insertó a la vez otra ejecución de la misma acción
+                cursor.execute(
+                    f"SELECT id FROM {t['reservations']} WHERE request_key = %s", (request_key,)
+                )
+                row = cursor.fetchone()
+                conn.rollback()
+                existing_id = row[0] if row else None
+            reservation_id = existing_id
+        return found, reservation_id
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def release_range(conn, kind: str, reservation_id: int, passenger_id: str) -> str:
+    """
+    Cancela una reserva activa del pasajero y libera sus días en una sola sentencia.
+
+    Returns:
+        "cancelled", "not_found", "not_owner" o "not_active"
+    """
+    t = RANGE_BOOKINGS[kind]
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"""
+            WITH current AS (
+                SELECT passenger_id, status FROM {t["reservations"]} WHERE id = %(id)s
+            ),
+            cancelled AS (
+                UPDATE {t["reservations"]} SET status = 'cancelled'
+                WHERE id = %(id)s AND passenger_id = %(passenger_id)s AND status = 'active'
+                RETURNING {t["key"]}, {t["start"]}, {t["end"]}
+            ),
+            released AS (
+                UPDATE {t["inventory"]} inv SET reserved = inv.reserved - 1
+                FROM cancelled c
+                WHERE inv.{t["key"]} = c.{t["key"]}
+                  AND inv.day >= c.{t["start"]} AND inv.day < c.{t["end"]}
+                RETURNING 1
+            )
+            SELECT (SELECT passenger_id FROM current),
+                   (SELECT count(*) FROM cancelled),
+                   (SELECT count(*) FROM released),
+                   (SELECT {notify_change_sql(t["inventory"])} FROM cancelled)
+            """,
+            {"id": reservation_id, "passenger_id": passenger_id},
+        )
+        owner, cancelled, _, _ = cursor.fetchone()
+        conn.commit()
+        if cancelled:
+            search_cache.invalidate(t["inventory"])
+            fence_primary_write(conn)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    if owner is None:
+        return "not_found"
+    if owner != passenger_id:
+        return "not_owner"
+    return "cancelled" if cancelled else "not_active"
@@ -0,0 +1,201 @@
+"""
+Caché read-through para las tools de búsqueda.
+
+Las entradas se indexan por nombre de tool + argumentos normalizados y se
+etiquetan con las tablas que leen. Las reservas/cancelaciones hacen
+pg_notify('search_cache', '<tabla>') dentro de su transacción: Postgres solo
+entrega la notificación si hay commit, y cada proceso del bot la recibe en un
+hilo con LISTEN e invalida las entradas de esa tabla.
+
+Con réplica de lectura, el mismo hilo avanza el fence de config/replica.py
+antes de invalidar: la búsqueda que rellene la entrada no leerá de una
+réplica que aún no tiene el cambio.
+"""
+import copy
+import inspect
+import logging
+import os
+import select
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime
+from functools import wraps
+
+from config.database import DB_REPLICA_HOST, connect_dedicated
+from config.replica import READ_FENCE_CHANNEL, advance_read_fence
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "60"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2048"))
+CACHE_CHANNEL = "search_cache"
+
+
+def _normalize(value):
+    """Normaliza un argumento para la clave (sin acentos, minúsculas, fechas ISO)"""
+    if isinstance(value, str):
+        decomposed = unicodedata.normalize("NFKD", value.strip().casefold())
+        return "".join(c for c in decomposed if not unicodedata.combining(c))
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class SearchCache:
+    """Caché LRU con TTL e invalidación por tabla"""
+
+    def __init__(self, max_entries: int = SEARCH_CACHE_MAX_ENTRIES, ttl: float = SEARCH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expira, tablas, valor)
+        self._generations = defaultdict(int)  # tabla -> nº de invalidaciones
+        self._stats = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self._invalidations = 0
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def get(self, tool_name: str, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats[tool_name]["hits"] += 1
+                return True, entry[2]
+            if entry:
+                del self._entries[key]
+            self._stats[tool_name]["misses"] += 1
+            return False, None
+
+    def generation(self, tables: tuple[str, ...]) -> tuple[int, ...]:
+        with self._lock:
+            return tuple(self._generations[t] for t in tables)
+
+    def put(self, key: tuple, tables: tuple[str, ...], value, generation: tuple[int, ...]):
+        """Guarda el valor salvo que alguna tabla se haya invalidado mientras se calculaba"""
+        with self._lock:
+            if generation != tuple(self._generations[t] for t in tables):
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, tables, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, table: str):
+        with self._lock:
+            self._generations[table] += 1
+            self._invalidations += 1
+            stale = [key for key, (_, tables, _) in self._entries.items() if table in tables]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            for table in list(self._generations):
+                self._generations[table] += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Hits, misses y hit rate por tool"""
+        with self._lock:
+            per_tool = {}
+            for name, counters in self._stats.items():
+                total = counters["hits"] + counters["misses"]
+                per_tool[name] = {
+                    **counters,
+                    "hit_rate": counters["hits"] / total if total else 0.0,
+                }
+            return {
+                "entries": len(self._entries),
+                "invalidations": self._invalidations,
+                "tools": per_tool,
+            }
+
+    def ensure_listener(self):
+        """Arranca (una vez por proceso) el hilo que escucha las invalidaciones"""
+        if self._listener is None:
+            with self._lock:
+                if self._listener is None:
+                    self._listener = threading.Thread(
+                        target=self._listen, name="search-cache-listener", daemon=True
+                    )
+                    self._listener.start()
+
+    def _listen(self):
+        while True:
+            conn = None
+            try:
+                # Conexión propia: LISTEN la ocupa mientras viva el proceso
+                conn = connect_dedicated()
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f"LISTEN {CACHE_CHANNEL}")
+                if DB_REPLICA_HOST:
+                    cursor.execute(f"LISTEN {READ_FENCE_CHANNEL}")
+                # Lo cacheado antes de escuchar pudo perder notificaciones
+                self.clear()
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if DB_REPLICA_HOST and conn.notifies:
+                        # El commit que notificó ya está por debajo de esta posición
+                        cursor.execute("SELECT pg_current_wal_lsn()::text")
+                        advance_read_fence(cursor.fetchone()[0])
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        if notify.channel == READ_FENCE_CHANNEL:
+                            advance_read_fence(notify.payload)
+                        else:
+                            self.invalidate(notify.payload)
+            except Exception:
+                logger.exception("Listener de invalidación de caché caído, reintentando")
+                self.clear()
+                time.sleep(5)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+search_cache = SearchCache()
+
+
+def cached_search(*tables: str):
+    """
+    Decorador read-through para una búsqueda que lee `tables`.
+    Va debajo de @tool para que la tool conserve firma y docstring.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            search_cache.ensure_listener()
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (func.__name__,) + tuple(
+                (name, _normalize(value))
+                for name, value in sorted(bound.arguments.items())
+                if value is not None
+            )
+            hit, value = search_cache.get(func.__name__, key)
+            if hit:
+                return copy.deepcopy(value)
+            generation = search_cache.generation(tables)
+            value = func(*args, **kwargs)
+            search_cache.put(key, tables, copy.deepcopy(value), generation)
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def notify_change_sql(table: str) -> str:
+    """
+    Expresión SQL que avisa a todos los procesos de un cambio en `table`.
+    Se incluye en la misma sentencia que modifica los datos: si hay rollback
+    la notificación se descarta.
+    """
+    return f"pg_notify('{CACHE_CHANNEL}', '{table}')"
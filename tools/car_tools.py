@@ -1,90 +1,168 @@
 from datetime import date, datetime
 from typing import Optional, Union
 
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
-from config.database import get_db_connection
+from config.database import get_db_connection, get_read_connection
+from .cache import cached_search
+from .pagination import keyset_after, page_result, pager
+from .base import (
+    availability_filter,
+    fuzzy_filters,
+    fuzzy_score,
+    get_passenger_id,
+    get_request_key,
+    release_range,
+    reserve_range,
+    stay_range,
+)
+
+# Columnas que se devuelven al agente (sin booked/capacity internos)
+CAR_RENTALS_COLUMNS = "id, name, location, price_tier"
 
 
 @tool
+@cached_search("car_rentals", "car_inventory")
 def search_car_rentals(
     location: Optional[str] = None,
     name: Optional[str] = None,
     price_tier: Optional[str] = None,
     start_date: Optional[Union[datetime, date]] = None,
     end_date: Optional[Union[datetime, date]] = None,
-) -> list[dict]:
-    """Busca alquileres de coches."""
-    conn = get_db_connection()
+    limit: int = 20,
+) -> str:
+    """
+    Busca alquileres de coches por ubicación o compañía (sin importar acentos ni mayúsculas). Devuelve primero las mejores coincidencias.
+    Con start_date (y opcionalmente end_date) solo devuelve alquileres con coches libres todos los días del rango.
+    Si hay más resultados, la respuesta termina con un page_token para next_page.
+    """
+    return _search_car_rentals_page(
+        {
+            "location": location,
+            "name": name,
+            "price_tier": price_tier,
+            "start_date": start_date,
+            "end_date": end_date,
+            "limit": limit,
+        },
+        None,
+    )
+
+
+@pager("search_car_rentals")
+def _search_car_rentals_page(args: dict, after: Optional[list], config: Optional[RunnableConfig] = None) -> str:
+    """Una página de search_car_rentals a partir de la clave `after` (None = primera)"""
+    limit = args.get("limit", 20)
+    filters = {"location": args.get("location"), "name": args.get("name")}
+    where, order_by, params = fuzzy_filters(filters)
+    score = fuzzy_score(filters)
+    columns = CAR_RENTALS_COLUMNS
+    if args.get("price_tier"):
+        where += " AND lower(price_tier) = lower(%(price_tier)s)"
+        params["price_tier"] = args["price_tier"]
+    if args.get("start_date"):
+        params["start_date"], params["end_date"] = stay_range(args["start_date"], args.get("end_date"))
+        condition, available = availability_filter("car_rentals", "car_inventory", "car_rental_id")
+        where += f" AND {condition}"
+        columns += f", {available} AS available_cars"
+    where += keyset_after(score, "id", after, params)
+    # Clave de ordenación al final (no se muestra): (score, id) o solo id
+    columns += f", {score} AS rank, id AS key" if score else ", id AS key"
+    query = f"SELECT {columns} FROM car_rentals WHERE {where} ORDER BY {order_by} LIMIT %(limit)s"
+    params["limit"] = limit + 1
+
+    conn = get_read_connection()
     cursor = conn.cursor()
-    query = "SELECT * FROM car_rentals WHERE 1=1"
-    params = []
-    if location:
-        query += " AND location LIKE %s"
-        params.append(f"%{location}%")
-    if name:
-        query += " AND name LIKE %s"
-        params.append(f"%{name}%")
     cursor.execute(query, params)
-    results = cursor.fetchall()
-    
-    # Obtener nombres de columnas
-    column_names = [desc[0] for desc in cursor.description]
+    column_names = [column[0] for column in cursor.description]
+    rows = cursor.fetchall()
     conn.close()
-    
-    return [
-        dict(zip(column_names, row)) for row in results
-    ]
+    return page_result("search_car_rentals", args, column_names, rows, 2 if score else 1, limit)
 
-# Coches disponibles
+
+# Coches rentados por el pasajero
 @tool
-def buscar_carros_rentados() -> list[dict]:
+def buscar_carros_rentados(config: RunnableConfig, limit: int = 20) -> str:
     """
-    Busca todos los carros que están actualmente rentados/reservados (booked = true).
+    Busca los carros que el pasajero actual tiene rentados (reservas activas).
+    Si hay más resultados, la respuesta termina con un page_token para next_page.
     
     Returns:
-        Lista de todos los carros rentados con todos sus campos
+        Tabla de reservas activas con el número de reserva, fechas y datos del coche
     """
-    conn = get_db_connection()
+    return _buscar_carros_rentados_page({"limit": limit}, None, config)
+
+
+@pager("buscar_carros_rentados")
+def _buscar_carros_rentados_page(args: dict, after: Optional[list], config: RunnableConfig) -> str:
+    """Una página de las reservas activas del pasajero, por fecha de inicio"""
+    passenger_id = get_passenger_id(config)
+    limit = args.get("limit", 20)
+    params = {"passenger_id": passenger_id, "limit": limit + 1}
+    keyset = ""
+    if after:
+        keyset = "AND (r.start_date, r.id) > (%(after_date)s::date, %(after_key)s)"
+        params["after_date"], params["after_key"] = after
+
+    query = f"""
+        SELECT r.id AS reservation_id, r.start_date, r.end_date,
+               c.id AS car_rental_id, c.name, c.location, c.price_tier,
+               r.start_date AS sort_date, r.id AS key
+        FROM car_reservations r
+        JOIN car_rentals c ON c.id = r.car_rental_id
+        WHERE r.passenger_id = %(passenger_id)s AND r.status = 'active' {keyset}
+        ORDER BY r.start_date, r.id
+        LIMIT %(limit)s
+    """
+    conn = get_read_connection()
     cursor = conn.cursor()
-    
-    # Solo carros rentados - PostgreSQL usa true/false en lugar de 1/0
-    query = "SELECT * FROM car_rentals WHERE booked = true"
-    
-    cursor.execute(query)
-    results = cursor.fetchall()
-    
-    # Obtener nombres de columnas
+    cursor.execute(query, params)
     column_names = [desc[0] for desc in cursor.description]
+    rows = cursor.fetchall()
     conn.close()
-    
-    return [
-        dict(zip(column_names, row)) for row in results
-    ]
+    return page_result("buscar_carros_rentados", args, column_names, rows, 2, limit)
 
 @tool
-def book_car_rental(rental_id: int) -> str:
-    """Reserva un alquiler de coche por su ID."""
+def book_car_rental(
+    rental_id: int,
+    start_date: Union[datetime, date],
+    end_date: Optional[Union[datetime, date]] = None,
+    config: RunnableConfig = None,
+) -> str:
+    """Reserva un coche de un alquiler por su ID para los días entre start_date y end_date."""
+    passenger_id = get_passenger_id(config)
+    start, end = stay_range(start_date, end_date)
+
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE car_rentals SET booked = true WHERE id = %s", (rental_id,))
-    conn.commit()
-    if cursor.rowcount > 0:
+    try:
+        found, reservation_id = reserve_range(conn, "car", rental_id, passenger_id, start, end,
+                                                 get_request_key(config))
+    finally:
         conn.close()
-        return f"Alquiler de coche {rental_id} reservado con éxito."
-    conn.close()
-    return f"No se encontró un alquiler de coche con ID {rental_id}."
+
+    if not found:
+        return f"No se encontró un alquiler de coche con ID {rental_id}."
+    if reservation_id is None:
+        return f"El alquiler {rental_id} no tiene coches libres todos los días del {start} al {end}."
+    return f"Alquiler de coche {rental_id} reservado con éxito del {start} al {end}. Número de reserva: {reservation_id}."
 
 
 @tool
-def cancel_car_rental(rental_id: int) -> str:
-    """Cancela una reserva de alquiler de coche por su ID."""
+def cancel_car_rental(reservation_id: int, config: RunnableConfig) -> str:
+    """Cancela una reserva de alquiler de coche del pasajero actual por su número de reserva."""
+    passenger_id = get_passenger_id(config)
+
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE car_rentals SET booked = false WHERE id = %s", (rental_id,))
-    conn.commit()
-    if cursor.rowcount > 0:
+    try:
+        outcome = release_range(conn, "car", reservation_id, passenger_id)
+    finally:
         conn.close()
-        return f"Reserva de alquiler de coche {rental_id} cancelada con éxito."
-    conn.close()
-    return f"No se encontró un alquiler de coche con ID {rental_id}."
+
+    if outcome == "not_found":
+        return f"No se encontró la reserva de alquiler de coche {reservation_id}."
+    if outcome == "not_owner":
+        return f"El pasajero actual no es el titular de la reserva de alquiler de coche {reservation_id}."
+    if outcome == "not_active":
+        return f"La reserva de alquiler de coche {reservation_id} ya estaba cancelada."
+    return f"Reserva de alquiler de coche {reservation_id} cancelada con éxito."
 
@@ -0,0 +1,63 @@
+"""
+Codificación compacta de los resultados de las tools para el LLM.
+
+En lugar de una lista de dicts (nombres de columna repetidos en cada fila y
+fechas que json.dumps no sabe serializar), las tools de búsqueda devuelven
+una tabla de texto: una cabecera con las columnas y una fila por resultado,
+separadas por "|", con fechas ISO 8601 y celdas vacías para NULL.
+
+    2 resultados
+    flight_id|flight_no|departure_airport|arrival_airport|scheduled_departure|scheduled_arrival
+    F001|AA100|MAD|CDG|2025-11-01T10:00|2025-11-01T12:00
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Iterable, Sequence
+
+NO_RESULTS = "Sin resultados."
+SEPARATOR = "|"
+
+
+def format_value(value: Any) -> str:
+    """Celda de la tabla: ISO para fechas, vacío para NULL, sin separadores ni saltos"""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        exact_minute = not value.second and not value.microsecond
+        return value.isoformat(timespec="minutes" if exact_minute else "seconds")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (float, Decimal)):
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    if isinstance(value, (list, tuple)):
+        return ",".join(format_value(item) for item in value)
+    text = str(value)
+    if SEPARATOR in text or "\n" in text:
+        text = text.replace(SEPARATOR, "/").replace("\n", " ")
+    return text
+
+
+def encode_rows(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> str:
+    """Tabla compacta con cabecera a partir de filas de un cursor"""
+    lines = [SEPARATOR.join(format_value(value) for value in row) for row in rows]
+    if not lines:
+        return NO_RESULTS
+    label = "resultado" if len(lines) == 1 else "resultados"
+    return "\n".join([f"{len(lines)} {label}", SEPARATOR.join(columns), *lines])
+
+
+def encode_cursor(cursor) -> str:
+    """Tabla compacta con todas las filas pendientes del cursor"""
+    columns = [column[0] for column in cursor.description]
+    return encode_rows(columns, cursor.fetchall())
+
+
+def json_default(value: Any) -> Any:
+    """`default` de json.dumps: fechas en ISO y el resto como texto"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
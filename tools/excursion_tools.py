@@ -1,64 +1,170 @@
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from typing import Optional
-from config.database import get_db_connection
+from config.database import get_db_connection, get_read_connection
+from .base import fence_primary_write, fuzzy_filters, fuzzy_score, get_passenger_id, get_request_key
+from .cache import cached_search, notify_change_sql, search_cache
+from .pagination import keyset_after, page_result, pager
+from .recommendation_index import recommendation_index
+
+# Máximo de filas de una ciudad/nombre que se puntúan por keywords
+MAX_KEYWORD_CANDIDATES = 50_000
+# Columnas que se devuelven al agente: plazas libres en lugar de capacity/reserved
+RECOMMENDATION_COLUMNS = "id, name, location, details, capacity - reserved AS available_spots"
 
 @tool
+@cached_search("trip_recommendations")
 def search_trip_recommendations(
     location: Optional[str] = None,
     name: Optional[str] = None,
     keywords: Optional[str] = None,
-) -> list[dict]:
-    """Busca recomendaciones de viajes y excursiones."""
-    conn = get_db_connection()
+    limit: int = 20,
+) -> str:
+    """Busca recomendaciones de viajes y excursiones por ubicación o nombre (sin importar acentos ni mayúsculas) y por keywords en texto libre (p. ej. "algo cultural con museos"). Devuelve primero las mejores coincidencias. Si hay más resultados, la respuesta termina con un page_token para next_page."""
+    return _search_trip_recommendations_page(
+        {"location": location, "name": name, "keywords": keywords, "limit": limit}, None
+    )
+
+
+@pager("search_trip_recommendations")
+def _search_trip_recommendations_page(args: dict, after: Optional[list],
+                                      config: Optional[RunnableConfig] = None) -> str:
+    """Una página de search_trip_recommendations a partir de la clave `after` (None = primera)"""
+    limit = args.get("limit", 20)
+    filters = {"location": args.get("location"), "name": args.get("name")}
+    where, order_by, params = fuzzy_filters(filters)
+    conn = get_read_connection()
     cursor = conn.cursor()
-    query = "SELECT * FROM trip_recommendations WHERE 1=1"
-    params = []
-    if location:
-        query += " AND location LIKE %s"
-        params.append(f"%{location}%")
-    if name:
-        query += " AND name LIKE %s"
-        params.append(f"%{name}%")
-    if keywords:
-        # Implementar búsqueda por keywords si es necesario
-        pass
-    cursor.execute(query, params)
-    results = cursor.fetchall()
-    
-    # Obtener nombres de columnas
-    column_names = [desc[0] for desc in cursor.description]
+    if args.get("keywords"):
+        # Ranking semántico en memoria; los filtros de texto acotan los candidatos
+        candidate_ids = None
+        if params:
+            cursor.execute(
+                f"SELECT id FROM trip_recommendations WHERE {where} LIMIT {MAX_KEYWORD_CANDIDATES}",
+                params,
+            )
+            candidate_ids = [row[0] for row in cursor.fetchall()]
+        ranked = recommendation_index.search(
+            args["keywords"], limit + 1, candidate_ids, tuple(after) if after else None
+        )
+        keys = {rec_id: (sim, rec_id) for rec_id, sim in ranked}
+        cursor.execute(
+            f"SELECT {RECOMMENDATION_COLUMNS} FROM trip_recommendations WHERE id = ANY(%s)", (list(keys),)
+        )
+        # Mismo orden que el índice: (similitud desc, id)
+        rows = sorted((row + keys[row[0]] for row in cursor.fetchall()), key=lambda row: (-row[-2], row[-1]))
+        column_names = [desc[0] for desc in cursor.description] + ["similarity", "key"]
+        key_width = 2
+    else:
+        score = fuzzy_score(filters)
+        where += keyset_after(score, "id", after, params)
+        keys = f"{score} AS rank, id AS key" if score else "id AS key"
+        query = f"SELECT {RECOMMENDATION_COLUMNS}, {keys} FROM trip_recommendations WHERE {where} ORDER BY {order_by} LIMIT %(limit)s"
+        params["limit"] = limit + 1
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        column_names = [desc[0] for desc in cursor.description]
+        key_width = 2 if score else 1
     conn.close()
-    
-    return [
-        dict(zip(column_names, row)) for row in results
-    ]
+    return page_result("search_trip_recommendations", args, column_names, rows, key_width, limit)
 
 @tool
-def book_excursion(recommendation_id: int) -> str:
-    """Reserva una excursión por su ID."""
+def book_excursion(recommendation_id: int, config: RunnableConfig) -> str:
+    """Reserva una plaza en una excursión por su ID."""
+    passenger_id = get_passenger_id(config)
+    request_key = get_request_key(config)
     conn = get_db_connection()
+    # Una sola sentencia: el incremento condicional bloquea la fila solo
+    # mientras dura la transacción y nunca supera la capacidad. Con
+    # request_key, un reintento de la misma acción devuelve la reserva original.
     cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE trip_recommendations SET booked = true WHERE id = %s", (recommendation_id,)
-    )
-    conn.commit()
-    if cursor.rowcount > 0:
+    try:
+        cursor.execute(
+            """
+            WITH existing AS (
+                SELECT id FROM excursion_reservations WHERE request_key = %(request_key)s
+            ),
+            taken AS (
+                UPDATE trip_recommendations SET reserved = reserved + 1
+                WHERE id = %(id)s AND reserved < capacity AND NOT EXISTS (SELECT 1 FROM existing)
+                RETURNING id
+            ),
+            reservation AS (
+                INSERT INTO excursion_reservations (recommendation_id, passenger_id, request_key)
+                SELECT id, %(passenger_id)s, %(request_key)s FROM taken
+                ON CONFLICT (request_key) DO NOTHING
+                RETURNING id
+            )
+            SELECT EXISTS (SELECT 1 FROM trip_recommendations WHERE id = %(id)s),
+                   (SELECT id FROM reservation), (SELECT id FROM existing),
+                   (SELECT {notify} FROM reservation)
+            """.replace("{notify}", notify_change_sql("trip_recommendations")),
+            {"id": recommendation_id, "passenger_id": passenger_id, "request_key": request_key},
+        )
+        found, reservation_id, existing_id, _ = cursor.fetchone()
+        if reservation_id is None:
+            # Sin plaza, o la reserva ya existía: el incremento (si lo hubo) se deshace
+            conn.rollback()
+            if request_key is not None and existing_id is None:
+                cursor.execute("SELECT id FROM excursion_reservations WHERE request_key = %s", (request_key,))
+                row = cursor.fetchone()
+                conn.rollback()
+                existing_id = row[0] if row else None
+        else:
+            conn.commit()
+            fence_primary_write(conn)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
         conn.close()
-        return f"Excursión {recommendation_id} reservada con éxito."
-    conn.close()
-    return f"No se encontró una excursión con ID {recommendation_id}."
+    if reservation_id is not None:
+        search_cache.invalidate("trip_recommendations")
+    elif request_key is not None:
+        reservation_id = existing_id
+    if not found:
+        return f"No se encontró una excursión con ID {recommendation_id}."
+    if reservation_id is None:
+        return f"La excursión {recommendation_id} no tiene plazas libres."
+    return f"Excursión {recommendation_id} reservada con éxito. Número de reserva: {reservation_id}."
 
 @tool
-def cancel_excursion(recommendation_id: int) -> str:
-    """Cancela una reserva de excursión por su ID."""
+def cancel_excursion(reservation_id: int, config: RunnableConfig) -> str:
+    """Cancela una reserva de excursión del pasajero actual por su número de reserva."""
+    passenger_id = get_passenger_id(config)
     conn = get_db_connection()
+    conn.autocommit = True
     cursor = conn.cursor()
     cursor.execute(
-        "UPDATE trip_recommendations SET booked = false WHERE id = %s", (recommendation_id,)
+        """
+        WITH current AS (
+            SELECT passenger_id FROM excursion_reservations WHERE id = %(id)s
+        ),
+        cancelled AS (
+            UPDATE excursion_reservations SET status = 'cancelled'
+            WHERE id = %(id)s AND passenger_id = %(passenger_id)s AND status = 'active'
+            RETURNING recommendation_id
+        ),
+        released AS (
+            UPDATE trip_recommendations t SET reserved = t.reserved - 1
+            FROM cancelled c WHERE t.id = c.recommendation_id
+            RETURNING 1
+        )
+        SELECT (SELECT passenger_id FROM current), (SELECT count(*) FROM released),
+               (SELECT {notify} FROM released)
+        """.replace("{notify}", notify_change_sql("trip_recommendations")),
+        {"id": reservation_id, "passenger_id": passenger_id},
     )
-    conn.commit()
-    if cursor.rowcount > 0:
-        conn.close()
-        return f"Reserva de excursión {recommendation_id} cancelada con éxito."
+    owner, released, _ = cursor.fetchone()
+    if released:
+        fence_primary_write(conn)
     conn.close()
-    return f"No se encontró una excursión con ID {recommendation_id}."
\ No newline at end of file
+    if released:
+        search_cache.invalidate("trip_recommendations")
+    if owner is None:
+        return f"No se encontró la reserva de excursión {reservation_id}."
+    if owner != passenger_id:
+        return f"El pasajero actual no es el titular de la reserva de excursión {reservation_id}."
+    if not released:
+        return f"La reserva de excursión {reservation_id} ya estaba cancelada."
+    return f"Reserva de excursión {reservation_id} cancelada con éxito."
\ No newline at end of file
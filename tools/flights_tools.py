@@ -1,59 +1,69 @@
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from typing import Optional
 import uuid
 import hashlib
+import json
 
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from typing import Optional
-from config.database import get_db_connection
+from psycopg2 import errors
+from psycopg2.extras import execute_values
+from config.database import get_db_connection, get_read_connection
+from .base import TRANSIENT_DB_ERRORS, fence_primary_write, get_request_key
+from .cache import cached_search, notify_change_sql, search_cache
+from .encoding import NO_RESULTS, encode_cursor, encode_rows, json_default
+from .route_index import route_index
+from .seat_allocator import NoSeatsAvailable, allocate_seats
+
+# Columnas que se devuelven al agente de cada vuelo
+FLIGHT_COLUMNS = "flight_id, flight_no, departure_airport, arrival_airport, scheduled_departure, scheduled_arrival"
 
 
 @tool
-def fetch_user_flight_information(config: RunnableConfig) -> list[dict]:
+def fetch_user_flight_information(config: RunnableConfig) -> str:
     """Obtiene toda la información de vuelos y asientos para el usuario actual."""
     passenger_id = config.get("configurable", {}).get("passenger_id")
     if not passenger_id:
         raise ValueError("No se ha configurado un ID de pasajero.")
 
-    conn = get_db_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
+    # Read model mantenido por triggers (scripts/setup_business_db.py):
+    # un único range scan sobre la PK (passenger_id, ticket_no, flight_id)
     query = """
-    SELECT t.ticket_no, t.book_ref, f.flight_id, f.flight_no, f.departure_airport, f.arrival_airport, f.scheduled_departure, f.scheduled_arrival, bp.seat_no, tf.fare_conditions
-    FROM tickets t
-    JOIN ticket_flights tf ON t.ticket_no = tf.ticket_no
-    JOIN flights f ON tf.flight_id = f.flight_id
-    JOIN boarding_passes bp ON bp.ticket_no = t.ticket_no AND bp.flight_id = f.flight_id
-    WHERE t.passenger_id = %s
+    SELECT ticket_no, book_ref, flight_id, flight_no, departure_airport, arrival_airport, scheduled_departure, scheduled_arrival, seat_no, fare_conditions
+    FROM passenger_itineraries
+    WHERE passenger_id = %s
+    ORDER BY ticket_no, flight_id
     """
     cursor.execute(query, (passenger_id,))
-    rows = cursor.fetchall()
-    column_names = [column[0] for column in cursor.description]
-    results = [dict(zip(column_names, row)) for row in rows]
+    results = encode_cursor(cursor)
     cursor.close()
     conn.close()
     return results
 
 
 @tool
+@cached_search("flights")
 def search_flights(
     departure_airport: Optional[str] = None,
     arrival_airport: Optional[str] = None,
     start_time: Optional[date | datetime] = None,
     end_time: Optional[date | datetime] = None,
     limit: int = 20,
-) -> list[dict]:
-    """Busca vuelos basados en el aeropuerto de salida, llegada y rango de fechas."""
-    conn = get_db_connection()
+) -> str:
+    """Busca vuelos basados en el aeropuerto de salida, llegada (códigos IATA) y rango de fechas."""
+    conn = get_read_connection()
     cursor = conn.cursor()
-    query = "SELECT * FROM flights WHERE 1 = 1"
+    query = f"SELECT {FLIGHT_COLUMNS} FROM flights WHERE 1 = 1"
     params = []
     if departure_airport:
         query += " AND departure_airport = %s"
-        params.append(departure_airport)
+        params.append(departure_airport.strip().upper())
     if arrival_airport:
         query += " AND arrival_airport = %s"
-        params.append(arrival_airport)
+        params.append(arrival_airport.strip().upper())
     if start_time:
         query += " AND scheduled_departure >= %s"
         params.append(start_time)
@@ -63,63 +73,316 @@ def search_flights(
     query += " LIMIT %s"
     params.append(limit)
     cursor.execute(query, params)
-    rows = cursor.fetchall()
-    column_names = [column[0] for column in cursor.description]
-    results = [dict(zip(column_names, row)) for row in rows]
+    results = encode_cursor(cursor)
     cursor.close()
     conn.close()
     return results
 
 
 @tool
-def update_ticket_to_new_flight(
-    ticket_no: str, new_flight_id: int, config: RunnableConfig
+@cached_search("flights")
+def search_connecting_flights(
+    departure_airport: str,
+    arrival_airport: str,
+    start_time: date | datetime,
+    end_time: Optional[date | datetime] = None,
+    max_stops: int = 2,
+    min_layover_minutes: int = 45,
+    max_layover_minutes: int = 360,
+    sort_by: str = "duration",
+    limit: int = 10,
 ) -> str:
-    """Actualiza el billete de un pasajero a un nuevo vuelo."""
-    passenger_id = config.get("configurable", {}).get("passenger_id")
-    if not passenger_id:
-        raise ValueError("No se ha configurado un ID de pasajero.")
+    """Busca itinerarios con 0, 1 o 2 escalas entre dos aeropuertos (códigos IATA), útil cuando no hay vuelo directo. El primer vuelo sale entre start_time y end_time (por defecto, ese mismo día). sort_by: "duration" (duración total) o "departure" (hora de salida). Devuelve una fila por vuelo: las filas con el mismo `option` forman un itinerario y `layover_minutes` es la espera antes de ese vuelo."""
+    if not isinstance(start_time, datetime):
+        start_time = datetime.combine(start_time, datetime.min.time())
+        end_time = end_time or start_time + timedelta(days=1)
+    if end_time is None:
+        end_time = start_time + timedelta(days=1)
+    elif not isinstance(end_time, datetime):
+        end_time = datetime.combine(end_time, datetime.max.time())
+
+    candidates = route_index.connections(
+        departure_airport.strip().upper(),
+        arrival_airport.strip().upper(),
+        start_time,
+        end_time,
+        max_stops=max(0, min(max_stops, 2)),
+        min_layover=timedelta(minutes=min_layover_minutes),
+        max_layover=timedelta(minutes=max_layover_minutes),
+        sort_by=sort_by,
+        # Margen por si algún vuelo del índice ya no existe
+        limit=limit * 2,
+    )
+    if not candidates:
+        return NO_RESULTS
 
-    conn = get_db_connection()
+    # Los datos que se devuelven salen de la base de datos, no del índice
+    conn = get_read_connection()
     cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT {FLIGHT_COLUMNS} FROM flights WHERE flight_id = ANY(%s)",
+        (list({leg.flight_id for legs in candidates for leg in legs}),),
+    )
+    column_names = [column[0] for column in cursor.description]
+    flights = {row[0]: dict(zip(column_names, row)) for row in cursor.fetchall()}
+    cursor.close()
+    conn.close()
+    # Vuelos borrados que el índice aún tenía
+    route_index.forget({leg.flight_id for legs in candidates for leg in legs} - flights.keys())
+
+    # Una fila por vuelo: option, escalas y duración total se repiten en cada tramo
+    rows = []
+    options = 0
+    for legs in candidates:
+        if not all(leg.flight_id in flights for leg in legs):
+            continue
+        details = [flights[leg.flight_id] for leg in legs]
+        options += 1
+        total = int((details[-1]["scheduled_arrival"] - details[0]["scheduled_departure"]).total_seconds() // 60)
+        previous = None
+        for flight in details:
+            layover = (
+                int((flight["scheduled_departure"] - previous["scheduled_arrival"]).total_seconds() // 60)
+                if previous else None
+            )
+            rows.append((options, len(legs) - 1, total, layover, *flight.values()))
+            previous = flight
+        if options == limit:
+            break
+    return encode_rows(
+        ["option", "stops", "total_duration_minutes", "layover_minutes", *column_names], rows
+    )
 
-    cursor.execute("SELECT passenger_id FROM tickets WHERE ticket_no = %s", (ticket_no,))
-    ticket_owner = cursor.fetchone()
 
-    if not ticket_owner:
-        cursor.close()
-        conn.close()
-        return f"No se encontró el billete con el número {ticket_no}."
+# Filtros de billetes para las sentencias de cambio y cancelación
+SINGLE_TICKET = "ticket_no = %(ticket_no)s"
+BOOKING_TICKETS = (
+    "book_ref = %(book_ref)s "
+    "AND (%(ticket_nos)s::text[] IS NULL OR ticket_no = ANY(%(ticket_nos)s::text[]))"
+)
+
+# Cambio de vuelo en una sola sentencia: propiedad, existencia del vuelo nuevo,
+# ticket_flights y pase de abordar. El asiento se conserva si está libre en el
+# vuelo nuevo; si no, queda sin asignar. Una fila por billete seleccionado.
+REBOOK_SQL = """
+WITH selected AS (
+    SELECT ticket_no, passenger_id FROM tickets WHERE {ticket_filter}
+),
+new_flight AS (
+    SELECT flight_id FROM flights
+    WHERE flight_id = %(new_flight_id)s AND scheduled_departure > now()
+),
+targets AS (
+    SELECT tf.ticket_no, tf.flight_id, count(*) OVER (PARTITION BY tf.ticket_no) AS segments
+    FROM ticket_flights tf JOIN selected s ON s.ticket_no = tf.ticket_no
+    WHERE s.passenger_id = %(passenger_id)s
+      AND (%(current_flight_id)s::text IS NULL OR tf.flight_id = %(current_flight_id)s)
+),
+allowed AS (
+    SELECT t.ticket_no, t.flight_id FROM targets t, new_flight nf
+    WHERE t.segments = 1 AND t.flight_id <> nf.flight_id
+      AND NOT EXISTS (
+          SELECT 1 FROM ticket_flights o WHERE o.ticket_no = t.ticket_no AND o.flight_id = nf.flight_id
+      )
+),
+moved AS (
+    UPDATE ticket_flights tf SET flight_id = nf.flight_id
+    FROM allowed a, new_flight nf
+    WHERE tf.ticket_no = a.ticket_no AND tf.flight_id = a.flight_id
+    RETURNING tf.ticket_no
+),
+boarding AS (
+    UPDATE boarding_passes bp
+    SET flight_id = nf.flight_id,
+        seat_no = CASE WHEN EXISTS (
+            SELECT 1 FROM boarding_passes o WHERE o.flight_id = nf.flight_id AND o.seat_no = bp.seat_no
+        ) THEN NULL ELSE bp.seat_no END
+    FROM allowed a, new_flight nf
+    WHERE bp.ticket_no = a.ticket_no AND bp.flight_id = a.flight_id
+    RETURNING bp.ticket_no, bp.seat_no
+)
+SELECT s.ticket_no, s.passenger_id, t.segments, m.ticket_no IS NOT NULL, b.seat_no,
+       EXISTS (SELECT 1 FROM flights WHERE flight_id = %(new_flight_id)s),
+       EXISTS (SELECT 1 FROM new_flight)
+FROM selected s
+LEFT JOIN (SELECT DISTINCT ticket_no, segments FROM targets) t ON t.ticket_no = s.ticket_no
+LEFT JOIN moved m ON m.ticket_no = s.ticket_no
+LEFT JOIN boarding b ON b.ticket_no = s.ticket_no
+ORDER BY s.ticket_no
+"""
+
+# Cancelación en una sola sentencia: las FKs se comprueban al final de la
+# sentencia, cuando pases, tramos y billete ya se han borrado juntos.
+CANCEL_SQL = """
+WITH selected AS (
+    SELECT ticket_no, passenger_id FROM tickets WHERE {ticket_filter}
+),
+owned AS (
+    SELECT ticket_no FROM selected WHERE passenger_id = %(passenger_id)s
+),
+boarding AS (
+    DELETE FROM boarding_passes WHERE ticket_no IN (SELECT ticket_no FROM owned)
+),
+segments AS (
+    DELETE FROM ticket_flights WHERE ticket_no IN (SELECT ticket_no FROM owned)
+),
+deleted AS (
+    DELETE FROM tickets WHERE ticket_no IN (SELECT ticket_no FROM owned)
+    RETURNING ticket_no
+)
+SELECT s.ticket_no, s.passenger_id, d.ticket_no IS NOT NULL
+FROM selected s LEFT JOIN deleted d ON d.ticket_no = s.ticket_no
+ORDER BY s.ticket_no
+"""
+
+
+def _stored_result(cursor, request_key: str):
+    cursor.execute("SELECT result FROM ticket_requests WHERE request_key = %s", (request_key,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _run_ticket_statement(sql: str, ticket_filter: str, params: dict,
+                          request_key: Optional[str] = None) -> list[tuple]:
+    """
+    Ejecuta una sentencia de billetes en autocommit (un solo round trip).
 
-    if ticket_owner[0] != passenger_id:
+    Con `request_key` las filas resultantes se guardan en ticket_requests en
+    la misma transacción: un reintento de la misma acción devuelve las filas
+    originales en lugar de volver a aplicar (y describir) el cambio.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if request_key is None:
+            conn.autocommit = True
+            cursor.execute(sql.format(ticket_filter=ticket_filter), params)
+            rows = cursor.fetchall()
+            fence_primary_write(conn)
+            return rows
+
+        stored = _stored_result(cursor, request_key)
+        if stored is None:
+            cursor.execute(sql.format(ticket_filter=ticket_filter), params)
+            rows = cursor.fetchall()
+            cursor.execute(
+                """
+                INSERT INTO ticket_requests (request_key, result) VALUES (%s, %s)
+                ON CONFLICT (request_key) DO NOTHING
+                RETURNING request_key
+                """,
+                (request_key, json.dumps(rows, default=json_default)),
+            )
+            if cursor.fetchone() is not None:
+                conn.commit()
+                fence_primary_write(conn)
+                return rows
+            # Otra ejecución de la misma acción terminó antes: vale la suya
+            conn.rollback()
+            stored = _stored_result(cursor, request_key)
+        conn.rollback()
+        return [tuple(row) for row in stored]
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
         cursor.close()
         conn.close()
-        return f"El pasajero actual no es el propietario del billete {ticket_no}."
 
-    cursor.execute(
-        "SELECT flight_id FROM ticket_flights WHERE ticket_no = %s", (ticket_no,)
-    )
-    current_flight = cursor.fetchone()
-    if not current_flight:
-        cursor.close()
-        conn.close()
-        return f"El billete {ticket_no} no tiene un vuelo asignado actualmente."
+
+def _rebook(ticket_filter: str, params: dict, passenger_id: str, new_flight_id: str,
+            current_flight_id: Optional[str], request_key: Optional[str] = None) -> list[tuple]:
+    return _run_ticket_statement(REBOOK_SQL, ticket_filter, {
+        **params,
+        "passenger_id": passenger_id,
+        "new_flight_id": new_flight_id,
+        "current_flight_id": current_flight_id,
+    }, request_key)
+
+
+@tool
+def update_ticket_to_new_flight(
+    ticket_no: str,
+    new_flight_id: str,
+    config: RunnableConfig,
+    current_flight_id: Optional[str] = None,
+) -> str:
+    """Actualiza el billete de un pasajero a un nuevo vuelo, moviendo también su pase de abordar. Si el billete tiene varios vuelos, indica en current_flight_id cuál se cambia."""
+    passenger_id = config.get("configurable", {}).get("passenger_id")
+    if not passenger_id:
+        raise ValueError("No se ha configurado un ID de pasajero.")
 
     try:
-        cursor.execute(
-            "UPDATE ticket_flights SET flight_id = %s WHERE ticket_no = %s",
-            (new_flight_id, ticket_no),
-        )
-        conn.commit()
-        msg = "¡Billete actualizado al nuevo vuelo con éxito!"
+        rows = _rebook(SINGLE_TICKET, {"ticket_no": ticket_no}, passenger_id,
+                       str(new_flight_id), current_flight_id, get_request_key(config))
+    except TRANSIENT_DB_ERRORS:
+        raise
     except Exception as e:
-        conn.rollback()
-        msg = f"Error al actualizar el billete: {e}"
-    finally:
-        cursor.close()
-        conn.close()
+        return f"Error al actualizar el billete: {e}"
+
+    if not rows:
+        return f"No se encontró el billete con el número {ticket_no}."
+    _, owner, segments, moved, seat_no, flight_exists, flight_open = rows[0]
+    if owner != passenger_id:
+        return f"El pasajero actual no es el propietario del billete {ticket_no}."
+    if not flight_exists:
+        return f"No se encontró el vuelo {new_flight_id}."
+    if not flight_open:
+        return f"El vuelo {new_flight_id} ya ha salido."
+    if not segments:
+        return f"El billete {ticket_no} no tiene un vuelo asignado actualmente."
+    if segments > 1:
+        return f"El billete {ticket_no} tiene varios vuelos: indica en current_flight_id cuál quieres cambiar."
+    if not moved:
+        return f"El billete {ticket_no} ya está en el vuelo {new_flight_id}."
+    if seat_no is None:
+        return "¡Billete actualizado al nuevo vuelo con éxito! Su asiento estaba ocupado en el nuevo vuelo: se asignará uno en el check-in."
+    return f"¡Billete actualizado al nuevo vuelo con éxito! Asiento {seat_no}."
+
+
+@tool
+def rebook_booking(
+    book_ref: str,
+    new_flight_id: str,
+    config: RunnableConfig,
+    current_flight_id: Optional[str] = None,
+    ticket_nos: Optional[list[str]] = None,
+) -> str:
+    """Cambia a un nuevo vuelo varios billetes del pasajero de una misma reserva (book_ref) en una sola operación. Por defecto todos; ticket_nos limita a algunos."""
+    passenger_id = config.get("configurable", {}).get("passenger_id")
+    if not passenger_id:
+        raise ValueError("No se ha configurado un ID de pasajero.")
 
-    return msg
+    try:
+        rows = _rebook(BOOKING_TICKETS, {"book_ref": book_ref, "ticket_nos": ticket_nos},
+                       passenger_id, str(new_flight_id), current_flight_id, get_request_key(config))
+    except TRANSIENT_DB_ERRORS:
+        raise
+    except Exception as e:
+        return f"Error al cambiar los billetes: {e}"
+
+    own = [row for row in rows if row[1] == passenger_id]
+    if not own:
+        return f"No se encontraron billetes del pasajero actual en la reserva {book_ref}."
+    if not own[0][5]:
+        return f"No se encontró el vuelo {new_flight_id}."
+    if not own[0][6]:
+        return f"El vuelo {new_flight_id} ya ha salido."
+
+    moved = [row for row in own if row[3]]
+    lines = [f"{len(moved)} de {len(own)} billetes de la reserva {book_ref} movidos al vuelo {new_flight_id}."]
+    for ticket, _, segments, was_moved, seat_no, _, _ in own:
+        if was_moved:
+            lines.append(f"- {ticket}: asiento {seat_no}" if seat_no else f"- {ticket}: asiento pendiente (ocupado en el nuevo vuelo)")
+        elif not segments:
+            lines.append(f"- {ticket}: sin vuelo que cambiar")
+        elif segments > 1:
+            lines.append(f"- {ticket}: tiene varios vuelos, indica current_flight_id")
+        else:
+            lines.append(f"- {ticket}: ya estaba en ese vuelo")
+    if len(rows) > len(own):
+        lines.append(f"{len(rows) - len(own)} billetes de otros pasajeros no se modificaron.")
+    return "\n".join(lines)
 
 
 @tool
@@ -133,40 +396,178 @@ def cancel_ticket(ticket_no: str, config: RunnableConfig) -> str:
     if not passenger_id:
         raise ValueError("No se ha configurado un ID de pasajero.")
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    try:
+        rows = _run_ticket_statement(CANCEL_SQL, SINGLE_TICKET, {
+            "ticket_no": ticket_no, "passenger_id": passenger_id,
+        }, get_request_key(config))
+    except TRANSIENT_DB_ERRORS:
+        raise
+    except Exception as e:
+        return f"Error al cancelar el billete: {e}"
 
-    cursor.execute("SELECT passenger_id FROM tickets WHERE ticket_no = %s", (ticket_no,))
-    ticket_row = cursor.fetchone()
-    if not ticket_row:
-        cursor.close()
-        conn.close()
+    if not rows:
         return f"No se encontró el billete con el número {ticket_no}."
-
-    if ticket_row[0] != passenger_id:
-        cursor.close()
-        conn.close()
+    _, owner, deleted = rows[0]
+    if owner != passenger_id:
         return f"El pasajero actual no es el propietario del billete {ticket_no}."
+    if not deleted:
+        return f"No se pudo eliminar el billete {ticket_no} (posiblemente ya eliminado)."
+    return "¡Billete cancelado con éxito!"
 
-    try:
-        cursor.execute("DELETE FROM boarding_passes WHERE ticket_no = %s", (ticket_no,))
-        cursor.execute("DELETE FROM ticket_flights WHERE ticket_no = %s", (ticket_no,))
-        cursor.execute("DELETE FROM tickets WHERE ticket_no = %s", (ticket_no,))
-        conn.commit()
 
-        if cursor.rowcount > 0:
-            msg = "¡Billete cancelado con éxito!"
-        else:
-            msg = f"No se pudo eliminar el billete {ticket_no} (posiblemente ya eliminado)."
+@tool
+def cancel_booking(
+    book_ref: str,
+    config: RunnableConfig,
+    ticket_nos: Optional[list[str]] = None,
+) -> str:
+    """
+    Cancela de una vez varios billetes del pasajero de una misma reserva (book_ref).
+    Por defecto todos; ticket_nos limita a algunos. Es irreversible.
+    """
+    passenger_id = config.get("configurable", {}).get("passenger_id")
+    if not passenger_id:
+        raise ValueError("No se ha configurado un ID de pasajero.")
 
+    try:
+        rows = _run_ticket_statement(CANCEL_SQL, BOOKING_TICKETS, {
+            "book_ref": book_ref, "ticket_nos": ticket_nos, "passenger_id": passenger_id,
+        }, get_request_key(config))
+    except TRANSIENT_DB_ERRORS:
+        raise
     except Exception as e:
+        return f"Error al cancelar la reserva: {e}"
+
+    cancelled = [row[0] for row in rows if row[2]]
+    if not cancelled:
+        return f"No se encontraron billetes del pasajero actual en la reserva {book_ref}."
+    message = f"¡{len(cancelled)} billetes de la reserva {book_ref} cancelados con éxito! ({', '.join(cancelled)})"
+    if len(rows) > len(cancelled):
+        message += f"\n{len(rows) - len(cancelled)} billetes de otros pasajeros no se modificaron."
+    return message
+
+
+# Reintentos si el índice único de asientos detecta un mapa desfasado
+SEAT_ALLOCATION_ATTEMPTS = 3
+
+
+def _register_passengers(
+    flight_no: str,
+    departure_airport: str,
+    arrival_airport: str,
+    scheduled_departure: str,
+    scheduled_arrival: str,
+    passengers: list[dict],
+    fare_conditions: str,
+    passenger_id: Optional[str],
+    request_key: Optional[str] = None,
+) -> tuple[str, str, list[dict]]:
+    """
+    Registra a todos los pasajeros en una sola transacción: reutiliza el vuelo
+    (mismo número y salida) o lo crea, asigna asientos contiguos con el mapa
+    de ocupación bloqueado y crea billetes, tramos y pases con un INSERT
+    multi-fila por tabla. Devuelve (flight_id, book_ref, billetes).
+
+    Con `request_key` la transacción reclama primero la clave en
+    ticket_requests y guarda allí el resultado: un reintento de la misma
+    acción devuelve los billetes ya creados en lugar de crear otros.
+    """
+    book_ref = str(uuid.uuid4())[:6].upper()
+    tickets = [
+        {
+            "ticket_no": str(uuid.uuid4()),
+            "name": passenger["name"],
+            "email": passenger["email"],
+            # Sin pasajero en la sesión, el id se deriva del nombre y el email
+            "passenger_id": passenger_id or hashlib.md5(
+                f"{passenger['name']}{passenger['email']}".encode()
+            ).hexdigest()[:12].upper(),
+        }
+        for passenger in passengers
+    ]
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        for attempt in range(SEAT_ALLOCATION_ATTEMPTS):
+            try:
+                if request_key is not None:
+                    # Si otra ejecución la tiene a medias, espera a su commit o rollback
+                    cursor.execute(
+                        "INSERT INTO ticket_requests (request_key) VALUES (%s) "
+                        "ON CONFLICT (request_key) DO NOTHING RETURNING request_key",
+                        (request_key,),
+                    )
+                    if cursor.fetchone() is None:
+                        stored = _stored_result(cursor, request_key)
+                        conn.rollback()
+                        return stored["flight_id"], stored["book_ref"], stored["tickets"]
+
+                cursor.execute(
+                    "SELECT flight_id FROM flights WHERE flight_no = %s AND scheduled_departure = %s",
+                    (flight_no, scheduled_departure),
+                )
+                row = cursor.fetchone()
+                if row:
+                    flight_id = row[0]
+                else:
+                    flight_id = str(uuid.uuid4())
+                    cursor.execute(
+                        f"""
+                        INSERT INTO flights (flight_id, flight_no, departure_airport, arrival_airport, scheduled_departure, scheduled_arrival)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                        RETURNING {notify_change_sql('flights')}
+                        """,
+                        (flight_id, flight_no, departure_airport, arrival_airport, scheduled_departure, scheduled_arrival),
+                    )
+
+                seats = allocate_seats(cursor, flight_id, len(tickets), rebuild=attempt > 0)
+                for ticket, seat_no in zip(tickets, seats):
+                    ticket["seat_no"] = seat_no
+
+                execute_values(
+                    cursor,
+                    "INSERT INTO tickets (ticket_no, book_ref, passenger_id) VALUES %s",
+                    [(t["ticket_no"], book_ref, t["passenger_id"]) for t in tickets],
+                )
+                execute_values(
+                    cursor,
+                    "INSERT INTO ticket_flights (ticket_no, flight_id, fare_conditions) VALUES %s",
+                    [(t["ticket_no"], flight_id, fare_conditions) for t in tickets],
+                )
+                execute_values(
+                    cursor,
+                    "INSERT INTO boarding_passes (ticket_no, flight_id, seat_no) VALUES %s",
+                    [(t["ticket_no"], flight_id, t["seat_no"]) for t in tickets],
+                )
+                if request_key is not None:
+                    cursor.execute(
+                        "UPDATE ticket_requests SET result = %s WHERE request_key = %s",
+                        (json.dumps({"flight_id": flight_id, "book_ref": book_ref, "tickets": tickets},
+                                    default=json_default), request_key),
+                    )
+                conn.commit()
+                fence_primary_write(conn)
+                break
+            except errors.UniqueViolation:
+                # El mapa no reflejaba un asiento confirmado: se recalcula y se reintenta
+                conn.rollback()
+                if attempt == SEAT_ALLOCATION_ATTEMPTS - 1:
+                    raise
+    except Exception:
         conn.rollback()
-        msg = f"Error al cancelar el billete: {e}"
+        raise
     finally:
         cursor.close()
         conn.close()
 
-    return msg
+    if not row:
+        search_cache.invalidate("flights")
+    return flight_id, book_ref, tickets
+
+
+def _session_passenger_id(config: Optional[RunnableConfig]) -> Optional[str]:
+    return config.get("configurable", {}).get("passenger_id") if config else None
 
 
 @tool
@@ -179,63 +580,68 @@ def register_new_flight(
     passenger_name: str,
     passenger_email: str,
     fare_conditions: str = "Economy",
-    config: Optional[RunnableConfig] = None,
+    config: RunnableConfig = None,
 ) -> str:
     """Registra un nuevo vuelo y crea un billete para el pasajero."""
-    # Try to get passenger_id from config, but if not available, generate one from passenger info
-    passenger_id = (
-        config.get("configurable", {}).get("passenger_id") if config else None
-    )
-
-    # If no passenger_id is provided, generate one based on passenger name and email
-    if not passenger_id:
-        # Create a unique passenger_id from name and email
-        passenger_info = f"{passenger_name}{passenger_email}"
-        passenger_id = hashlib.md5(passenger_info.encode()).hexdigest()[:12].upper()
-
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
     try:
-        flight_id = str(uuid.uuid4())
-        ticket_no = str(uuid.uuid4())
-        book_ref = str(uuid.uuid4())[:6].upper()
-
-        cursor.execute(
-            "INSERT INTO flights (flight_id, flight_no, departure_airport, arrival_airport, scheduled_departure, scheduled_arrival) VALUES (%s, %s, %s, %s, %s, %s)",
-            (
-                flight_id,
-                flight_no,
-                departure_airport,
-                arrival_airport,
-                scheduled_departure,
-                scheduled_arrival,
-            ),
-        )
-
-        cursor.execute(
-            "INSERT INTO tickets (ticket_no, book_ref, passenger_id) VALUES (%s, %s, %s)",
-            (ticket_no, book_ref, passenger_id),
+        _, book_ref, (ticket,) = _register_passengers(
+            flight_no, departure_airport, arrival_airport, scheduled_departure, scheduled_arrival,
+            [{"name": passenger_name, "email": passenger_email}],
+            fare_conditions, _session_passenger_id(config), get_request_key(config),
         )
+    except TRANSIENT_DB_ERRORS:
+        raise
+    except Exception as e:
+        return f"Error al registrar el vuelo: {str(e)}"
 
-        cursor.execute(
-            "INSERT INTO ticket_flights (ticket_no, flight_id, fare_conditions) VALUES (%s, %s, %s)",
-            (ticket_no, flight_id, fare_conditions),
-        )
+    return f"¡Vuelo registrado con éxito!\n\nDetalles:\n- Vuelo: {flight_no}\n- Ruta: {departure_airport} → {arrival_airport}\n- Salida: {scheduled_departure}\n- Llegada: {scheduled_arrival}\n- Pasajero: {passenger_name}\n- Email: {passenger_email}\n- Clase: {fare_conditions}\n- Asiento: {ticket['seat_no']}\n- Número de billete: {ticket['ticket_no']}\n- Referencia de reserva: {book_ref}\n- ID de pasajero: {ticket['passenger_id']}"
 
-        seat_no = f"{ord(passenger_name[0]) % 26 + 1}{chr(ord('A') + (len(passenger_name) % 6))}"
-        cursor.execute(
-            "INSERT INTO boarding_passes (ticket_no, flight_id, seat_no) VALUES (%s, %s, %s)",
-            (ticket_no, flight_id, seat_no),
-        )
 
-        conn.commit()
+@tool
+def register_group_flight(
+    flight_no: str,
+    departure_airport: str,
+    arrival_airport: str,
+    scheduled_departure: str,
+    scheduled_arrival: str,
+    passengers: list[dict],
+    fare_conditions: str = "Economy",
+    config: RunnableConfig = None,
+) -> str:
+    """
+    Registra a un grupo de pasajeros en el mismo vuelo con una sola reserva.
+    Todos los billetes se crean en la misma transacción (o ninguno) y los
+    asientos se asignan juntos siempre que sea posible.
 
-        return f"¡Vuelo registrado con éxito!\n\nDetalles:\n- Vuelo: {flight_no}\n- Ruta: {departure_airport} → {arrival_airport}\n- Salida: {scheduled_departure}\n- Llegada: {scheduled_arrival}\n- Pasajero: {passenger_name}\n- Email: {passenger_email}\n- Clase: {fare_conditions}\n- Asiento: {seat_no}\n- Número de billete: {ticket_no}\n- Referencia de reserva: {book_ref}\n- ID de pasajero: {passenger_id}"
+    Args:
+        passengers: Lista de pasajeros, cada uno {"name": ..., "email": ...}
+    """
+    if not passengers:
+        return "Indique al menos un pasajero para registrar."
+    invalid = [p for p in passengers if not p.get("name") or not p.get("email")]
+    if invalid:
+        return "Cada pasajero necesita nombre (name) y email."
 
+    try:
+        _, book_ref, tickets = _register_passengers(
+            flight_no, departure_airport, arrival_airport, scheduled_departure, scheduled_arrival,
+            passengers, fare_conditions, _session_passenger_id(config), get_request_key(config),
+        )
+    except NoSeatsAvailable as e:
+        return f"No hay asientos suficientes en el vuelo {flight_no}: {e}"
+    except TRANSIENT_DB_ERRORS:
+        raise
     except Exception as e:
-        conn.rollback()
-        return f"Error al registrar el vuelo: {str(e)}"
-    finally:
-        cursor.close()
-        conn.close()
\ No newline at end of file
+        return f"Error al registrar el grupo: {str(e)}"
+
+    lines = [
+        f"- {t['name']} ({t['email']}): asiento {t['seat_no']}, billete {t['ticket_no']}"
+        for t in tickets
+    ]
+    return (
+        f"¡Grupo de {len(tickets)} pasajeros registrado con éxito!\n\n"
+        f"- Vuelo: {flight_no}\n- Ruta: {departure_airport} → {arrival_airport}\n"
+        f"- Salida: {scheduled_departure}\n- Llegada: {scheduled_arrival}\n"
+        f"- Clase: {fare_conditions}\n- Referencia de reserva: {book_ref}\n\n"
+        + "\n".join(lines)
+    )
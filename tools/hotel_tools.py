@@ -1,61 +1,122 @@
 from datetime import date, datetime
 from typing import Optional, Union
 
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
-from config.database import get_db_connection
+from config.database import get_db_connection, get_read_connection
+from .cache import cached_search
+from .pagination import keyset_after, page_result, pager
+from .base import (
+    availability_filter,
+    fuzzy_filters,
+    fuzzy_score,
+    get_passenger_id,
+    get_request_key,
+    release_range,
+    reserve_range,
+    stay_range,
+)
+
+# Columnas que se devuelven al agente (sin booked/capacity internos)
+HOTELS_COLUMNS = "id, name, location, price_tier"
 
 @tool
+@cached_search("hotels", "hotel_inventory")
 def search_hotels(
     location: Optional[str] = None,
     name: Optional[str] = None,
     price_tier: Optional[str] = None,
     checkin_date: Optional[Union[datetime, date]] = None,
     checkout_date: Optional[Union[datetime, date]] = None,
-) -> list[dict]:
-    """Busca hoteles."""
-    conn = get_db_connection()
+    limit: int = 20,
+) -> str:
+    """
+    Busca hoteles por ubicación o nombre (sin importar acentos ni mayúsculas). Devuelve primero las mejores coincidencias.
+    Con checkin_date (y opcionalmente checkout_date) solo devuelve hoteles con habitaciones libres todas las noches del rango.
+    Si hay más resultados, la respuesta termina con un page_token para next_page.
+    """
+    return _search_hotels_page(
+        {
+            "location": location,
+            "name": name,
+            "price_tier": price_tier,
+            "checkin_date": checkin_date,
+            "checkout_date": checkout_date,
+            "limit": limit,
+        },
+        None,
+    )
+
+
+@pager("search_hotels")
+def _search_hotels_page(args: dict, after: Optional[list], config: Optional[RunnableConfig] = None) -> str:
+    """Una página de search_hotels a partir de la clave `after` (None = primera)"""
+    limit = args.get("limit", 20)
+    filters = {"location": args.get("location"), "name": args.get("name")}
+    where, order_by, params = fuzzy_filters(filters)
+    score = fuzzy_score(filters)
+    columns = HOTELS_COLUMNS
+    if args.get("price_tier"):
+        where += " AND lower(price_tier) = lower(%(price_tier)s)"
+        params["price_tier"] = args["price_tier"]
+    if args.get("checkin_date"):
+        params["start_date"], params["end_date"] = stay_range(args["checkin_date"], args.get("checkout_date"))
+        condition, available = availability_filter("hotels", "hotel_inventory", "hotel_id")
+        where += f" AND {condition}"
+        columns += f", {available} AS available_rooms"
+    where += keyset_after(score, "id", after, params)
+    # Clave de ordenación al final (no se muestra): (score, id) o solo id
+    columns += f", {score} AS rank, id AS key" if score else ", id AS key"
+    query = f"SELECT {columns} FROM hotels WHERE {where} ORDER BY {order_by} LIMIT %(limit)s"
+    params["limit"] = limit + 1
+
+    conn = get_read_connection()
     cursor = conn.cursor()
-    query = "SELECT * FROM hotels WHERE 1=1"
-    params = []
-    if location:
-        query += " AND location LIKE %s"
-        params.append(f"%{location}%")
-    if name:
-        query += " AND name LIKE %s"
-        params.append(f"%{name}%")
     cursor.execute(query, params)
-    results = cursor.fetchall()
-    
-    # Obtener nombres de columnas
     column_names = [column[0] for column in cursor.description]
+    rows = cursor.fetchall()
     conn.close()
-    
-    return [
-        dict(zip(column_names, row)) for row in results
-    ]
+    return page_result("search_hotels", args, column_names, rows, 2 if score else 1, limit)
 
 @tool
-def book_hotel(hotel_id: int) -> str:
-    """Reserva un hotel por su ID."""
+def book_hotel(
+    hotel_id: int,
+    checkin_date: Union[datetime, date],
+    checkout_date: Optional[Union[datetime, date]] = None,
+    config: RunnableConfig = None,
+) -> str:
+    """Reserva una habitación de un hotel por su ID para las noches entre checkin_date y checkout_date."""
+    passenger_id = get_passenger_id(config)
+    start, end = stay_range(checkin_date, checkout_date)
+
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE hotels SET booked = true WHERE id = %s", (hotel_id,))
-    conn.commit()
-    if cursor.rowcount > 0:
+    try:
+        found, reservation_id = reserve_range(conn, "hotel", hotel_id, passenger_id, start, end,
+                                                 get_request_key(config))
+    finally:
         conn.close()
-        return f"Hotel {hotel_id} reservado con éxito."
-    conn.close()
-    return f"No se encontró un hotel con ID {hotel_id}."
+
+    if not found:
+        return f"No se encontró un hotel con ID {hotel_id}."
+    if reservation_id is None:
+        return f"El hotel {hotel_id} no tiene habitaciones libres todas las noches del {start} al {end}."
+    return f"Hotel {hotel_id} reservado con éxito del {start} al {end}. Número de reserva: {reservation_id}."
 
 @tool
-def cancel_hotel(hotel_id: int) -> str:
-    """Cancela una reserva de hotel por su ID."""
+def cancel_hotel(reservation_id: int, config: RunnableConfig) -> str:
+    """Cancela una reserva de hotel del pasajero actual por su número de reserva."""
+    passenger_id = get_passenger_id(config)
+
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE hotels SET booked = false WHERE id = %s", (hotel_id,))
-    conn.commit()
-    if cursor.rowcount > 0:
+    try:
+        outcome = release_range(conn, "hotel", reservation_id, passenger_id)
+    finally:
         conn.close()
-        return f"Reserva de hotel {hotel_id} cancelada con éxito."
-    conn.close()
-    return f"No se encontró un hotel con ID {hotel_id}."
\ No newline at end of file
+
+    if outcome == "not_found":
+        return f"No se encontró la reserva de hotel {reservation_id}."
+    if outcome == "not_owner":
+        return f"El pasajero actual no es el titular de la reserva de hotel {reservation_id}."
+    if outcome == "not_active":
+        return f"La reserva de hotel {reservation_id} ya estaba cancelada."
+    return f"Reserva de hotel {reservation_id} cancelada con éxito."
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""
+Paginación por keyset de los resultados de las tools de búsqueda.
+
+Una búsqueda devuelve solo la primera página y, si hay más filas, un
+page_token opaco con la búsqueda (nombre de la tool y argumentos) y la clave
+de ordenación de la última fila devuelta. La tool next_page lo decodifica y
+pide a la misma búsqueda las filas posteriores a esa clave con un
+`WHERE (rank, id) ...` que usa el mismo orden que la consulta original:
+no hay OFFSET y ninguna página depende de cuántas se hayan visto antes.
+
+El token no guarda datos del pasajero: las búsquedas que dependen de él lo
+vuelven a leer del config de la sesión.
+"""
+import base64
+import json
+import zlib
+from typing import Callable, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import tool
+
+from .encoding import encode_rows, json_default
+
+# Búsquedas paginables: nombre de la tool -> función(args, after, config) -> str
+_pagers: dict[str, Callable] = {}
+
+
+def pager(tool_name: str):
+    """Registra la función que sirve las páginas de `tool_name`"""
+    def decorator(func):
+        _pagers[tool_name] = func
+        return func
+
+    return decorator
+
+
+def encode_token(tool_name: str, args: dict, after: Sequence) -> str:
+    payload = json.dumps(
+        {"t": tool_name, "a": {k: v for k, v in args.items() if v is not None}, "k": list(after)},
+        default=json_default,
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(zlib.compress(payload.encode())).decode().rstrip("=")
+
+
+def decode_token(token: str) -> tuple[str, dict, list]:
+    try:
+        padded = token.strip() + "=" * (-len(token.strip()) % 4)
+        payload = json.loads(zlib.decompress(base64.urlsafe_b64decode(padded)))
+        return payload["t"], payload["a"], payload["k"]
+    except (ValueError, KeyError, TypeError, zlib.error):
+        raise ValueError("page_token no válido")
+
+
+def keyset_after(score: Optional[str], key: str, after: Optional[Sequence], params: dict) -> str:
+    """
+    Condición para las filas posteriores a `after` en el orden
+    `score DESC, key` (o solo `key` si la búsqueda no tiene score).
+    """
+    if not after:
+        return ""
+    if score is None:
+        params["after_key"] = after[-1]
+        return f" AND {key} > %(after_key)s"
+    params["after_score"], params["after_key"] = after
+    # El score es real: se compara como real para que la igualdad sea exacta
+    return (
+        f" AND ({score} < %(after_score)s::real"
+        f" OR ({score} = %(after_score)s::real AND {key} > %(after_key)s))"
+    )
+
+
+def page_result(tool_name: str, args: dict, columns: Sequence[str], rows: list,
+                key_width: int, limit: int) -> str:
+    """
+    Tabla compacta de una página. `rows` se pidió con LIMIT limit + 1 y sus
+    últimas `key_width` columnas son la clave de ordenación (no se muestran).
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    text = encode_rows(columns[:-key_width], (row[:-key_width] for row in rows))
+    if has_more:
+        token = encode_token(tool_name, {**args, "limit": limit}, rows[-1][-key_width:])
+        text += f"\nHay más resultados: usa next_page con page_token={token}"
+    return text
+
+
+@tool
+def next_page(page_token: str, config: RunnableConfig) -> str:
+    """Devuelve la siguiente página de una búsqueda anterior. Usa el page_token que aparece al final de sus resultados."""
+    try:
+        tool_name, args, after = decode_token(page_token)
+    except ValueError as e:
+        return str(e)
+    fetch = _pagers.get(tool_name)
+    if fetch is None:
+        return f"La búsqueda {tool_name} no admite paginación."
+    return fetch(args, after, config)
@@ -0,0 +1,220 @@
+"""
+Índice BM25 de las políticas de la compañía.
+
+Los documentos Markdown de POLICY_DIR se parten en pasajes por sección (como
+mucho CHUNK_WORDS palabras, con el título de la sección delante) y se indexan
+en un índice invertido. Cada posting guarda ya su peso BM25 precalculado, así
+una consulta es sumar unos pocos slices de arrays y quedarse con el top-k.
+
+El índice se guarda en POLICY_INDEX_DIR (postings en .npy abiertos con mmap) y
+se reconstruye con `python -m scripts.build_policy_index` cuando cambian las
+políticas.
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import numpy as np
+
+from .base import search_tokens
+
+logger = logging.getLogger(__name__)
+
+POLICY_DIR = os.getenv("POLICY_DIR", "policies")
+POLICY_INDEX_DIR = os.getenv("POLICY_INDEX_DIR", "data/policy_index")
+CHUNK_WORDS = 120
+# Stemming por truncado (tras quitar la "s" del plural):
+# "cancelaciones", "cancelar" y "cancelado" -> "cancel"; "perros" -> "perro"
+PREFIX_LENGTH = 6
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Segundos entre comprobaciones de un índice reconstruido por otro proceso
+RELOAD_INTERVAL = 30.0
+
+
+def policy_terms(text: str) -> list[str]:
+    return [
+        (word[:-1] if len(word) > 3 and word.endswith("s") else word)[:PREFIX_LENGTH]
+        for word in search_tokens(text)
+    ]
+
+
+def chunk_document(path: str) -> list[dict]:
+    """Pasajes de un documento Markdown: {"source", "title", "text"}"""
+    source = os.path.basename(path)
+    title = os.path.splitext(source)[0].replace("_", " ").capitalize()
+    section = None
+    passages = []
+    words = []
+
+    def flush():
+        if words:
+            heading = f"{title} › {section}" if section else title
+            passages.append({"source": source, "title": heading, "text": " ".join(words)})
+            words.clear()
+
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("## "):
+                flush()
+                section = line[3:].strip()
+            elif line.startswith("# "):
+                flush()
+                title = line[2:].strip()
+            elif line:
+                line_words = line.split()
+                if len(words) + len(line_words) > CHUNK_WORDS:
+                    flush()
+                words.extend(line_words)
+    flush()
+    return passages
+
+
+class PolicyIndex:
+    """Índice invertido BM25 con pesos precalculados por posting"""
+
+    def __init__(self, source_dir: str = POLICY_DIR, path: str = POLICY_INDEX_DIR):
+        self.source_dir = source_dir
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._meta_mtime = None
+        self._last_check = 0.0
+        self.passages: list[dict] = []
+        self.vocabulary: dict[str, tuple[int, int]] = {}
+        self.doc_ids = np.empty(0, dtype=np.int32)
+        self.weights = np.empty(0, dtype=np.float32)
+        self._snapshot = (self.passages, self.vocabulary, self.doc_ids, self.weights)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def build(self) -> int:
+        """Lee los documentos, calcula los pesos BM25 y escribe el índice. Devuelve nº de pasajes"""
+        passages = []
+        for name in sorted(os.listdir(self.source_dir)):
+            if name.endswith((".md", ".txt")):
+                passages.extend(chunk_document(os.path.join(self.source_dir, name)))
+
+        term_freqs = [Counter(policy_terms(f"{p['title']} {p['text']}")) for p in passages]
+        lengths = np.array([sum(tf.values()) for tf in term_freqs], dtype=np.float32)
+        avgdl = float(lengths.mean()) if len(lengths) else 0.0
+        postings = defaultdict(list)
+        for doc_id, tf in enumerate(term_freqs):
+            for term, freq in tf.items():
+                postings[term].append((doc_id, freq))
+
+        vocabulary, doc_ids, weights = {}, [], []
+        for term in sorted(postings):
+            docs = postings[term]
+            idf = math.log(1 + (len(passages) - len(docs) + 0.5) / (len(docs) + 0.5))
+            vocabulary[term] = (len(doc_ids), len(docs))
+            for doc_id, freq in docs:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc_id] / avgdl)
+                doc_ids.append(doc_id)
+                weights.append(idf * freq * (BM25_K1 + 1) / (freq + norm))
+
+        os.makedirs(self.path, exist_ok=True)
+        files = {
+            "doc_ids.npy": np.asarray(doc_ids, dtype=np.int32),
+            "weights.npy": np.asarray(weights, dtype=np.float32),
+        }
+        for name, array in files.items():
+            tmp = self._file(f"{name}.tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp, self._file(name))
+        documents = {
+            "passages.json": passages,
+            "vocabulary.json": vocabulary,
+            # meta.json al final: su mtime indica a los demás procesos que recarguen
+            "meta.json": {
+                "passages": len(passages),
+                "postings": len(doc_ids),
+                "avgdl": avgdl,
+                "k1": BM25_K1,
+                "b": BM25_B,
+                "built_at": datetime.now().isoformat(),
+            },
+        }
+        for name, content in documents.items():
+            tmp = self._file(f"{name}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(content, f, ensure_ascii=False)
+            os.replace(tmp, self._file(name))
+        self._load()
+        return len(passages)
+
+    def _load(self) -> bool:
+        try:
+            mtime = os.stat(self._file("meta.json")).st_mtime
+            with open(self._file("meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(self._file("passages.json"), encoding="utf-8") as f:
+                passages = json.load(f)
+            with open(self._file("vocabulary.json"), encoding="utf-8") as f:
+                vocabulary = json.load(f)
+            # Un array vacío no se puede mapear
+            mmap_mode = "r" if meta["postings"] else None
+            doc_ids = np.load(self._file("doc_ids.npy"), mmap_mode=mmap_mode)
+            weights = np.load(self._file("weights.npy"), mmap_mode=mmap_mode)
+        except (OSError, ValueError, KeyError):
+            return False
+        if len(passages) != meta["passages"] or not len(doc_ids) == len(weights) == meta["postings"]:
+            return False
+
+        self.passages = passages
+        self.vocabulary = {term: tuple(span) for term, span in vocabulary.items()}
+        self.doc_ids = doc_ids
+        self.weights = weights
+        # Las búsquedas leen una sola referencia: nunca mezclan dos versiones
+        self._snapshot = (self.passages, self.vocabulary, self.doc_ids, self.weights)
+        self._meta_mtime = mtime
+        self._loaded = True
+        return True
+
+    def ensure_ready(self):
+        """Carga el índice (o lo construye) y recarga si otro proceso lo reconstruyó"""
+        now = time.monotonic()
+        if self._loaded and now - self._last_check < RELOAD_INTERVAL:
+            return
+        with self._lock:
+            self._last_check = now
+            if not self._loaded:
+                if not self._load():
+                    logger.info("Construyendo índice de políticas en %s", self.path)
+                    self.build()
+                return
+            try:
+                if os.stat(self._file("meta.json")).st_mtime != self._meta_mtime:
+                    self._load()
+            except OSError:
+                pass
+
+    def search(self, query: str, k: int = 3) -> list[tuple[float, dict]]:
+        """Top-k pasajes (score BM25, pasaje) para la consulta"""
+        self.ensure_ready()
+        passages, vocabulary, doc_ids, weights = self._snapshot
+        scores = np.zeros(len(passages), dtype=np.float32)
+        for term in set(policy_terms(query)):
+            span = vocabulary.get(term)
+            if span:
+                start, count = span
+                # Los doc_ids de un posting son únicos: la suma con índices es segura
+                scores[doc_ids[start:start + count]] += weights[start:start + count]
+
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), passages[i]) for i in top if scores[i] > 0]
+
+
+policy_index = PolicyIndex()
@@ -1,10 +1,12 @@
-
 from langchain_core.tools import tool
 
+from .policy_index import policy_index
+
 
 @tool
-def lookup_policy(query: str) -> str:
-    """Consulta las políticas de la compañía."""
-    if "cambio" in query or "modificar" in query:
-        return "Los cambios están permitidos con una tarifa de $100 si se realizan más de 24 horas antes de la salida."
-    return "No se encontró una política específica para su consulta."
\ No newline at end of file
+def lookup_policy(query: str, k: int = 3) -> str:
+    """Consulta las políticas de la compañía (cambios, cancelaciones, reembolsos, equipaje, hoteles, coches, excursiones...). Devuelve los pasajes más relevantes."""
+    results = policy_index.search(query, k)
+    if not results:
+        return "No se encontró una política específica para su consulta."
+    return "\n\n".join(f"[{passage['title']}]\n{passage['text']}" for _, passage in results)
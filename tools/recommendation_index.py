@@ -0,0 +1,322 @@
+"""
+Índice semántico en proceso para las recomendaciones de excursiones.
+
+Cada excursión (nombre + ubicación + descripción) se convierte en un vector
+con hashing de palabras y trigramas de caracteres: no necesita modelos ni red
+y "museos" se acerca a "museo", "cultural" a "cultura". Los vectores están
+normalizados, así la similitud coseno es un producto escalar sobre una matriz
+NumPy que se guarda en disco y se abre con mmap (arranque inmediato).
+
+Los cambios posteriores al build se leen de forma incremental por
+trip_recommendations.updated_at y se guardan en un segmento delta en memoria;
+cuando crece demasiado se compacta y se reescribe el índice.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+import numpy as np
+
+from config.database import get_db_connection
+from .base import search_tokens
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = os.getenv("RECOMMENDATION_INDEX_DIR", "data/recommendation_index")
+EMBEDDING_DIM = 256
+# Segundos entre consultas de cambios a la base de datos
+REFRESH_INTERVAL = float(os.getenv("RECOMMENDATION_INDEX_REFRESH", "30"))
+# Margen para no perder filas de transacciones que confirmaron tarde
+REFRESH_OVERLAP = timedelta(minutes=5)
+# Filas en el delta a partir de las cuales se reescribe el índice
+COMPACT_THRESHOLD = 10_000
+# Filas por bloque al recorrer la matriz completa
+SCORE_BLOCK = 65_536
+WORD_WEIGHT = 1.0
+TRIGRAM_WEIGHT = 0.5
+
+
+def _features(text: str) -> Iterable[tuple[str, float]]:
+    for word in search_tokens(text):
+        yield f"w:{word}", WORD_WEIGHT
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            yield padded[i:i + 3], TRIGRAM_WEIGHT
+
+
+def embed(texts: list[str], dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Vectores (len(texts), dim) normalizados con hashing con signo"""
+    rows, cols, values = [], [], []
+    for row, text in enumerate(texts):
+        for feature, weight in _features(text or ""):
+            h = zlib.crc32(feature.encode())
+            rows.append(row)
+            cols.append(h % dim)
+            values.append(weight if h & 0x80000000 else -weight)
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    np.add.at(vectors, (rows, cols), values)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+def document_text(name: Optional[str], location: Optional[str], details: Optional[str]) -> str:
+    return " ".join(part for part in (name, location, details) if part)
+
+
+def _top_k(scores: np.ndarray, ids: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k por fila de una matriz de scores (batch, n), ordenado de mayor a
+    menor. Los empates se resuelven por id menor, así el orden es total y la
+    paginación por (score, id) no salta ni repite filas.
+    """
+    if ids.ndim == 1:
+        ids = np.broadcast_to(ids, scores.shape)
+    n = scores.shape[1]
+    if n > k:
+        kth = np.partition(scores, n - k, axis=1)[:, n - k]
+        part = []
+        for row_scores, row_ids, threshold in zip(scores, ids, kth):
+            above = np.flatnonzero(row_scores > threshold)
+            ties = np.flatnonzero(row_scores == threshold)
+            ties = ties[np.argsort(row_ids[ties], kind="stable")][:k - len(above)]
+            part.append(np.concatenate([above, ties]))
+        part = np.stack(part)
+        scores = np.take_along_axis(scores, part, axis=1)
+        ids = np.take_along_axis(ids, part, axis=1)
+    order = np.lexsort((ids, -scores), axis=-1)
+    return np.take_along_axis(ids, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def _positions(ids: np.ndarray, wanted: np.ndarray) -> np.ndarray:
+    """Posiciones en `ids` (ordenado) de los valores de `wanted` que existen"""
+    if not len(ids) or not len(wanted):
+        return np.empty(0, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(ids, wanted), len(ids) - 1)
+    return positions[ids[positions] == wanted]
+
+
+class RecommendationIndex:
+    """Índice vectorial de trip_recommendations (matriz base en mmap + delta en memoria)"""
+
+    def __init__(self, path: str = INDEX_DIR):
+        self.path = path
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._loaded = False
+        self._meta_mtime = None
+        self._last_refresh = 0.0
+        self.watermark: Optional[datetime] = None
+        # Base: ids ordenados y sus vectores (mmap de solo lectura)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        self._superseded = np.empty(0, dtype=bool)
+        # Delta: id -> vector de filas nuevas o modificadas
+        self._delta: dict[int, np.ndarray] = {}
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    # --- Persistencia ---
+
+    def build(self):
+        """Indexa toda la tabla y reescribe el índice en disco"""
+        conn = get_db_connection()
+        cursor = conn.cursor(name="recommendation_index_build")
+        cursor.itersize = 20_000
+        cursor.execute("SELECT id, name, location, details, updated_at FROM trip_recommendations ORDER BY id")
+        ids, chunks, watermark = [], [], None
+        while True:
+            rows = cursor.fetchmany(cursor.itersize)
+            if not rows:
+                break
+            ids.extend(row[0] for row in rows)
+            chunks.append(embed([document_text(*row[1:4]) for row in rows]))
+            newest = max(row[4] for row in rows)
+            watermark = newest if watermark is None else max(watermark, newest)
+        conn.close()
+
+        vectors = np.concatenate(chunks) if chunks else np.empty((0, EMBEDDING_DIM), np.float32)
+        self._write(np.asarray(ids, dtype=np.int64), vectors, watermark)
+
+    def _write(self, ids: np.ndarray, vectors: np.ndarray, watermark: Optional[datetime]):
+        """Escribe el índice con reemplazos atómicos; meta.json va al final"""
+        os.makedirs(self.path, exist_ok=True)
+        for name, array in (("ids.npy", ids), ("vectors.npy", vectors)):
+            tmp = self._file(f"{name}.tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp, self._file(name))
+        meta = {
+            "dim": EMBEDDING_DIM,
+            "count": int(len(ids)),
+            "watermark": watermark.isoformat() if watermark else None,
+            "built_at": datetime.now().isoformat(),
+        }
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._file("meta.json"))
+        self._load()
+
+    def _load(self) -> bool:
+        """Abre el índice de disco con mmap; False si no existe o no es válido"""
+        try:
+            mtime = os.stat(self._file("meta.json")).st_mtime
+            with open(self._file("meta.json")) as f:
+                meta = json.load(f)
+            # Un array vacío no se puede mapear
+            mmap_mode = "r" if meta["count"] else None
+            ids = np.load(self._file("ids.npy"), mmap_mode=mmap_mode)
+            vectors = np.load(self._file("vectors.npy"), mmap_mode=mmap_mode)
+        except (OSError, ValueError):
+            return False
+        if meta["dim"] != EMBEDDING_DIM or len(ids) != meta["count"] or vectors.shape != (meta["count"], EMBEDDING_DIM):
+            return False
+
+        with self._lock:
+            self.ids = ids
+            self.vectors = vectors
+            self._superseded = np.zeros(len(ids), dtype=bool)
+            self._delta = {}
+            self.watermark = datetime.fromisoformat(meta["watermark"]) if meta["watermark"] else None
+            self._meta_mtime = mtime
+            self._loaded = True
+        return True
+
+    def compact(self):
+        """Fusiona el delta con la matriz base y reescribe el índice"""
+        with self._lock:
+            ids, vectors, superseded = self.ids, self.vectors, self._superseded
+            delta = dict(self._delta)
+            watermark = self.watermark
+        keep = ~superseded
+        delta_ids = np.fromiter(delta, dtype=np.int64, count=len(delta))
+        merged_ids = np.concatenate([ids[keep], delta_ids])
+        merged = np.concatenate([vectors[keep], np.stack(list(delta.values())) if delta else vectors[:0]])
+        order = np.argsort(merged_ids, kind="stable")
+        self._write(merged_ids[order], merged[order], watermark)
+
+    # --- Refresco incremental ---
+
+    def ensure_ready(self):
+        """Carga el índice (o lo construye) y aplica los cambios pendientes"""
+        with self._refresh_lock:
+            if not self._loaded and not self._load():
+                logger.info("Construyendo índice de recomendaciones en %s", self.path)
+                self.build()
+            elif self._meta_mtime is not None:
+                # Otro proceso pudo reconstruir el índice
+                try:
+                    if os.stat(self._file("meta.json")).st_mtime != self._meta_mtime:
+                        self._load()
+                except OSError:
+                    pass
+            if time.monotonic() - self._last_refresh >= REFRESH_INTERVAL:
+                self.refresh()
+
+    def refresh(self):
+        """Re-indexa las filas modificadas desde el último watermark"""
+        self._last_refresh = time.monotonic()
+        since = self.watermark - REFRESH_OVERLAP if self.watermark else datetime.min
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id, name, location, details, updated_at FROM trip_recommendations WHERE updated_at > %s",
+            (since,),
+        )
+        rows = cursor.fetchall()
+        conn.close()
+        if not rows:
+            return
+
+        vectors = embed([document_text(*row[1:4]) for row in rows])
+        changed = np.array([row[0] for row in rows], dtype=np.int64)
+        with self._lock:
+            superseded = self._superseded.copy()
+            superseded[_positions(self.ids, changed)] = True
+            delta = dict(self._delta)
+            for row, vector in zip(rows, vectors):
+                delta[row[0]] = vector
+            self._superseded = superseded
+            self._delta = delta
+            self.watermark = max(self.watermark or datetime.min, max(row[4] for row in rows))
+        if len(delta) > COMPACT_THRESHOLD:
+            self.compact()
+
+    # --- Búsqueda ---
+
+    def search(self, query: str, k: int = 20, candidate_ids: Optional[list[int]] = None,
+               after: Optional[tuple[float, int]] = None) -> list[tuple[int, float]]:
+        """Top-k (id, similitud) para una consulta"""
+        return self.search_batch([query], k, candidate_ids, after)[0]
+
+    def search_batch(self, queries: list[str], k: int = 20,
+                     candidate_ids: Optional[list[int]] = None,
+                     after: Optional[tuple[float, int]] = None) -> list[list[tuple[int, float]]]:
+        """
+        Top-k por consulta con similitud coseno.
+
+        Args:
+            queries: textos libres ("algo cultural con museos")
+            k: resultados por consulta
+            candidate_ids: si se indica, solo se puntúan esos ids (p. ej. los
+                de una ciudad, ya filtrados en SQL)
+            after: (similitud, id) del último resultado de la página anterior;
+                solo se devuelven los que van detrás en el orden (similitud desc, id)
+        """
+        self.ensure_ready()
+        q = embed(queries)
+        with self._lock:
+            ids, vectors, superseded, delta = self.ids, self.vectors, self._superseded, self._delta
+        delta_ids = np.fromiter(delta, dtype=np.int64, count=len(delta))
+        delta_vectors = np.stack(list(delta.values())) if delta else np.empty((0, EMBEDDING_DIM), np.float32)
+
+        if candidate_ids is not None:
+            wanted = np.unique(np.asarray(candidate_ids, dtype=np.int64))
+            in_delta = np.isin(delta_ids, wanted)
+            wanted = wanted[~np.isin(wanted, delta_ids)]
+            positions = _positions(ids, wanted)
+            positions = positions[~superseded[positions]]
+            pool_ids = np.concatenate([ids[positions], delta_ids[in_delta]])
+            pool = np.concatenate([vectors[positions], delta_vectors[in_delta]])
+            blocks = [(pool_ids, pool, None)]
+        else:
+            blocks = [
+                (ids[start:start + SCORE_BLOCK], vectors[start:start + SCORE_BLOCK],
+                 superseded[start:start + SCORE_BLOCK])
+                for start in range(0, len(ids), SCORE_BLOCK)
+            ]
+            blocks.append((delta_ids, delta_vectors, None))
+
+        best_ids = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for block_ids, block, hidden in blocks:
+            if not len(block_ids):
+                continue
+            scores = q @ np.asarray(block).T
+            if hidden is not None:
+                scores[:, hidden] = -np.inf
+            if after is not None:
+                after_score, after_id = np.float32(after[0]), after[1]
+                seen = (scores > after_score) | ((scores == after_score) & (block_ids <= after_id))
+                scores[seen] = -np.inf
+            top_ids, top_scores = _top_k(scores, block_ids, k)
+            best_ids = np.concatenate([best_ids, top_ids], axis=1)
+            best_scores = np.concatenate([best_scores, top_scores], axis=1)
+
+        if not best_ids.shape[1]:
+            return [[] for _ in queries]
+        best_ids, best_scores = _top_k(best_scores, best_ids, k)
+        return [
+            [(int(i), float(s)) for i, s in zip(row_ids, row_scores) if s > 0]
+            for row_ids, row_scores in zip(best_ids, best_scores)
+        ]
+
+
+recommendation_index = RecommendationIndex()
@@ -0,0 +1,237 @@
+"""
+Índice de rutas en memoria para la búsqueda de vuelos con escalas.
+
+Los vuelos futuros se agrupan por aeropuerto de salida y por par
+(salida, llegada), cada grupo ordenado por hora de salida: encontrar las
+conexiones que salen de una escala dentro de la ventana de layover es un
+bisect. El índice se refresca de forma incremental por flights.updated_at
+(solo se reordenan los aeropuertos con cambios). Un vuelo borrado no deja
+rastro en updated_at: se olvida cuando una búsqueda no lo encuentra en la
+base de datos (forget) y, en cualquier caso, con la recarga completa de
+cada FULL_RELOAD_INTERVAL.
+"""
+import heapq
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from config.database import get_db_connection
+
+# Segundos entre consultas de vuelos modificados
+REFRESH_INTERVAL = float(os.getenv("ROUTE_INDEX_REFRESH", "30"))
+FULL_RELOAD_INTERVAL = 3600.0
+# Margen para no perder filas de transacciones que confirmaron tarde
+REFRESH_OVERLAP = timedelta(minutes=5)
+# Vuelos ya salidos que se siguen cargando
+PAST_WINDOW = timedelta(days=1)
+# Itinerarios devueltos como máximo (los mejores según el orden pedido)
+MAX_CANDIDATES = 5_000
+
+FLIGHT_COLUMNS = "flight_id, flight_no, departure_airport, arrival_airport, scheduled_departure, scheduled_arrival, updated_at"
+
+
+# Orden de los itinerarios: duración total (y menos escalas) u hora de salida
+SORT_KEYS = {
+    "duration": lambda legs: (legs[-1].arrival - legs[0].departure, len(legs)),
+    "departure": lambda legs: (legs[0].departure, legs[-1].arrival),
+}
+
+
+class Leg(tuple):
+    """(salida en segundos, llegada en segundos, flight_id, flight_no, origen, destino)"""
+    __slots__ = ()
+
+    departure = property(lambda self: self[0])
+    arrival = property(lambda self: self[1])
+    flight_id = property(lambda self: self[2])
+    flight_no = property(lambda self: self[3])
+    origin = property(lambda self: self[4])
+    destination = property(lambda self: self[5])
+
+
+class _Timetable:
+    """Vuelos ordenados por salida con la lista de horas aparte para bisect"""
+    __slots__ = ("legs", "departures")
+
+    def __init__(self, legs: list[Leg]):
+        self.legs = sorted(legs)
+        self.departures = [leg.departure for leg in self.legs]
+
+    def between(self, start: int, end: int) -> list[Leg]:
+        return self.legs[bisect_left(self.departures, start):bisect_right(self.departures, end)]
+
+
+class RouteIndex:
+    """Índice de vuelos por origen y por (origen, destino)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._flights: dict[str, Leg] = {}
+        self._by_origin: dict[str, _Timetable] = {}
+        self._by_route: dict[tuple[str, str], _Timetable] = {}
+        self.watermark: Optional[datetime] = None
+        self._last_refresh = 0.0
+        self._last_full = 0.0
+
+    @staticmethod
+    def _leg(row) -> Leg:
+        flight_id, flight_no, origin, destination, departure, arrival, _ = row
+        return Leg((int(departure.timestamp()), int(arrival.timestamp()), flight_id, flight_no, origin, destination))
+
+    def _fetch(self, since: Optional[datetime]) -> list[tuple]:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        query = f"SELECT {FLIGHT_COLUMNS} FROM flights WHERE scheduled_departure >= %s"
+        params = [datetime.now() - PAST_WINDOW]
+        if since is not None:
+            query += " AND updated_at > %s"
+            params.append(since)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        conn.close()
+        return [
+            row for row in rows
+            if row[2] and row[3] and row[4] and row[5] and row[5] > row[4]
+        ]
+
+    def reload(self):
+        """Carga todos los vuelos futuros y reconstruye el índice"""
+        rows = self._fetch(None)
+        flights = {row[0]: self._leg(row) for row in rows}
+        by_origin, by_route = defaultdict(list), defaultdict(list)
+        for leg in flights.values():
+            by_origin[leg.origin].append(leg)
+            by_route[(leg.origin, leg.destination)].append(leg)
+        with self._lock:
+            self._flights = flights
+            self._by_origin = {key: _Timetable(legs) for key, legs in by_origin.items()}
+            self._by_route = {key: _Timetable(legs) for key, legs in by_route.items()}
+            self.watermark = max((row[6] for row in rows), default=None)
+            self._last_full = self._last_refresh = time.monotonic()
+
+    def refresh(self):
+        """Aplica los vuelos creados o modificados desde el último watermark"""
+        self._last_refresh = time.monotonic()
+        rows = self._fetch(self.watermark - REFRESH_OVERLAP if self.watermark else datetime.min)
+        if not rows:
+            return
+        self._apply([self._leg(row) for row in rows], ())
+        with self._lock:
+            self.watermark = max(self.watermark or datetime.min, max(row[6] for row in rows))
+
+    def forget(self, flight_ids):
+        """
+        Quita del índice los vuelos que una búsqueda no encontró. Se confirma
+        en el primario: una réplica con retraso no debe esconder vuelos nuevos.
+        """
+        flight_ids = [flight_id for flight_id in flight_ids if flight_id in self._flights]
+        if not flight_ids:
+            return
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT flight_id FROM flights WHERE flight_id = ANY(%s)", (flight_ids,))
+        existing = {row[0] for row in cursor.fetchall()}
+        conn.close()
+        with self._refresh_lock:
+            self._apply((), [flight_id for flight_id in flight_ids if flight_id not in existing])
+
+    def _apply(self, legs, removed_ids):
+        """Cambia y borra vuelos reordenando solo los aeropuertos y rutas afectados"""
+        flights = dict(self._flights)
+        dirty_origins, dirty_routes = set(), set()
+        changes = [(leg.flight_id, leg) for leg in legs] + [(flight_id, None) for flight_id in removed_ids]
+        for flight_id, leg in changes:
+            previous = flights.get(flight_id)
+            if previous == leg:
+                continue
+            for changed in filter(None, (previous, leg)):
+                dirty_origins.add(changed.origin)
+                dirty_routes.add((changed.origin, changed.destination))
+            if leg is None:
+                del flights[flight_id]
+            else:
+                flights[flight_id] = leg
+        if not dirty_origins:
+            return
+
+        regrouped_origins, regrouped_routes = defaultdict(list), defaultdict(list)
+        for leg in flights.values():
+            if leg.origin in dirty_origins:
+                regrouped_origins[leg.origin].append(leg)
+            if (leg.origin, leg.destination) in dirty_routes:
+                regrouped_routes[(leg.origin, leg.destination)].append(leg)
+        by_origin, by_route = dict(self._by_origin), dict(self._by_route)
+        for origin in dirty_origins:
+            by_origin[origin] = _Timetable(regrouped_origins[origin])
+        for route in dirty_routes:
+            by_route[route] = _Timetable(regrouped_routes[route])
+        with self._lock:
+            self._flights, self._by_origin, self._by_route = flights, by_origin, by_route
+
+    def ensure_ready(self):
+        """Carga el índice la primera vez y lo mantiene al día"""
+        with self._refresh_lock:
+            now = time.monotonic()
+            if not self._last_full or now - self._last_full >= FULL_RELOAD_INTERVAL:
+                self.reload()
+            elif now - self._last_refresh >= REFRESH_INTERVAL:
+                self.refresh()
+
+    def connections(
+        self,
+        origin: str,
+        destination: str,
+        start: datetime,
+        end: datetime,
+        max_stops: int = 2,
+        min_layover: timedelta = timedelta(minutes=45),
+        max_layover: timedelta = timedelta(hours=6),
+        sort_by: str = "duration",
+        limit: int = MAX_CANDIDATES,
+    ) -> list[list[Leg]]:
+        """
+        Itinerarios origen → destino con 0 a `max_stops` escalas cuyo primer
+        vuelo sale en [start, end] y con cada escala dentro de [min_layover, max_layover].
+        Devuelve los `limit` mejores según `sort_by` ("duration" o "departure"),
+        ya ordenados: se recorren todos con un heap acotado, así un itinerario
+        corto que sale tarde en la ventana no se pierde.
+        """
+        self.ensure_ready()
+        with self._lock:
+            by_origin, by_route = self._by_origin, self._by_route
+        start_s, end_s = int(start.timestamp()), int(end.timestamp())
+        min_s, max_s = int(min_layover.total_seconds()), int(max_layover.total_seconds())
+        empty = _Timetable([])
+
+        def onward(leg: Leg, timetable: _Timetable) -> list[Leg]:
+            return timetable.between(leg.arrival + min_s, leg.arrival + max_s)
+
+        def itineraries():
+            for first in by_origin.get(origin, empty).between(start_s, end_s):
+                if first.destination == destination:
+                    yield [first]
+                    continue
+                if max_stops < 1 or first.destination == origin:
+                    continue
+                for last in onward(first, by_route.get((first.destination, destination), empty)):
+                    yield [first, last]
+                if max_stops < 2:
+                    continue
+                for middle in onward(first, by_origin.get(first.destination, empty)):
+                    if middle.destination in (origin, destination):
+                        continue
+                    final = by_route.get((middle.destination, destination))
+                    if final is None:
+                        continue
+                    for last in onward(middle, final):
+                        yield [first, middle, last]
+
+        return heapq.nsmallest(limit, itineraries(), key=SORT_KEYS.get(sort_by, SORT_KEYS["duration"]))
+
+
+route_index = RouteIndex()
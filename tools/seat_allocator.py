@@ -0,0 +1,129 @@
+"""
+Asignación de asientos sin colisiones.
+
+Cada vuelo tiene una fila en flight_seat_maps con un bitmap de ocupación
+(1 bit por asiento, asiento i = fila * seats_per_row + letra). El trigger
+flight_seat_maps_sync de boarding_passes pone y quita los bits, así que el
+bitmap siempre coincide con los pases de abordar confirmados.
+
+Para asignar, la transacción bloquea la fila del vuelo (SELECT ... FOR
+UPDATE): las asignaciones concurrentes al mismo vuelo se serializan y la
+segunda ya ve los bits de la primera. El índice único (flight_id, seat_no)
+de boarding_passes es la última barrera contra un asiento repetido.
+"""
+from typing import Optional
+
+# Distribución por defecto (la misma que genera scripts/bulk_seed.py)
+SEAT_ROWS = 30
+SEATS_PER_ROW = 6
+
+
+class NoSeatsAvailable(Exception):
+    """El vuelo no tiene asientos libres suficientes"""
+
+
+def seat_label(index: int, seats_per_row: int = SEATS_PER_ROW) -> str:
+    """Índice del bitmap -> etiqueta (0 -> "1A")"""
+    return f"{index // seats_per_row + 1}{chr(ord('A') + index % seats_per_row)}"
+
+
+def seat_index(label: Optional[str], seat_rows: int = SEAT_ROWS, seats_per_row: int = SEATS_PER_ROW) -> Optional[int]:
+    """Etiqueta -> índice del bitmap, None si no cabe en la distribución"""
+    if not label or len(label) < 2 or not label[:-1].isdigit():
+        return None
+    row, column = int(label[:-1]) - 1, ord(label[-1].upper()) - ord("A")
+    if not (0 <= row < seat_rows and 0 <= column < seats_per_row):
+        return None
+    return row * seats_per_row + column
+
+
+def build_bitmap(labels, seat_rows: int = SEAT_ROWS, seats_per_row: int = SEATS_PER_ROW) -> bytes:
+    """Bitmap de ocupación con el orden de bits de set_bit() de Postgres"""
+    bitmap = bytearray((seat_rows * seats_per_row + 7) // 8)
+    for label in labels:
+        index = seat_index(label, seat_rows, seats_per_row)
+        if index is not None:
+            bitmap[index // 8] |= 1 << (index % 8)
+    return bytes(bitmap)
+
+
+def find_seats(occupancy: bytes, seat_rows: int, seats_per_row: int, count: int) -> list[int]:
+    """
+    Elige `count` asientos libres en una pasada sobre el bitmap, por preferencia:
+    juntos en la misma fila, consecutivos aunque crucen de fila, o los
+    primeros libres si el grupo no cabe junto.
+    """
+    total = seat_rows * seats_per_row
+    bits = int.from_bytes(occupancy, "little")
+    free = [not (bits >> i) & 1 for i in range(total)]
+    if free.count(True) < count:
+        raise NoSeatsAvailable(f"Quedan {free.count(True)} asientos libres y se necesitan {count}")
+
+    same_row = across_rows = None
+    run = 0
+    for i in range(total):
+        if i % seats_per_row == 0:
+            row_run = 0
+        run = run + 1 if free[i] else 0
+        row_run = row_run + 1 if free[i] else 0
+        if same_row is None and row_run >= count:
+            same_row = i - count + 1
+            break
+        if across_rows is None and run >= count:
+            across_rows = i - count + 1
+    start = same_row if same_row is not None else across_rows
+    if start is not None:
+        return list(range(start, start + count))
+    return [i for i in range(total) if free[i]][:count]
+
+
+def lock_seat_map(cursor, flight_id: str, rebuild: bool = False) -> tuple[int, int, bytes]:
+    """
+    Bloquea el mapa de asientos del vuelo hasta el fin de la transacción y
+    devuelve (filas, asientos por fila, bitmap). Si el vuelo aún no tiene mapa
+    (o `rebuild`), lo calcula desde boarding_passes.
+    """
+    cursor.execute(
+        "SELECT seat_rows, seats_per_row, occupancy FROM flight_seat_maps WHERE flight_id = %s FOR UPDATE",
+        (flight_id,),
+    )
+    row = cursor.fetchone()
+    if row is not None and not rebuild:
+        return row[0], row[1], bytes(row[2])
+
+    seat_rows, seats_per_row = row[:2] if row else (SEAT_ROWS, SEATS_PER_ROW)
+    cursor.execute("SELECT seat_no FROM boarding_passes WHERE flight_id = %s", (flight_id,))
+    occupancy = build_bitmap((seat for (seat,) in cursor.fetchall()), seat_rows, seats_per_row)
+    if row is not None:
+        # Con la fila ya bloqueada: nadie más puede estar asignando en este vuelo
+        cursor.execute(
+            "UPDATE flight_seat_maps SET occupancy = %s WHERE flight_id = %s",
+            (occupancy, flight_id),
+        )
+        return seat_rows, seats_per_row, occupancy
+
+    # Si otra transacción crea el mapa a la vez, el INSERT espera a su commit
+    # y se queda con su versión (que ya incluye sus asientos)
+    cursor.execute(
+        """
+        INSERT INTO flight_seat_maps (flight_id, seat_rows, seats_per_row, occupancy)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (flight_id) DO NOTHING
+        """,
+        (flight_id, seat_rows, seats_per_row, occupancy),
+    )
+    cursor.execute(
+        "SELECT seat_rows, seats_per_row, occupancy FROM flight_seat_maps WHERE flight_id = %s FOR UPDATE",
+        (flight_id,),
+    )
+    row = cursor.fetchone()
+    return row[0], row[1], bytes(row[2])
+
+
+def allocate_seats(cursor, flight_id: str, count: int, rebuild: bool = False) -> list[str]:
+    """
+    Reserva `count` asientos contiguos (si es posible) en el vuelo. Los bits
+    los marca el trigger al insertar los boarding_passes en la misma transacción.
+    """
+    seat_rows, seats_per_row, occupancy = lock_seat_map(cursor, flight_id, rebuild)
+    return [seat_label(i, seats_per_row) for i in find_seats(occupancy, seat_rows, seats_per_row, count)]